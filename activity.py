@@ -0,0 +1,151 @@
+"""Activity trail: who toggled, saved, moved or approved what, and logins.
+
+Handlers call `record(db, user, kind, ...)` next to the change. The entry waits
+on the session and, when it commits, goes into an in-memory ring buffer (it is
+dropped on rollback) instead of costing the request an INSERT. A background
+thread writes the buffer in multi-row INSERTs once `activity_flush_rows`
+entries are waiting or `activity_flush_seconds` have passed, and drains it on
+shutdown. Entries not yet written are merged into the feeds, so a user sees
+their own actions straight away.
+
+Buffered entries are lost if the process dies before a flush, and the oldest
+are dropped if the database falls `activity_buffer_size` entries behind. With
+`activity_sync = True` entries are inserted in the handler's own transaction
+instead.
+"""
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from .config import settings
+from .db import SessionLocal
+from .models import Activity
+
+log = logging.getLogger("bdos.activity")
+
+KINDS = ("checklist.toggle", "deliverable.save", "task.status", "task.due", "task.new", "opportunity.new",
+         "stage.approve", "stage.reject", "project.restore", "login", "login.failed")
+FLUSH_CHUNK = 1000
+
+def record(db: Session, user, kind: str, project_id: int | None = None, ref_id: int | None = None, detail: str | None = None):
+    """Queue an entry for `db`'s transaction; `user` is a UserSnapshot/User, or None."""
+    db.info.setdefault("activity", []).append({
+        "org_id": user.org_id if user else None, "project_id": project_id, "user_id": user.id if user else None,
+        "kind": kind, "ref_id": ref_id, "detail": detail[:200] if detail else None, "created_at": datetime.utcnow()})
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session):
+    if settings.activity_sync and session.info.get("activity"):
+        session.execute(insert(Activity), session.info.pop("activity"))
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    entries = session.info.pop("activity", None)
+    if entries:
+        writer.extend(entries)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("activity", None)
+
+def unwritten(pending: list[dict], rows) -> list[dict]:
+    """`pending` minus the entries already among the Activity `rows` read after it."""
+    written = {(r.created_at, r.user_id, r.kind, r.ref_id) for r in rows}
+    return [e for e in pending if (e["created_at"], e["user_id"], e["kind"], e["ref_id"]) not in written]
+
+class Writer:
+    """Ring buffer of committed entries plus the thread that writes them out.
+
+    Entries are removed from the buffer only after their INSERT commits, so a
+    reader merging `pending()` into a feed never misses one, but may read an
+    entry from both; `unwritten()` drops those copies. `seq` counts
+    entries ever removed, which lets a flush drop exactly what it wrote even
+    if the ring wrapped meanwhile."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._buffer: deque[dict] = deque()
+        self._seq = 0  # entries removed from the head of the buffer, written or dropped
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.dropped = 0
+        self.written = 0
+
+    def extend(self, entries: list[dict]):
+        with self._lock:
+            self._buffer.extend(entries)
+            over = len(self._buffer) - settings.activity_buffer_size
+            for _ in range(max(over, 0)):
+                self._buffer.popleft()
+            if over > 0:
+                self._seq += over
+                self.dropped += over
+            waiting = len(self._buffer)
+        if over > 0:
+            log.warning("activity buffer full; dropped %d entries (%d so far)", over, self.dropped)
+        if waiting >= settings.activity_flush_rows:
+            self._wake.set()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def pending(self, project_id: int | None = None, user_id: int | None = None) -> list[dict]:
+        """Entries not yet in the table, newest first."""
+        with self._lock:
+            return [e for e in reversed(self._buffer)
+                    if (project_id is None or e["project_id"] == project_id) and (user_id is None or e["user_id"] == user_id)]
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of entries written. On
+        failure the entries stay buffered for the next attempt."""
+        with self._flushing:
+            with self._lock:
+                batch, start = list(self._buffer), self._seq
+            if not batch:
+                return 0
+            with SessionLocal() as db:
+                for i in range(0, len(batch), FLUSH_CHUNK):
+                    db.execute(insert(Activity), batch[i:i + FLUSH_CHUNK])
+                db.commit()
+            with self._lock:
+                # Whatever the ring dropped while we wrote was already counted.
+                done = max(start + len(batch) - self._seq, 0)
+                for _ in range(done):
+                    self._buffer.popleft()
+                self._seq += done
+                self.written += len(batch)
+            return len(batch)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write what is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            log.exception("activity drain failed; %d entries lost", len(self._buffer))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(settings.activity_flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("activity flush failed; %d entries buffered", len(self._buffer))
+                self._stop.wait(settings.activity_flush_seconds)
+
+writer = Writer()
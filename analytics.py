@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import chain
+import numpy as np
+from sqlalchemy import select, case, func
+from sqlalchemy.orm import Session
+from .models import Project, ProjectStage, Opportunity
+from .stages import registry
+from . import rollups
+
+OPP_TYPES = ("partnership", "channel", "deal", "other")
+OPP_STAGES = ("new", "qualified", "pitched", "won", "lost", "other")
+REPORT_CACHE_SIZE = 64
+
+# ---- column loading: one query per table, straight into arrays
+
+def _code(column, labels: tuple[str, ...]):
+    """SQL expression mapping a string column to its index in `labels` (unknown values -> "other")."""
+    return case({label: i for i, label in enumerate(labels) if label != "other"}, value=column, else_=labels.index("other"))
+
+def _columns(rows, width: int) -> np.ndarray:
+    """Flatten all-numeric result rows into an (n, width) float array in a single pass."""
+    return np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * width).reshape(-1, width)
+
+def load_opportunities(db: Session, org_id: int) -> dict[str, np.ndarray]:
+    # Strings are dictionary-encoded and NULLs mapped to -1 in SQL so every
+    # row is numeric and the conversion never touches Python objects per cell.
+    rows = db.execute(select(_code(Opportunity.otype, OPP_TYPES), _code(Opportunity.stage, OPP_STAGES),
+                             func.coalesce(Opportunity.value_estimate, -1), func.coalesce(Opportunity.probability, -1))
+                      .join(Project, Opportunity.project_id==Project.id).where(Project.org_id==org_id)).all()
+    cols = _columns(rows, 4)
+    value, probability = cols[:, 2], cols[:, 3]
+    return {"otype": cols[:, 0].astype(np.int64), "stage": cols[:, 1].astype(np.int64),
+            "value": np.where(value < 0, np.nan, value), "probability": np.where(probability < 0, np.nan, probability)}
+
+def load_stage_durations(db: Session, org_id: int) -> dict:
+    rows = db.execute(select(ProjectStage.stage_id, ProjectStage.started_at, ProjectStage.completed_at)
+                      .join(Project, ProjectStage.project_id==Project.id)
+                      .where(Project.org_id==org_id, ProjectStage.status=="done", ProjectStage.started_at!=None, ProjectStage.completed_at!=None)).all()
+    stage_ids, started, completed = zip(*rows) if rows else ((), (), ())
+    hours = (np.array(completed, dtype="datetime64[us]") - np.array(started, dtype="datetime64[us]")) / np.timedelta64(1, "h")
+    return {"stage_id": np.array(stage_ids, dtype=np.int64), "hours": hours.astype(np.float64)}
+
+# ---- vectorized aggregates
+
+def pipeline_by_type_and_stage(otype: np.ndarray, stage: np.ndarray, value: np.ndarray, probability: np.ndarray,
+                               n_types: int, n_stages: int) -> dict[str, np.ndarray]:
+    """Count, total value and weighted value (value * probability%) per (otype, stage) cell."""
+    cell = otype.astype(np.int64) * n_stages + stage
+    value = np.nan_to_num(value)
+    weighted = value * np.nan_to_num(probability) / 100.0
+    size = n_types * n_stages
+    shape = (n_types, n_stages)
+    return {"count": np.bincount(cell, minlength=size).reshape(shape),
+            "value": np.bincount(cell, weights=value, minlength=size).reshape(shape),
+            "weighted": np.bincount(cell, weights=weighted, minlength=size).reshape(shape)}
+
+def win_rates(counts: np.ndarray, won: int, lost: int) -> np.ndarray:
+    """won / (won + lost) per row of a (type, stage) count matrix; NaN where nothing closed."""
+    closed = counts[:, won] + counts[:, lost]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(closed > 0, counts[:, won] / closed, np.nan)
+
+def cycle_time_stats(stage_id: np.ndarray, hours: np.ndarray) -> dict[int, dict[str, float]]:
+    """Per-stage count, mean, median and p90 of completed-minus-started hours."""
+    if not len(stage_id):
+        return {}
+    order = np.argsort(stage_id, kind="stable")
+    ids, hours = stage_id[order], hours[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    out = {}
+    for group in np.split(np.arange(len(ids)), starts[1:]):
+        h = hours[group]
+        p50, p90 = np.percentile(h, [50, 90])
+        out[int(ids[group[0]])] = {"count": int(len(h)), "mean": float(h.mean()), "median": float(p50), "p90": float(p90)}
+    return out
+
+# ---- reports
+
+@dataclass
+class PipelineReport:
+    version: int
+    pipeline: list[dict] = field(default_factory=list)   # one row per (otype, stage) with any opportunities
+    win_rates: list[dict] = field(default_factory=list)  # one row per otype
+    cycle_times: list[dict] = field(default_factory=list)  # one row per stage template, in stage order
+    total_weighted: float = 0.0
+
+def build_report(db: Session, org_id: int, version: int) -> PipelineReport:
+    opps = load_opportunities(db, org_id)
+    won, lost = OPP_STAGES.index("won"), OPP_STAGES.index("lost")
+    agg = pipeline_by_type_and_stage(opps["otype"], opps["stage"], opps["value"], opps["probability"], len(OPP_TYPES), len(OPP_STAGES))
+    report = PipelineReport(version=version, total_weighted=float(agg["weighted"].sum()))
+    for t, s in zip(*np.nonzero(agg["count"])):
+        report.pipeline.append({"otype": OPP_TYPES[t], "stage": OPP_STAGES[s], "count": int(agg["count"][t, s]),
+                                "value": float(agg["value"][t, s]), "weighted": float(agg["weighted"][t, s])})
+    rates = win_rates(agg["count"], won, lost)
+    for t in np.flatnonzero(agg["count"].sum(axis=1)):
+        report.win_rates.append({"otype": OPP_TYPES[t], "won": int(agg["count"][t, won]), "lost": int(agg["count"][t, lost]),
+                                 "rate": None if np.isnan(rates[t]) else float(rates[t])})
+    durations = load_stage_durations(db, org_id)
+    stats = cycle_time_stats(durations["stage_id"], durations["hours"])
+    for t in registry.get(db):
+        report.cycle_times.append({"order": t.order, "name": t.name, **stats.get(t.stage_id, {"count": 0})})
+    return report
+
+class ReportCache:
+    """LRU of reports keyed by (org_id, data version); a new version simply misses."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[int, int], PipelineReport] = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            report = self._entries.get(key)
+            if report is not None:
+                self._entries.move_to_end(key)
+            return report
+
+    def put(self, key, report: PipelineReport):
+        with self._lock:
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+report_cache = ReportCache(REPORT_CACHE_SIZE)
+
+def pipeline_report(db: Session, org_id: int) -> PipelineReport:
+    version = rollups.org_summary(db, org_id).version
+    report = report_cache.get((org_id, version))
+    if report is None:
+        report = build_report(db, org_id, version)
+        report_cache.put((org_id, version), report)
+    return report
@@ -0,0 +1,140 @@
+// Checklist ticks, task status buttons and deliverable saves (forms with
+// data-op) are sent to /api/batch in the background instead of posting the
+// form. Submits made within BATCH_DELAY ms share one request, requests go out
+// in order, and the changed rows they return are patched into the page.
+//
+// Pages with data-events also follow the project's change stream (events.py)
+// and patch in what teammates change. Every message carries the project
+// version it produced; a skipped version, a message with nothing to patch or a
+// resync means the page can't catch up in place, so it reloads (or, if the
+// user has typed into it, says so instead).
+(function () {
+  "use strict";
+  var BATCH_DELAY = 150;
+  var RECENT_ROWS = 10;  // queries.recent_tasks / recent_opportunities
+  var queue = [];
+  var timer = null;
+  var inflight = Promise.resolve();
+
+  function operation(form) {
+    var op = {op: form.dataset.op, id: Number(form.dataset.id)};
+    if (op.op === "task.status") op.status = form.elements.status.value;
+    if (op.op === "deliverable.save") {
+      op.content = form.elements.content.value;
+      op.base = form.elements.base.value ? Number(form.elements.base.value) : null;
+    }
+    return op;
+  }
+
+  function setText(selector, text) {
+    document.querySelectorAll(selector).forEach(function (el) { el.textContent = text; });
+  }
+
+  function each(rows, fn) { (rows || []).forEach(fn); }
+
+  function prependRow(list, title, badge, attr, id) {
+    document.querySelectorAll('[data-live="' + list + '"]').forEach(function (tbody) {
+      var row = tbody.insertRow(0), text = row.insertCell(), status = row.insertCell(), span = document.createElement("span");
+      text.className = "small";
+      text.textContent = title;
+      span.className = "badge";
+      span.textContent = badge;
+      if (attr) span.setAttribute(attr, id);
+      status.appendChild(span);
+      while (tbody.rows.length > RECENT_ROWS) tbody.deleteRow(-1);
+    });
+  }
+
+  function patch(changed) {
+    each(changed.checklist, function (c) {
+      setText('[data-checklist-done="' + c.id + '"]', c.done ? "✓" : " ");
+      setText('[data-checklist-at="' + c.id + '"]', c.done_at ? c.done_at.replace("T", " ") : "");
+    });
+    each(changed.tasks, function (t) { setText('[data-task-status="' + t.id + '"]', t.status); });
+    each(changed.deliverables, function (d) {
+      setText('[data-deliverable-status="' + d.id + '"]', d.status);
+      setText('[data-deliverable-version="' + d.id + '"]', d.version);
+      document.querySelectorAll('form[data-op="deliverable.save"][data-id="' + d.id + '"]').forEach(function (form) {
+        form.elements.base.value = d.head_revision_id || "";
+      });
+    });
+    each(changed.stages, function (s) {
+      document.querySelectorAll('[data-stage-status="' + s.id + '"]').forEach(function (el) {
+        el.textContent = s.status;
+        if (el.matches(".ok, .warn, .danger")) {
+          el.classList.remove("ok", "warn", "danger");
+          el.classList.add(s.status === "done" ? "ok" : s.status === "blocked" ? "danger" : "warn");
+        }
+      });
+    });
+    each(changed.new_tasks, function (t) { prependRow("tasks", t.title, t.status, "data-task-status", t.id); });
+    each(changed.new_opportunities, function (o) { prependRow("opportunities", o.title, o.stage); });
+  }
+
+  function send(ops) {
+    return fetch("/api/batch", {
+      method: "POST",
+      credentials: "same-origin",
+      headers: {"Content-Type": "application/json"},
+      body: JSON.stringify({ops: ops})
+    }).then(function (response) {
+      if (!response.ok) throw new Error("batch failed: " + response.status);
+      return response.json();
+    }).then(patch);
+  }
+
+  function flush() {
+    var ops = queue;
+    queue = [];
+    timer = null;
+    // Reloading shows the server's state (or the login page) if anything went wrong.
+    inflight = inflight.then(function () { return send(ops); }).catch(function () { location.reload(); });
+  }
+
+  document.addEventListener("submit", function (event) {
+    var form = event.target;
+    if (!form.dataset || !form.dataset.op || !window.fetch) return;
+    event.preventDefault();
+    var op = operation(form);
+    // The server refuses two saves of one deliverable in a batch; the later text wins.
+    if (op.op === "deliverable.save") queue = queue.filter(function (q) { return q.op !== op.op || q.id !== op.id; });
+    queue.push(op);
+    if (timer === null) timer = setTimeout(flush, BATCH_DELAY);
+  });
+
+  var edited = false;
+  document.addEventListener("input", function () { edited = true; });
+
+  function outOfDate() {
+    if (!edited) return location.reload();
+    if (document.querySelector("[data-out-of-date]")) return;
+    var note = document.createElement("div"), link = document.createElement("a");
+    note.className = "card small";
+    note.setAttribute("data-out-of-date", "");
+    note.textContent = "This page has changed elsewhere. ";
+    link.href = location.href;
+    link.textContent = "Reload";
+    note.appendChild(link);
+    document.querySelector(".container").prepend(note);
+  }
+
+  function follow(el) {
+    var version = Number(el.dataset.version);
+    var source = new EventSource(el.dataset.events + "?since=" + version);
+    source.addEventListener("change", function (event) {
+      var changed = JSON.parse(event.data);
+      if (changed.version <= version) return;  // already shown
+      var next = changed.version === version + 1;
+      version = changed.version;
+      if (!next || Object.keys(changed).length === 1) return outOfDate();
+      patch(changed);
+    });
+    source.addEventListener("resync", function () {
+      source.close();
+      outOfDate();
+    });
+  }
+
+  var live = document.querySelector("[data-events]");
+  if (live && window.EventSource) follow(live);
+})();
@@ -0,0 +1,295 @@
+"""Hot/cold archival of finished projects.
+
+`run()` moves done projects untouched for `archive_after_days` out of the hot
+tables, together with their stages, checklist, deliverables and revisions,
+tasks, opportunities, approvals and rollup. They go into the `archive` schema:
+on SQLite a separate file (`archive_sqlite_path`) attached to the main
+database, on Postgres a schema of that name. Each batch of `archive_batch_size`
+projects is copied and deleted in one transaction. The copy first clears
+whatever an interrupted batch left behind, so a failed run can simply be
+repeated. The search index loses the rows through its delete triggers.
+
+Archived projects stay readable through the normal routes. When a project
+isn't in the hot tables, handlers retry through `read_session()`. That is a
+read-only connection whose unqualified table names resolve to the archive
+first and to the hot tables second: on SQLite the archive is the main database
+there, with the hot one attached; on Postgres it sets
+search_path = archive, public. So queries.py runs unchanged. An archived
+project is a frozen snapshot: its pages are read-only and its rollup keeps the
+values it had when it was archived. `restore()` moves projects back.
+
+CLI: python -m app.archive run [--days N] [--dry-run]
+     python -m app.archive restore PROJECT_ID [...]
+     python -m app.archive status
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Index, MetaData, Table, UniqueConstraint, create_engine, delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from .config import settings
+from .db import Base, ReadSession, configure, _connect_args, _pool_args
+from . import rollups, revisions, search, sqlstats
+
+log = logging.getLogger("bdos.archive")
+
+SCHEMA = "archive"
+# Parents first: rows are copied in this order and deleted in the reverse one
+# (the search index triggers on the hot tables join children to their project).
+TABLES = ("projects", "project_stages", "project_checklist", "project_deliverables", "deliverable_revisions",
+          "tasks", "opportunities", "approvals", "project_rollups")
+
+hot = {name: Base.metadata.tables[name] for name in TABLES}
+
+def _archive_tables() -> dict[str, Table]:
+    """Copies of the hot tables in the archive schema: same columns and indexes (unique
+    constraints become plain indexes), no foreign keys, since they point across databases."""
+    metadata = MetaData(schema=SCHEMA)
+    tables = {}
+    for name, source in hot.items():
+        table = Table(name, metadata, *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in source.columns])
+        for index in source.indexes:
+            Index(index.name, *[table.c[c.name] for c in index.columns])
+        for constraint in source.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                Index(constraint.name, *[table.c[c.name] for c in constraint.columns])
+        tables[name] = table
+    return tables
+
+cold = _archive_tables()
+
+def enabled() -> bool:
+    if not settings.archive_enabled:
+        return False
+    url = make_url(settings.db_url)
+    return url.get_backend_name() == "postgresql" or (url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"))
+
+def _sqlite() -> bool:
+    return make_url(settings.db_url).get_backend_name() == "sqlite"
+
+# ---- engines
+
+_lock = threading.Lock()
+_engines: dict[str, Engine] = {}
+_view_sessions = None
+
+def mover_engine() -> Engine:
+    """The main database, with the archive tables reachable as archive.<table>."""
+    with _lock:
+        if "mover" not in _engines:
+            engine = create_engine(settings.db_url, poolclass=NullPool, connect_args=_connect_args(settings.db_url))
+            configure(engine)
+            if _sqlite():
+                path = os.path.abspath(settings.archive_sqlite_path)
+
+                @event.listens_for(engine, "connect")
+                def _attach(dbapi_connection, connection_record):
+                    dbapi_connection.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+            _engines["mover"] = engine
+        return _engines["mover"]
+
+def _view_engine() -> Engine:
+    if _sqlite():
+        url = f"sqlite:///{os.path.abspath(settings.archive_sqlite_path)}"
+        hot_path = os.path.abspath(make_url(settings.db_url).database)
+        engine = create_engine(url, connect_args=_connect_args(url), **_pool_args(url, settings.read_pool_size, settings.read_pool_max_overflow))
+
+        @event.listens_for(engine, "connect")
+        def _attach(dbapi_connection, connection_record):
+            dbapi_connection.execute("ATTACH DATABASE ? AS hot", (hot_path,))
+    else:
+        engine = create_engine(settings.db_url, **_pool_args(settings.db_url, settings.read_pool_size, settings.read_pool_max_overflow))
+
+        @event.listens_for(engine, "connect")
+        def _search_path(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET search_path TO {SCHEMA}, public")
+            cursor.close()
+    configure(engine, read_only=True)
+    sqlstats.install(engine)
+    return engine
+
+def read_session() -> ReadSession:
+    """A ReadSession on the archive view: archived projects' rows, with everything else
+    (orgs, accounts, users, stage templates, activity) read from the hot database."""
+    global _view_sessions
+    with _lock:
+        if _view_sessions is None:
+            _view_sessions = sessionmaker(autoflush=False, bind=_view_engine(), info={"read_only": True})
+    return ReadSession(_view_sessions(), archived=True)
+
+# ---- schema
+
+def ensure_schema(conn: Connection):
+    """Create the archive tables and indexes, and add columns the hot tables gained since."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+    cold_metadata = next(iter(cold.values())).metadata
+    cold_metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for name, table in cold.items():
+        existing = {c["name"] for c in inspector.get_columns(name, schema=SCHEMA)}
+        for col in table.columns:
+            if col.name not in existing:
+                conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(col.name)} "
+                                  f"{col.type.compile(dialect=conn.dialect)}"))
+
+# ---- moving rows
+
+def _scope(tables: dict[str, Table], name: str, project_ids: list[int]):
+    """WHERE clause selecting the rows of `name` that belong to `project_ids`, within `tables`."""
+    c = tables[name].c
+    stages = select(tables["project_stages"].c.id).where(tables["project_stages"].c.project_id.in_(project_ids))
+    if name == "projects":
+        return c.id.in_(project_ids)
+    if name in ("project_checklist", "project_deliverables", "approvals"):
+        return c.project_stage_id.in_(stages)
+    if name == "deliverable_revisions":
+        deliverables = tables["project_deliverables"]
+        return c.deliverable_id.in_(select(deliverables.c.id).where(deliverables.c.project_stage_id.in_(stages)))
+    return c.project_id.in_(project_ids)
+
+def _move(db: Session, source: dict[str, Table], target: dict[str, Table], project_ids: list[int]) -> int:
+    """Copy the projects' rows from `source` to `target` and delete them from `source`; returns rows moved."""
+    for name in reversed(TABLES):  # left over from an interrupted run
+        db.execute(delete(target[name]).where(_scope(target, name, project_ids)))
+    moved = 0
+    for name in TABLES:
+        columns = [c.name for c in target[name].columns]
+        moved += db.execute(insert(target[name]).from_select(
+            columns, select(*[source[name].c[col] for col in columns]).where(_scope(source, name, project_ids)))).rowcount
+    for name in reversed(TABLES):
+        db.execute(delete(source[name]).where(_scope(source, name, project_ids)))
+    return moved
+
+def _newest_owners(db: Session) -> set[int]:
+    """Projects owning the newest row of a hot table. SQLite gives a new row max(id) + 1,
+    so deleting the newest row would let the next insert reuse an id the archive holds;
+    those projects wait for a later run, by when newer rows exist."""
+    owners = set()
+    stages, deliverables = hot["project_stages"], hot["project_deliverables"]
+    for name in TABLES[:-1]:  # project_rollups is keyed by project
+        c = hot[name].c
+        if name == "projects":
+            query = select(c.id)
+        elif name in ("project_checklist", "project_deliverables", "approvals"):
+            query = select(stages.c.project_id).join(stages, stages.c.id==c.project_stage_id)
+        elif name == "deliverable_revisions":
+            query = select(stages.c.project_id).join(deliverables, deliverables.c.id==c.deliverable_id).join(stages, stages.c.id==deliverables.c.project_stage_id)
+        else:
+            query = select(c.project_id)
+        owners.update(db.scalars(query.where(c.id==select(func.max(c.id)).scalar_subquery())))
+    return owners
+
+def candidates(db: Session, days: int) -> list[int]:
+    """Done projects not updated (no change shown on their pages: see pagecache.bump_project) for `days` days."""
+    projects = hot["projects"]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    ids = db.scalars(select(projects.c.id).where(projects.c.status=="done", func.coalesce(projects.c.updated_at, projects.c.created_at) < cutoff)
+                     .order_by(projects.c.id)).all()
+    newest = _newest_owners(db)
+    return [pid for pid in ids if pid not in newest]
+
+@dataclass
+class Summary:
+    projects: int
+    rows: int
+    seconds: float
+
+def run(days: int | None = None, limit: int | None = None) -> Summary:
+    """Archive every candidate project (at most `limit`), one transaction per batch."""
+    start = time.perf_counter()
+    days = settings.archive_after_days if days is None else days
+    projects, moved = 0, 0
+    with Session(mover_engine()) as db:
+        ensure_schema(db.connection())
+        db.commit()
+        ids = candidates(db, days)[:limit]
+        db.rollback()
+        for i in range(0, len(ids), settings.archive_batch_size):
+            batch = ids[i:i + settings.archive_batch_size]
+            orgs = set(db.scalars(select(hot["projects"].c.org_id).where(hot["projects"].c.id.in_(batch)).distinct()))
+            # A fresh rollup, frozen (no due date left to pass), and a version bump so cached pages
+            # and ETags from before the move don't match.
+            rollups.refresh_projects(db, batch)
+            db.execute(update(hot["project_rollups"]).where(hot["project_rollups"].c.project_id.in_(batch)).values(next_due_at=None))
+            db.execute(update(hot["projects"]).where(hot["projects"].c.id.in_(batch))
+                       .values(version=hot["projects"].c.version + 1, updated_at=hot["projects"].c.updated_at))
+            moved += _move(db, hot, cold, batch)
+            for org_id in orgs:
+                rollups.refresh_org(db, org_id)
+            db.commit()
+            projects += len(batch)
+            log.info("archived %d/%d projects", projects, len(ids))
+    return Summary(projects, moved, time.perf_counter() - start)
+
+def restore(project_ids: list[int], org_id: int | None = None) -> list[int]:
+    """Move archived projects (of `org_id`, if given) back to the hot tables; returns the ids restored."""
+    projects = cold["projects"]
+    with Session(mover_engine()) as db:
+        ensure_schema(db.connection())
+        query = select(projects.c.id).where(projects.c.id.in_(project_ids))
+        if org_id is not None:
+            query = query.where(projects.c.org_id==org_id)
+        ids = db.scalars(query).all()
+        if not ids:
+            db.rollback()
+            return []
+        _move(db, cold, hot, ids)
+        # Restored projects count as just updated, so the next run doesn't take them straight back.
+        db.execute(update(hot["projects"]).where(hot["projects"].c.id.in_(ids))
+                   .values(version=hot["projects"].c.version + 1, updated_at=datetime.utcnow()))
+        rollups.refresh_projects(db, ids)
+        for org in set(db.scalars(select(hot["projects"].c.org_id).where(hot["projects"].c.id.in_(ids)).distinct())):
+            rollups.refresh_org(db, org)
+        # The insert triggers indexed deliverables by their preview; put the full text back.
+        d, stages = hot["project_deliverables"], hot["project_stages"]
+        for did, version in db.execute(select(d.c.id, d.c.version).join(stages, stages.c.id==d.c.project_stage_id)
+                                       .where(stages.c.project_id.in_(ids), d.c.head_revision_id!=None)):
+            search.set_body(db, "deliverable", did, revisions.load(db, did, version))
+        db.commit()
+    return list(ids)
+
+def counts() -> dict[str, tuple[int, int]]:
+    """table -> (hot rows, archived rows)."""
+    with Session(mover_engine()) as db:
+        ensure_schema(db.connection())
+        db.commit()
+        return {name: (db.scalar(select(func.count()).select_from(hot[name])), db.scalar(select(func.count()).select_from(cold[name])))
+                for name in TABLES}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Move finished projects to the archive and back.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="archive done projects not updated for --days")
+    run_parser.add_argument("--days", type=int, default=settings.archive_after_days, help=f"default {settings.archive_after_days}")
+    run_parser.add_argument("--dry-run", action="store_true", help="only count the projects that would move")
+    restore_parser = commands.add_parser("restore", help="move projects back to the hot tables")
+    restore_parser.add_argument("project_ids", type=int, nargs="+")
+    commands.add_parser("status", help="hot and archived row counts")
+    args = parser.parse_args(argv)
+    if not enabled():
+        parser.error("archival is off: set archive_enabled (SQLite needs a database file)")
+    if args.command == "run" and args.dry_run:
+        with Session(mover_engine()) as db:
+            print(f"{len(candidates(db, args.days)):,} projects would be archived")
+    elif args.command == "run":
+        summary = run(args.days)
+        print(f"archived {summary.projects:,} projects ({summary.rows:,} rows) in {summary.seconds:.1f} s")
+    elif args.command == "restore":
+        restored = restore(args.project_ids)
+        missing = sorted(set(args.project_ids) - set(restored))
+        print(f"restored {len(restored)} projects" + (f"; not in the archive: {', '.join(map(str, missing))}" if missing else ""))
+    else:
+        for name, (hot_rows, archived) in counts().items():
+            print(f"{name:<24} {hot_rows:>12,} hot {archived:>12,} archived")
+
+if __name__ == "__main__":
+    main()
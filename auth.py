@@ -1,3 +1,9 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from passlib.context import CryptContext
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from fastapi import Request
@@ -14,6 +20,13 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
+# bcrypt is deliberately slow; run it on its own small pool so a burst of
+# logins queues here instead of occupying the request threadpool.
+_bcrypt_pool = ThreadPoolExecutor(max_workers=settings.bcrypt_workers, thread_name_prefix="bcrypt")
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_bcrypt_pool, verify_password, password, hashed)
+
 def create_session_token(user_id: int) -> str:
     return serializer.dumps({"user_id": user_id})
 
@@ -29,3 +42,54 @@ def get_current_user_id(request: Request) -> int | None:
     if not token:
         return None
     return read_session_token(token)
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    org_id: int
+    name: str
+    is_admin: bool
+
+class UserCache:
+    """TTL + LRU cache of session token -> UserSnapshot."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, UserSnapshot]] = OrderedDict()
+
+    def get(self, token: str) -> UserSnapshot | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: UserSnapshot):
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every session of a user, e.g. after their name/role/org changes."""
+        with self._lock:
+            for token in [t for t, (_, u) in self._entries.items() if u.id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
@@ -0,0 +1,154 @@
+"""Batched JSON mutations for the stage and task pages.
+
+`POST /api/batch` takes a list of operations, checks that every row they name
+belongs to the user's org with a single query, applies them in order in one
+transaction and returns only the rows that changed.
+"""
+from datetime import datetime
+from typing import Annotated, Literal, Union
+from pydantic import BaseModel, Field
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import Session
+from .auth import UserSnapshot
+from .models import Project, ProjectStage, ProjectChecklist, ProjectDeliverable, Task
+from .stages import mark_started
+from . import rollups, pagecache, revisions, events, activity, reminders
+
+MAX_OPS = 500
+
+class ToggleChecklist(BaseModel):
+    op: Literal["checklist.toggle"]
+    id: int
+
+class SetTaskStatus(BaseModel):
+    op: Literal["task.status"]
+    id: int
+    status: Literal["todo", "doing", "done"]
+
+class SaveDeliverable(BaseModel):
+    op: Literal["deliverable.save"]
+    id: int
+    content: str = Field("", max_length=20_000_000)
+    base: int | None = None  # head revision the editor started from; None for a first save
+
+Operation = Annotated[Union[ToggleChecklist, SetTaskStatus, SaveDeliverable], Field(discriminator="op")]
+
+class Batch(BaseModel):
+    ops: list[Operation] = Field(min_length=1, max_length=MAX_OPS)
+
+MODELS = {"checklist.toggle": ProjectChecklist, "task.status": Task, "deliverable.save": ProjectDeliverable}
+
+class Rejected(Exception):
+    """The batch was refused before anything was applied; `indexes` are the offending ops."""
+    status_code = 400
+    error = "rejected"
+
+    def __init__(self, indexes: list[int]):
+        super().__init__(indexes)
+        self.indexes = indexes
+
+class UnknownRows(Rejected):
+    """Rows outside the user's org, or that don't exist."""
+    status_code = 404
+    error = "not found"
+
+class StaleRevision(Rejected):
+    """Deliverables saved by someone else since the editor loaded them."""
+    status_code = 409
+    error = "conflict"
+
+class DuplicateSave(Rejected):
+    """A deliverable saved more than once in the batch: every save carries the same
+    base, so a later one would silently overwrite the earlier."""
+    error = "duplicate deliverable save"
+
+def _ownership(org_id: int, ids: dict[str, set[int]]):
+    """One UNION ALL over the requested kinds: (op, row id, project id) for every row in the org."""
+    parts = []
+    if ids["checklist.toggle"]:
+        parts.append(select(literal("checklist.toggle").label("op"), ProjectChecklist.id, ProjectStage.project_id)
+                     .join(ProjectStage, ProjectChecklist.project_stage_id==ProjectStage.id).join(Project, ProjectStage.project_id==Project.id)
+                     .where(Project.org_id==org_id, ProjectChecklist.id.in_(ids["checklist.toggle"])))
+    if ids["deliverable.save"]:
+        parts.append(select(literal("deliverable.save").label("op"), ProjectDeliverable.id, ProjectStage.project_id)
+                     .join(ProjectStage, ProjectDeliverable.project_stage_id==ProjectStage.id).join(Project, ProjectStage.project_id==Project.id)
+                     .where(Project.org_id==org_id, ProjectDeliverable.id.in_(ids["deliverable.save"])))
+    if ids["task.status"]:
+        parts.append(select(literal("task.status").label("op"), Task.id, Task.project_id)
+                     .join(Project, Task.project_id==Project.id)
+                     .where(Project.org_id==org_id, Task.id.in_(ids["task.status"])))
+    return parts[0] if len(parts) == 1 else union_all(*parts)
+
+def apply(db: Session, user: UserSnapshot, ops: list[Operation]) -> dict:
+    """Apply `ops` in order without committing; raises a Rejected subclass before changing anything."""
+    ids: dict[str, set[int]] = {kind: set() for kind in MODELS}
+    duplicates = []
+    for i, op in enumerate(ops):
+        if op.op == "deliverable.save" and op.id in ids[op.op]:
+            duplicates.append(i)
+        ids[op.op].add(op.id)
+    if duplicates:
+        raise DuplicateSave(duplicates)
+    owned = {(kind, rid): pid for kind, rid, pid in db.execute(_ownership(user.org_id, ids))}
+    missing = [i for i, op in enumerate(ops) if (op.op, op.id) not in owned]
+    if missing:
+        raise UnknownRows(missing)
+
+    rows = {kind: {r.id: r for r in db.query(model).filter(model.id.in_(ids[kind]))} if ids[kind] else {}
+            for kind, model in MODELS.items()}
+    checklist, tasks, deliverables = rows["checklist.toggle"], rows["task.status"], rows["deliverable.save"]
+    stale = [i for i, op in enumerate(ops) if op.op == "deliverable.save" and deliverables[op.id].head_revision_id != op.base]
+    if stale:
+        raise StaleRevision(stale)
+    old_status = {t.id: t.status for t in tasks.values()}
+    now = datetime.utcnow()
+    started: set[int] = set()
+    for op in ops:
+        if op.op == "checklist.toggle":
+            c = checklist[op.id]
+            c.done = not c.done
+            c.done_by = user.id if c.done else None
+            c.done_at = now if c.done else None
+            started.add(c.project_stage_id)
+            detail = "done" if c.done else "not done"
+        elif op.op == "task.status":
+            tasks[op.id].status = op.status
+            detail = op.status
+        else:
+            d = deliverables[op.id]
+            revisions.save(db, d, op.content, user.id)
+            detail = f"v{d.version}"
+            d.updated_at = now
+            d.status = "submitted" if op.content.strip() else "draft"
+            started.add(d.project_stage_id)
+        activity.record(db, user, op.op, owned[(op.op, op.id)], op.id, detail)
+
+    for t in tasks.values():
+        if t.status != old_status[t.id]:
+            rollups.on_task_status(db, user.org_id, t.project_id, t, old_status[t.id])
+            reminders.track(db, t)
+    for psid in sorted(started):
+        mark_started(db, psid)
+    pagecache.bump_project(db, *sorted(set(owned.values())))
+    db.flush()
+    changed = {"checklist": [events.checklist_row(c) for c in checklist.values()],
+               "tasks": [events.task_row(t) for t in tasks.values()],
+               "deliverables": [events.deliverable_row(d) for d in deliverables.values()],
+               "stages": events.stage_rows(db, started)}
+    _publish(db, owned, changed)
+    return changed
+
+def _publish(db: Session, owned: dict[tuple[str, int], int], changed: dict):
+    """Split the changed rows by project for the live pages."""
+    by_project: dict[int, dict[str, list]] = {}
+    stage_project = {}
+    for kind, key in (("checklist.toggle", "checklist"), ("task.status", "tasks"), ("deliverable.save", "deliverables")):
+        for row in changed[key]:
+            project_id = owned[(kind, row["id"])]
+            by_project.setdefault(project_id, {}).setdefault(key, []).append(row)
+            if "project_stage_id" in row:
+                stage_project[row["project_stage_id"]] = project_id
+    for row in changed["stages"]:
+        by_project.setdefault(stage_project[row["id"]], {}).setdefault("stages", []).append(row)
+    for project_id, rows in by_project.items():
+        events.publish(db, project_id, **rows)
@@ -0,0 +1,876 @@
+"""Benchmarks. Run from the directory containing the `app` package:
+
+    python -m app.bench <name> [--n N]
+"""
+import argparse
+import statistics
+import time
+
+BENCHMARKS = {}
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__.removeprefix("bench_")] = fn
+    return fn
+
+def timed(label: str, fn, repeat: int = 5):
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    print(f"{label:<48} best {min(runs)*1000:10.2f} ms   median {statistics.median(runs)*1000:10.2f} ms")
+    return result
+
+@benchmark
+def bench_analytics(args):
+    """Pipeline/win-rate/cycle-time aggregates over N synthetic opportunities vs a row-by-row loop."""
+    import numpy as np
+    from . import analytics
+    rng = np.random.default_rng(0)
+    n = args.n or 1_000_000
+    otype_codes = rng.integers(0, len(analytics.OPP_TYPES) - 1, n)
+    stage_codes = rng.integers(0, len(analytics.OPP_STAGES) - 1, n)
+    values = np.where(rng.random(n) < 0.1, -1, rng.integers(1_000, 1_000_000, n))
+    probs = np.where(rng.random(n) < 0.1, -1, rng.integers(0, 101, n))
+    # Shaped like the result rows load_opportunities() fetches.
+    rows = list(zip(otype_codes.tolist(), stage_codes.tolist(), values.tolist(), probs.tolist()))
+    print(f"{n:,} opportunities")
+
+    cols = timed("result rows -> column arrays", lambda: analytics._columns(rows, 4))
+    otype, stage = cols[:, 0].astype(np.int64), cols[:, 1].astype(np.int64)
+    value, prob = np.where(cols[:, 2] < 0, np.nan, cols[:, 2]), np.where(cols[:, 3] < 0, np.nan, cols[:, 3])
+    n_types, n_stages = len(analytics.OPP_TYPES), len(analytics.OPP_STAGES)
+    agg = timed("pipeline_by_type_and_stage (numpy)", lambda: analytics.pipeline_by_type_and_stage(otype, stage, value, prob, n_types, n_stages))
+    stages = analytics.OPP_STAGES
+    timed("win_rates (numpy)", lambda: analytics.win_rates(agg["count"], stages.index("won"), stages.index("lost")))
+
+    def row_by_row():
+        out = {}
+        for t, s, v, p in rows:
+            cell = out.setdefault((t, s), [0, 0.0, 0.0])
+            cell[0] += 1
+            v, p = max(v, 0), max(p, 0)
+            cell[1] += v
+            cell[2] += v * p / 100.0
+        return out
+    timed("pipeline (python row-by-row baseline)", row_by_row, repeat=2)
+
+    stage_id = rng.integers(1, 13, n)
+    hours = rng.gamma(2.0, 48.0, n)
+    timed("cycle_time_stats (numpy)", lambda: analytics.cycle_time_stats(stage_id, hours))
+
+@benchmark
+def bench_import(args):
+    """Chunked account import of N CSV rows (10% duplicates) into a scratch SQLite database."""
+    import csv, os, tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from .db import Base
+    from .models import Org, User, ImportJob
+    from . import importer
+    n = args.n or 200_000
+    unique = max(n - n // 10, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "accounts.csv")
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["name", "industry", "size", "country"])
+            for i in range(n):
+                w.writerow([f"Account {i % unique}", "Tech", "50-200", "EG"])
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+        with Session() as db:
+            org = Org(name="Bench")
+            db.add(org)
+            db.flush()
+            user = User(org_id=org.id, name="Bench", email="bench@local", password_hash="-")
+            db.add(user)
+            db.flush()
+            job = ImportJob(org_id=org.id, user_id=user.id, entity="accounts", fmt="csv", source_path=path, status="pending")
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        print(f"{n:,} account rows, chunk size {importer.settings.import_chunk_size}")
+        start = time.perf_counter()
+        importer.run_import(job_id, session_factory=Session)
+        elapsed = time.perf_counter() - start
+        with Session() as db:
+            job = db.get(ImportJob, job_id)
+            print(f"status {job.status}: {job.rows_inserted:,} inserted, {job.rows_duplicate:,} duplicates, {job.rows_failed:,} failed")
+        print(f"{elapsed:.2f} s   {n / elapsed:,.0f} rows/s")
+        engine.dispose()
+
+@benchmark
+def bench_search(args):
+    """Full-text search over N documents (accounts, contacts, tasks, opportunity notes) in 10 orgs."""
+    import itertools, os, random, tempfile
+    from sqlalchemy import create_engine, insert, text
+    from sqlalchemy.orm import Session
+    from .db import Base
+    from .models import Org, Account, Contact, Project, Task, Opportunity
+    from . import search
+    n = args.n or 1_000_000
+    rnd = random.Random(0)
+    vocab = [f"{rnd.choice('bcdfgklmnprstvz')}{rnd.choice('aeiou')}{rnd.choice('bcdfgklmnprstvz')}{rnd.choice('aeiou')}{i:x}" for i in range(20_000)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))  # Zipf-like word frequencies
+    def words(k: int) -> str:
+        return " ".join(rnd.choices(vocab, cum_weights=cum_weights, k=k))
+
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}")
+    Base.metadata.create_all(engine)
+    search.ensure_index(engine)
+    orgs, batch = 10, 10_000
+    per_kind = {"account": n // 4, "contact": n // 4, "task": n - 2 * (n // 4) - n // 5, "opportunity": n // 5}
+    with engine.begin() as conn:
+        conn.execute(insert(Org), [{"name": f"Org {i}"} for i in range(orgs)])
+        start = time.perf_counter()
+        for i in range(0, per_kind["account"], batch):
+            conn.execute(insert(Account), [{"org_id": j % orgs + 1, "name": words(3), "industry": words(2)} for j in range(i, min(i + batch, per_kind["account"]))])
+        conn.execute(insert(Project), [{"org_id": j % orgs + 1, "account_id": j + 1, "name": f"Project {j}"} for j in range(1000)])
+        for i in range(0, per_kind["contact"], batch):
+            conn.execute(insert(Contact), [{"account_id": j % per_kind["account"] + 1, "name": words(2), "title": words(3)} for j in range(i, min(i + batch, per_kind["contact"]))])
+        for i in range(0, per_kind["task"], batch):
+            conn.execute(insert(Task), [{"project_id": j % 1000 + 1, "title": words(6)} for j in range(i, min(i + batch, per_kind["task"]))])
+        for i in range(0, per_kind["opportunity"], batch):
+            conn.execute(insert(Opportunity), [{"project_id": j % 1000 + 1, "title": words(4), "notes": words(30)} for j in range(i, min(i + batch, per_kind["opportunity"]))])
+        elapsed = time.perf_counter() - start
+    print(f"{n:,} documents inserted with trigger indexing in {elapsed:.1f} s ({n / elapsed:,.0f} docs/s, text generation included)")
+    with engine.begin() as conn:
+        timed("rebuild (all kinds + optimize)", lambda: search.rebuild(conn), repeat=1)
+
+    queries = {"common word": vocab[0], "mid-frequency word": vocab[300], "rare word": vocab[15_000],
+               "two words": f"{vocab[5]} {vocab[40]}", "prefix (3 chars)": vocab[300][:3]}
+    with Session(engine) as db:
+        for label, q in queries.items():
+            runs = []
+            for i in range(50):
+                start = time.perf_counter()
+                page = search.search(db, i % orgs + 1, q)
+                runs.append(time.perf_counter() - start)
+            runs.sort()
+            print(f"search {label:<28} p50 {_percentile(runs, 0.5)*1000:8.2f} ms   p99 {_percentile(runs, 0.99)*1000:8.2f} ms   ({len(page.hits)} hits/page)")
+        timed(f"LIKE scan baseline ({queries['mid-frequency word']})", lambda: search._like_search(db, 1, "", [vocab[300]], None, 0, 20), repeat=3)
+        size = db.execute(text("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()")).scalar()
+        print(f"database size {size / 2**20:,.0f} MiB")
+
+@benchmark
+def bench_revisions(args):
+    """Deliverable history for a >1 MB document: N saved revisions of small edits, per codec."""
+    import os, random, tempfile
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import sessionmaker
+    from .config import settings
+    from .db import Base
+    from .models import ProjectDeliverable, DeliverableRevision
+    from . import revisions, search
+    n = args.n or 48
+    rnd = random.Random(0)
+    words = [f"w{i}" for i in range(5000)]
+    lines = [" ".join(rnd.choices(words, k=rnd.randint(4, 20))) + "\n" for _ in range(18000)]
+    codecs = ["zlib"] + (["zstd"] if revisions.zstandard else [])
+    print(f"document {sum(map(len, lines)) / 2**20:.2f} MiB, {len(lines):,} lines; {n} revisions of ~10 edited lines each;"
+          f" keyframe every {settings.revision_keyframe_interval}")
+    for codec in codecs:
+        settings.revision_codec = codec
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            search.ensure_index(engine)
+            Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+            doc = list(lines)
+            texts, save_times = [], []
+            with Session() as db:
+                d = ProjectDeliverable(project_stage_id=1, deliverable_id=1)
+                db.add(d)
+                db.commit()
+                for _ in range(n):
+                    for _ in range(10):
+                        doc[rnd.randrange(len(doc))] = " ".join(rnd.choices(words, k=12)) + "\n"
+                    text = "".join(doc)
+                    start = time.perf_counter()
+                    revisions.save(db, d, text, None)
+                    db.commit()
+                    save_times.append(time.perf_counter() - start)
+                    texts.append(text)
+                raw = sum(len(t.encode()) for t in texts)
+                stored = db.execute(select(func.sum(func.length(DeliverableRevision.data)))).scalar()
+                print(f"[{codec}] raw {raw / 2**20:,.1f} MiB -> stored {stored / 2**20:,.2f} MiB ({raw / stored:,.0f}x);"
+                      f" save median {sorted(save_times)[n // 2] * 1000:.1f} ms")
+                longest = max(range(1, n + 1), key=lambda k: (k - 1) % settings.revision_keyframe_interval)
+                assert revisions.load(db, d.id, n) == texts[-1] and revisions.load(db, d.id, longest) == texts[longest - 1]
+                timed(f"[{codec}] load keyframe (v1)", lambda: revisions.load(db, d.id, 1))
+                timed(f"[{codec}] load longest delta chain (v{longest})", lambda: revisions.load(db, d.id, longest))
+                timed(f"[{codec}] load head (v{n})", lambda: revisions.load(db, d.id, n))
+                timed(f"[{codec}] diff v{n - 1}..v{n}", lambda: revisions.diff(db, d.id, n - 1, n))
+                timed(f"[{codec}] stage row (id, size, preview)", lambda: db.execute(
+                    select(ProjectDeliverable.head_revision_id, ProjectDeliverable.content_size, ProjectDeliverable.preview)
+                    .where(ProjectDeliverable.id==d.id)).one())
+            engine.dispose()
+
+_BOOT = """
+import json, os, sys, time
+start = time.perf_counter()
+from {pkg}.config import settings
+settings.db_url = sys.argv[1]
+for name, path in (("template_cache_dir", "template_cache"), ("import_dir", "imports"),
+                   ("archive_sqlite_path", "archive.db"), ("reminder_outbox_path", "reminders.jsonl")):
+    setattr(settings, name, os.path.join(sys.argv[2], path))
+settings.rollup_reconcile_seconds = 0
+from {pkg}.main import on_startup
+from {pkg} import metrics
+imported = time.perf_counter()
+on_startup()
+print(json.dumps({{"import": imported - start, **metrics.registry.startup, "total": time.perf_counter() - start}}))
+"""
+
+@benchmark
+def bench_startup(args):
+    """Worker boot time: first boot on an empty database, warm reboots, and N workers booting at once."""
+    import json, os, subprocess, sys, tempfile
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = _BOOT.format(pkg=__package__)
+
+    def boot(url: str):
+        return subprocess.Popen([sys.executable, "-c", code, url, tmp], cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+    def report(label: str, procs):
+        runs = [json.loads(p.communicate()[0]) for p in procs]
+        phases = {k: max(r[k] for r in runs) for k in runs[0]}
+        print(f"{label:<30} " + "  ".join(f"{k} {v * 1000:7.1f}" for k, v in phases.items()) + "  (ms, slowest worker)")
+    n = args.n or 8
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'boot.db')}"
+        report("first boot", [boot(url)])
+        for i in range(3):
+            report(f"warm boot {i + 1}", [boot(url)])
+        url = f"sqlite:///{os.path.join(tmp, 'race.db')}"
+        report(f"{n} workers, empty database", [boot(url) for _ in range(n)])
+        report(f"{n} workers, warm", [boot(url) for _ in range(n)])
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def _scratch_settings(args, db_name: str = "bench.db") -> str:
+    """Point the database (unless --db-url) and every file the app writes (template cache,
+    import uploads, archive database, reminder outbox) into a new temporary directory.
+    Call before importing the app; returns the directory."""
+    import os, tempfile
+    from .config import settings
+    scratch = tempfile.mkdtemp()
+    settings.db_url = args.db_url or f"sqlite:///{os.path.join(scratch, db_name)}"
+    settings.template_cache_dir = os.path.join(scratch, "template_cache")
+    settings.import_dir = os.path.join(scratch, "imports")
+    settings.archive_sqlite_path = os.path.join(scratch, "archive.db")
+    settings.reminder_outbox_path = os.path.join(scratch, "reminders.jsonl")
+    return scratch
+
+def _scratch_app(args):
+    """Import the app against a scratch database seeded with 200 accounts and 100 projects
+    (20 tasks, 10 opportunities each). Returns (app, cookies, account_ids, project_ids, {project: stage id})."""
+    from .config import settings
+    _scratch_settings(args)
+    settings.rollup_reconcile_seconds = 0
+    from sqlalchemy import insert
+    from .main import app, on_startup
+    from .db import SessionLocal
+    from .models import User, Account, ProjectStage, Task, Opportunity
+    from .auth import create_session_token, COOKIE_NAME
+    from .stages import create_projects
+    from . import rollups
+    on_startup()
+    with SessionLocal() as db:
+        admin = db.query(User).filter(User.email=="admin@local").one()
+        account_ids = [a for a, in db.execute(insert(Account).returning(Account.id), [{"org_id": admin.org_id, "name": f"Account {i}", "owner_user_id": admin.id} for i in range(200)])]
+        project_ids = create_projects(db, admin.org_id, [{"account_id": account_ids[i % 200], "name": f"Project {i}", "package": "", "lead_source": ""} for i in range(100)])
+        db.execute(insert(Task), [{"project_id": p, "title": f"Task {i}", "status": "todo", "priority": "med"} for p in project_ids for i in range(20)])
+        db.execute(insert(Opportunity), [{"project_id": p, "title": f"Opp {i}", "otype": "deal", "stage": "new", "value_estimate": 1000} for p in project_ids for i in range(10)])
+        stage_ids = {p: ps for p, ps in db.query(ProjectStage.project_id, ProjectStage.id).filter(ProjectStage.project_id.in_(project_ids))}
+        db.commit()
+        rollups.reconcile_all(db)
+        cookies = {COOKIE_NAME: create_session_token(admin.id)}
+    return app, cookies, account_ids, project_ids, stage_ids
+
+@benchmark
+def bench_load(args):
+    """Requests/s and latency of the read pages with the sync (threadpool) vs async database path."""
+    import asyncio, random
+    import anyio.to_thread
+    import httpx
+    from .config import settings
+    n = args.n or 3000
+    app, cookies, account_ids, project_ids, stage_ids = _scratch_app(args)
+
+    rnd = random.Random(0)
+    def next_url():
+        p = rnd.choice(project_ids)
+        return rnd.choice(["/", "/accounts", f"/accounts/{rnd.choice(account_ids)}", f"/projects/{p}",
+                           f"/projects/{p}/stage/{stage_ids[p]}", f"/projects/{p}/tasks", f"/projects/{p}/opportunities"])
+
+    async def run(count: int) -> tuple[float, list[float]]:
+        latencies = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", cookies=cookies) as client:
+            async def worker(k: int):
+                for _ in range(k):
+                    start = time.perf_counter()
+                    r = await client.get(next_url())
+                    latencies.append(time.perf_counter() - start)
+                    assert r.status_code == 200, r.status_code
+            start = time.perf_counter()
+            per = [count // args.concurrency + (i < count % args.concurrency) for i in range(args.concurrency)]
+            await asyncio.gather(*(worker(k) for k in per))
+            return time.perf_counter() - start, sorted(latencies)
+
+    async def compare():
+        print(f"{n:,} requests, {args.concurrency} concurrent clients, "
+              f"threadpool limit {anyio.to_thread.current_default_thread_limiter().total_tokens:.0f}")
+        for mode in ("sync", "async"):
+            settings.async_db = mode == "async"
+            await run(min(n, 200))  # warm-up: connections, template cache, user cache
+            elapsed, lat = await run(n)
+            print(f"{mode:<6} {n / elapsed:10.0f} req/s   p50 {_percentile(lat, 0.5)*1000:8.2f} ms   "
+                  f"p99 {_percentile(lat, 0.99)*1000:8.2f} ms   max {lat[-1]*1000:8.2f} ms")
+    asyncio.run(compare())
+
+@benchmark
+def bench_pages(args):
+    """Cold template load with/without the bytecode cache; project page render vs cached HTML vs 304."""
+    import os, tempfile
+    from fastapi.testclient import TestClient
+    from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    names = Environment(loader=FileSystemLoader(directory)).list_templates()
+    cache_dir = tempfile.mkdtemp()
+
+    def cold_load(bytecode_cache=None):
+        env = Environment(loader=FileSystemLoader(directory), autoescape=True, bytecode_cache=bytecode_cache)
+        for name in names:
+            env.get_template(name)
+    print(f"{len(names)} templates")
+    timed("cold load, no bytecode cache", cold_load)
+    cold_load(FileSystemBytecodeCache(cache_dir))  # populate
+    timed("cold load, warm bytecode cache", lambda: cold_load(FileSystemBytecodeCache(cache_dir)))
+
+    from . import pagecache
+    n = args.n or 500
+    app, cookies, _, project_ids, _ = _scratch_app(args)
+    with TestClient(app, cookies=cookies) as client:
+        url = f"/projects/{project_ids[0]}"
+        etag = client.get(url).headers["etag"]
+        def miss():
+            for _ in range(n):
+                pagecache.fragments.clear()
+                client.get(url)
+        def hit():
+            for _ in range(n):
+                client.get(url)
+        def conditional():
+            for _ in range(n):
+                assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        for label, fn in (("full render", miss), ("cached HTML", hit), ("If-None-Match -> 304", conditional)):
+            timed(f"GET /projects/{{id}} x{n}: {label}", fn, repeat=3)
+
+@benchmark
+def bench_events(args):
+    """N idle SSE subscribers over 100 projects, driven through the ASGI app: connect time,
+    memory per subscriber, CPU while idle, and fan-out of one batch that touches every project."""
+    import asyncio, resource
+    import httpx
+    from .config import settings
+    from . import events
+    n = args.n or 5000
+    settings.sse_heartbeat_seconds = 1.0  # 15x the default, to make idle cost visible
+    app, cookies, _, project_ids, stage_ids = _scratch_app(args)
+    cookie = "; ".join(f"{k}={v}" for k, v in cookies.items()).encode()
+
+    streaming = 0
+
+    async def subscriber(project_id: int, gone: asyncio.Event, received: list):
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+                 "path": f"/projects/{project_id}/events", "raw_path": f"/projects/{project_id}/events".encode(), "query_string": b"",
+                 "root_path": "", "headers": [(b"host", b"bench"), (b"cookie", cookie)], "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+        requested = False
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+        async def send(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                streaming += 1
+            elif b"event: change" in message.get("body", b""):
+                received.append(time.perf_counter())
+        await app(scope, receive, send)
+
+    async def run():
+        from sqlalchemy import select
+        from .db import SessionLocal
+        from .models import ProjectChecklist
+        with SessionLocal() as db:
+            checklist = [db.scalar(select(ProjectChecklist.id).where(ProjectChecklist.project_stage_id==stage_ids[p]).limit(1)) for p in project_ids]
+        gone, received = asyncio.Event(), []
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(project_ids[i % len(project_ids)], gone, received)) for i in range(n)]
+        while streaming < n:
+            await asyncio.sleep(0.01)
+        connected = time.perf_counter() - start
+        grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+        print(f"{n:,} subscribers on {len(project_ids)} projects connected in {connected:.2f} s ({n / connected:,.0f}/s)")
+        print(f"memory: {grown / n:.1f} KiB per subscriber (peak RSS growth)")
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.sleep(5)
+        print(f"idle, heartbeat every {settings.sse_heartbeat_seconds:g} s: {(time.process_time() - cpu) / (time.perf_counter() - wall):.1%} of one core")
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", cookies=cookies) as client:
+            for attempt in range(3):
+                received.clear()
+                start = time.perf_counter()
+                r = await client.post("/api/batch", json={"ops": [{"op": "checklist.toggle", "id": cid} for cid in checklist]})
+                assert r.status_code == 200, r.text
+                committed = time.perf_counter() - start
+                while len(received) < n:
+                    await asyncio.sleep(0.001)
+                delays = sorted(t - start for t in received)
+                print(f"batch over {len(checklist)} projects -> {n:,} deliveries: request {committed * 1000:.1f} ms, "
+                      f"p50 {_percentile(delays, 0.5) * 1000:.1f} ms, last {delays[-1] * 1000:.1f} ms after the request started")
+
+        gone.set()
+        await asyncio.gather(*tasks)
+        print(f"disconnected, {events.hub.count()} subscriptions left")
+    asyncio.run(run())
+
+@benchmark
+def bench_activity(args):
+    """POST /tasks/{id}/set with the activity trail buffered vs written in the request's
+    transaction, then flush throughput of N buffered entries and the shutdown drain."""
+    import asyncio, random
+    from datetime import datetime
+    import httpx
+    from sqlalchemy import func, select
+    from .config import settings
+    from .db import SessionLocal
+    from .models import Activity, Task
+    from . import activity
+    n = args.n or 100_000
+    requests = 500
+    app, cookies, _, project_ids, _ = _scratch_app(args)
+    with SessionLocal() as db:
+        task_ids = db.scalars(select(Task.id)).all()
+
+    async def run() -> list[float]:
+        rnd = random.Random(0)
+        latencies = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", cookies=cookies) as client:
+            for i in range(requests + 20):
+                start = time.perf_counter()
+                r = await client.post(f"/tasks/{rnd.choice(task_ids)}/set", data={"status": rnd.choice(("todo", "doing", "done"))})
+                if i >= 20:
+                    latencies.append(time.perf_counter() - start)
+                assert r.status_code == 302, r.status_code
+        return sorted(latencies)
+
+    for sync in (True, False):
+        settings.activity_sync = sync
+        lat = asyncio.run(run())
+        print(f"POST /tasks/{{id}}/set, {'in-transaction' if sync else 'buffered':<14} {requests / sum(lat):8.0f} req/s   "
+              f"p50 {_percentile(lat, 0.5) * 1000:6.2f} ms   p99 {_percentile(lat, 0.99) * 1000:6.2f} ms")
+
+    activity.writer.stop()  # the rest drives flush() directly
+    now = datetime.utcnow()
+    entries = lambda: [{"org_id": 1, "project_id": project_ids[i % len(project_ids)], "user_id": 1, "kind": "task.status",
+                        "ref_id": i, "detail": "done", "created_at": now} for i in range(n)]
+    settings.activity_buffer_size = max(settings.activity_buffer_size, n)
+    activity.writer.extend(entries())
+    start = time.perf_counter()
+    written = activity.writer.flush()
+    elapsed = time.perf_counter() - start
+    print(f"flush of {written:,} buffered entries: {elapsed * 1000:.0f} ms ({written / elapsed:,.0f} rows/s)")
+
+    activity.writer.start()
+    activity.writer.extend(entries()[:10_000])
+    start = time.perf_counter()
+    activity.writer.stop()
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Activity))
+    print(f"shutdown drain: {time.perf_counter() - start:.2f} s, {len(activity.writer)} left buffered, {total:,} rows in the table, "
+          f"{activity.writer.dropped} dropped")
+
+@benchmark
+def bench_reminders(args):
+    """Due-date reminders over N open tasks (default 1M, due from 30 days ago to a year out):
+    heap rebuild for the default window and for every task, the cost of a task write, what a
+    polling scan would cost per tick, and sending throughput through the file outbox."""
+    import random, tracemalloc
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, select, text, func
+    from .config import settings
+    n = args.n or 1_000_000
+    _scratch_settings(args, "reminders.db")
+    from .db import engine, Base, SessionLocal
+    from .models import Org, Account, Project, Task
+    from . import reminders
+    Base.metadata.create_all(engine)
+    rnd = random.Random(0)
+    now = datetime.utcnow()
+    projects, batch = 1000, 50_000
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(Org), [{"name": "Bench org"}])
+        conn.execute(insert(Account), [{"org_id": 1, "name": "Bench account"}])
+        conn.execute(insert(Project), [{"org_id": 1, "account_id": 1, "name": f"Project {j}"} for j in range(projects)])
+        for i in range(0, n, batch):
+            conn.execute(insert(Task), [{"project_id": j % projects + 1, "title": f"Task {j}", "status": rnd.choice(reminders.OPEN_STATUSES),
+                                         "due_date": now + timedelta(minutes=rnd.randint(-30 * 1440, 365 * 1440))}
+                                        for j in range(i, min(i + batch, n))])
+        conn.execute(insert(Task), [{"project_id": j % projects + 1, "title": f"Done {j}", "status": "done",
+                                     "due_date": now + timedelta(minutes=rnd.randint(-30 * 1440, 365 * 1440))} for j in range(n // 10)])
+    print(f"{n:,} open and {n // 10:,} done tasks inserted in {time.perf_counter() - start:.1f} s")
+
+    sched = reminders.Scheduler()
+    with SessionLocal() as db:
+        plan = db.execute(text("EXPLAIN QUERY PLAN " + str(select(Task.id, Task.due_date, Task.reminder_state).where(
+            Task.status.in_(reminders.OPEN_STATUSES), Task.due_date > now, Task.due_date <= now)
+            .compile(engine, compile_kwargs={"literal_binds": True})))).all()
+        print("rebuild plan: " + "; ".join(row[-1] for row in plan))
+        for label, hours in (("default window", settings.reminder_window_hours), ("every open task", 400 * 24.0)):
+            settings.reminder_window_hours = hours
+            loaded = timed(f"rebuild, {label}", lambda: sched.rebuild(db), repeat=3)
+            tracemalloc.start()
+            sched.rebuild(db)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"  {loaded:,} tasks tracked, {len(sched):,} heap entries, ~{size / 2**20:,.1f} MiB")
+        ids = db.scalars(select(Task.id).where(Task.status != "done").limit(100_000)).all()
+        changes = [{task_id: now + timedelta(minutes=rnd.randint(1, 365 * 1440))} for task_id in ids]
+        start = time.perf_counter()
+        for change in changes:
+            sched.update(change)
+        elapsed = time.perf_counter() - start
+        print(f"update on task write (whole-table heap): {elapsed / len(changes) * 1e6:.2f} us each")
+
+        lead = now + timedelta(hours=settings.reminder_lead_hours)
+        timed("polling tick, full scan (status != 'done')", lambda: db.scalar(
+            select(func.count()).where(Task.status != "done", Task.due_date <= lead)), repeat=3)
+        timed("polling tick, index range (overdue + due soon)", lambda: db.scalar(
+            select(func.count()).where(Task.status.in_(reminders.OPEN_STATUSES), Task.due_date <= lead)), repeat=3)
+
+    settings.reminder_window_hours = 24.0
+    sched.notifier = reminders.load_notifier("outbox")
+    with SessionLocal() as db:
+        sched.rebuild(db)
+    start = time.perf_counter()
+    sent = sched.fire()
+    elapsed = time.perf_counter() - start
+    print(f"catch-up after rebuild: {sent:,} reminders sent in {elapsed * 1000:.0f} ms ({sent / elapsed:,.0f}/s, "
+          f"claim + outbox append + fsync per {reminders.CLAIM_CHUNK})")
+    with SessionLocal() as db:
+        sched.rebuild(db)
+    again = sched.fire()
+    with open(settings.reminder_outbox_path) as f:
+        lines = sum(1 for _ in f)
+    print(f"second worker rebuilding and firing the same window: {again} sent; outbox holds {lines:,} lines")
+
+def _route_scenarios(ctx) -> dict:
+    """(method, route template) -> fn(rnd) returning (request kwargs, accepted status codes).
+
+    Anything a request needs to be valid (the current head revision of a
+    deliverable, a finished import job) is looked up here, outside the timed window."""
+    from .db import SessionLocal
+    from .models import ProjectDeliverable
+    from . import revisions
+    cookies = ctx["cookies"]
+
+    def get(url, ok=(200,), **kw):
+        return lambda rnd: ({"method": "GET", "url": url(rnd) if callable(url) else url, "cookies": cookies, **kw}, ok)
+
+    def post(url, ok=(302,), **kw):
+        def make(rnd):
+            extra = {k: v(rnd) if callable(v) else v for k, v in kw.items()}
+            return {"method": "POST", "url": url(rnd) if callable(url) else url, "cookies": cookies, **extra}, ok
+        return make
+
+    pick = lambda key: (lambda rnd: rnd.choice(ctx[key]))
+    project = pick("projects")
+    def stage(rnd):
+        return rnd.choice(ctx["stages"])  # (project_stage_id, project_id)
+    def deliverable_form(rnd):
+        did, psid, pid = rnd.choice(ctx["deliverables"])
+        with SessionLocal() as db:
+            d = db.get(ProjectDeliverable, did)
+            text = revisions.load(db, did, d.version) if d.head_revision_id else ""
+        return {"method": "POST", "url": f"/projects/{pid}/stage/{psid}/deliverable", "cookies": cookies,
+                "data": {"did": did, "content": (text or "") + f"\nEdit {rnd.random():.6f}.", "base": d.head_revision_id or ""}}, (302,)
+    def batch_ops(rnd):
+        did, _, _ = rnd.choice(ctx["deliverables"])
+        with SessionLocal() as db:
+            base = db.get(ProjectDeliverable, did).head_revision_id
+        ops = [{"op": "checklist.toggle", "id": rnd.choice(ctx["checklist"])[0]} for _ in range(3)]
+        ops += [{"op": "task.status", "id": rnd.choice(ctx["tasks"]), "status": rnd.choice(("todo", "doing", "done"))} for _ in range(3)]
+        ops.append({"op": "deliverable.save", "id": did, "content": f"Batch edit {rnd.random():.6f}.", "base": base})
+        return {"method": "POST", "url": "/api/batch", "cookies": cookies, "json": {"ops": ops}}, (200,)
+    def checklist_form(rnd):
+        cid, psid, pid = rnd.choice(ctx["checklist"])
+        return {"method": "POST", "url": f"/projects/{pid}/stage/{psid}/toggle", "cookies": cookies, "data": {"cid": cid}}, (302,)
+    def revision(rnd):
+        did, version = rnd.choice(ctx["revised"])
+        return f"/deliverables/{did}/revisions/{rnd.randint(1, version)}"
+
+    accounts_csv = "name,industry,country\n" + "".join(f"Imported {i},Retail,Egypt\n" for i in range(50))
+    return {
+        ("GET", "/"): get("/"),
+        ("GET", "/metrics"): get("/metrics"),
+        ("GET", "/login"): get("/login"),
+        ("POST", "/login"): post("/login", data={"email": ctx["email"], "password": ctx["password"]}),
+        ("GET", "/logout"): lambda rnd: ({"method": "GET", "url": "/logout", "cookies": ctx["throwaway_cookies"]}, (302,)),
+        ("GET", "/accounts"): get(lambda rnd: f"/accounts?page={rnd.randint(1, 10)}"),
+        ("GET", "/accounts/new"): get("/accounts/new"),
+        ("POST", "/accounts/new"): post("/accounts/new", data=lambda rnd: {"name": f"Bench account {rnd.random():.6f}", "industry": "Retail"}),
+        ("GET", "/accounts/{account_id}"): get(lambda rnd: f"/accounts/{rnd.choice(ctx['accounts'])}"),
+        ("GET", "/projects/new/{account_id}"): get(lambda rnd: f"/projects/new/{rnd.choice(ctx['accounts'])}"),
+        ("POST", "/projects/new/{account_id}"): post(lambda rnd: f"/projects/new/{rnd.choice(ctx['accounts'])}", data={"name": "Bench project"}),
+        ("POST", "/projects/bulk"): post("/projects/bulk", ok=(200,),
+                                         json=lambda rnd: [{"account_id": rnd.choice(ctx["accounts"]), "name": f"Bulk {i}"} for i in range(10)]),
+        ("GET", "/projects/{project_id}"): get(lambda rnd: f"/projects/{project(rnd)}"),
+        ("GET", "/projects/{project_id}/events"): get(lambda rnd: f"/projects/{project(rnd)}/events?since=-1"),  # resyncs and ends at once
+        ("GET", "/projects/{project_id}/stage/{project_stage_id}"): get(lambda rnd: "/projects/{1}/stage/{0}".format(*stage(rnd))),
+        ("POST", "/projects/{project_id}/restore"): post(lambda rnd: f"/projects/{project(rnd)}/restore"),  # not archived: no-op
+        ("POST", "/projects/{project_id}/stage/{project_stage_id}/toggle"): checklist_form,
+        ("POST", "/projects/{project_id}/stage/{project_stage_id}/deliverable"): deliverable_form,
+        ("POST", "/projects/{project_id}/stage/{project_stage_id}/approve"): post(
+            lambda rnd: "/projects/{1}/stage/{0}/approve".format(*stage(rnd)), data=lambda rnd: {"decision": rnd.choice(("approve", "reject"))}),
+        ("GET", "/deliverables/{deliverable_id}/edit"): get(lambda rnd: f"/deliverables/{rnd.choice(ctx['revised'])[0]}/edit"),
+        ("GET", "/deliverables/{deliverable_id}/revisions"): get(lambda rnd: f"/deliverables/{rnd.choice(ctx['revised'])[0]}/revisions"),
+        ("GET", "/deliverables/{deliverable_id}/revisions/{number}"): get(revision),
+        ("GET", "/deliverables/{deliverable_id}/diff"): get(lambda rnd: f"/deliverables/{rnd.choice(ctx['revised'])[0]}/diff"),
+        ("GET", "/reports"): get("/reports"),
+        ("GET", "/search"): get(lambda rnd: f"/search?q={rnd.choice(('pilot', 'market', 'renewal partner', 'tender'))}"),
+        ("GET", "/export/{entity}"): get(lambda rnd: f"/export/{rnd.choice(('accounts', 'tasks', 'opportunities'))}"),
+        ("POST", "/import/{entity}"): post("/import/accounts", ok=(202,), files={"file": ("accounts.csv", accounts_csv, "text/csv")}),
+        ("GET", "/import/jobs/{job_id}"): get(lambda rnd: f"/import/jobs/{ctx['import_job']}"),
+        ("POST", "/import/jobs/{job_id}/resume"): post(lambda rnd: f"/import/jobs/{ctx['import_job']}/resume", ok=(409,)),  # job is done
+        ("GET", "/projects/{project_id}/tasks"): get(lambda rnd: f"/projects/{project(rnd)}/tasks"),
+        ("POST", "/projects/{project_id}/tasks/new"): post(lambda rnd: f"/projects/{project(rnd)}/tasks/new", data={"title": "Bench task", "due_date": "2026-12-31"}),
+        ("POST", "/tasks/{task_id}/due"): post(lambda rnd: f"/tasks/{rnd.choice(ctx['tasks'])}/due",
+                                                data=lambda rnd: {"due_date": f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"}),
+        ("POST", "/tasks/{task_id}/set"): post(lambda rnd: f"/tasks/{rnd.choice(ctx['tasks'])}/set", data=lambda rnd: {"status": rnd.choice(("todo", "doing", "done"))}),
+        ("POST", "/api/batch"): batch_ops,
+        ("GET", "/projects/{project_id}/activity"): get(lambda rnd: f"/projects/{project(rnd)}/activity"),
+        ("GET", "/users/{user_id}/activity"): get(lambda rnd: f"/users/{ctx['user_id']}/activity"),
+        ("GET", "/projects/{project_id}/opportunities"): get(lambda rnd: f"/projects/{project(rnd)}/opportunities"),
+        ("POST", "/projects/{project_id}/opportunities/new"): post(lambda rnd: f"/projects/{project(rnd)}/opportunities/new",
+                                                                   data={"title": "Bench opportunity", "value_estimate": "5000"}),
+    }
+
+def _synthetic_app(args):
+    """Import the app against a scratch database filled by synth.generate (scaled by --scale).
+    Returns (app, context) with the ids and cookies the route scenarios draw from."""
+    import io
+    from .config import settings
+    _scratch_settings(args)
+    settings.rollup_reconcile_seconds = 0
+    from sqlalchemy import select
+    from .main import app, on_startup
+    from .db import SessionLocal
+    from .models import Account, Project, ProjectStage, ProjectChecklist, ProjectDeliverable, Task, User
+    from .auth import create_session_token, COOKIE_NAME
+    from . import synth, importer
+    on_startup()
+    with SessionLocal() as db:
+        summary = synth.generate(db, synth.Volumes().scaled(args.scale))
+        print(", ".join(f"{n:,} {k}" for k, n in summary.rows.items()) + f" generated in {summary.seconds:.1f} s")
+        user = db.get(User, summary.user_ids[0])
+        org = user.org_id
+        in_org = lambda q, model: q.join(Project, model.project_id==Project.id).where(Project.org_id==org)
+        stage_join = lambda q, model: in_org(q.join(ProjectStage, model.project_stage_id==ProjectStage.id), ProjectStage)
+        ctx = {
+            "email": user.email, "password": synth.PASSWORD, "user_id": user.id,
+            "cookies": {COOKIE_NAME: create_session_token(user.id)},
+            "throwaway_cookies": {COOKIE_NAME: create_session_token(user.id)},
+            "accounts": db.scalars(select(Account.id).where(Account.org_id==org)).all(),
+            "projects": db.scalars(select(Project.id).where(Project.org_id==org)).all(),
+            "stages": db.execute(in_org(select(ProjectStage.id, ProjectStage.project_id), ProjectStage)).all(),
+            "checklist": db.execute(stage_join(select(ProjectChecklist.id, ProjectStage.id, ProjectStage.project_id), ProjectChecklist)).all(),
+            "deliverables": db.execute(stage_join(select(ProjectDeliverable.id, ProjectStage.id, ProjectStage.project_id), ProjectDeliverable)).all(),
+            "revised": db.execute(stage_join(select(ProjectDeliverable.id, ProjectDeliverable.version), ProjectDeliverable)
+                                  .where(ProjectDeliverable.head_revision_id!=None)).all(),
+            "tasks": db.scalars(in_org(select(Task.id), Task)).all(),
+        }
+        job = importer.create_job(db, org, user.id, "accounts", "csv", io.BytesIO(b"name\nBench import\n"))
+        ctx["import_job"] = job.id
+    importer.run_import(job.id)
+    return app, ctx
+
+@benchmark
+def bench_routes(args):
+    """Every route in main.py against synthetic data: req/s, p50/p95/p99 latency and SQL statements per request.
+
+    Requests for one route run back to back from a single client, so latencies
+    don't include queueing. --save writes the results as a baseline, --compare
+    diffs against one and exits 1 on a regression."""
+    import json
+    from fastapi.routing import APIRoute
+    n = args.n or 200
+    app, ctx = _synthetic_app(args)
+    scenarios = _route_scenarios(ctx)
+    routes = {(method, r.path) for r in app.routes if isinstance(r, APIRoute) for method in r.methods}
+    uncovered = sorted(routes - set(scenarios))
+    if uncovered:
+        print("no scenario for: " + ", ".join(f"{m} {p}" for m, p in uncovered))
+    results = _measure_routes(app, scenarios, sorted(set(scenarios) & routes, key=lambda k: (k[1], k[0])), n)
+    print(f"{n} requests per route (after 5 warm-up), scale {args.scale}")
+    print(f"{'route':<64} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for route, r in results.items():
+        budget = f" / {r['budget']}" if r["budget"] is not None else ""
+        print(f"{route:<64} {r['rps']:8.0f} {r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} {r['queries']:8.1f}{budget}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"n": n, "scale": args.scale, "routes": results}, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline["n"], baseline["scale"]) != (n, args.scale):
+            print(f"note: the baseline was taken with --n {baseline['n']} --scale {baseline['scale']}")
+        if _compare_routes(baseline["routes"], results, args.tolerance):
+            raise SystemExit(1)
+
+def _measure_routes(app, scenarios: dict, keys: list, n: int) -> dict:
+    """'METHOD /route' -> req/s, p50/p95/p99 ms, statements per request and budget, from n
+    back-to-back requests per route after 5 warm-up ones."""
+    import asyncio, random
+    import httpx
+    from fastapi.routing import APIRoute
+    from .metrics import registry
+    endpoints = {(method, r.path): r.endpoint for r in app.routes if isinstance(r, APIRoute) for method in r.methods}
+
+    async def measure(client, key) -> dict:
+        make = scenarios[key]
+        rnd = random.Random(0)
+        latencies = []
+        for i in range(n + 5):
+            kwargs, ok = make(rnd)
+            if i == 5:
+                registry.reset()  # the first few requests warm caches and connections
+            client.cookies = kwargs.pop("cookies")  # fresh jar: login/logout responses set cookies
+            start = time.perf_counter()
+            r = await client.request(**kwargs)
+            if i >= 5:
+                latencies.append(time.perf_counter() - start)
+            assert r.status_code in ok, f"{key}: {r.status_code} {r.text[:200]}"
+        count, statements = registry.totals("bdos_request_sql_statements", *key)
+        latencies.sort()
+        return {"rps": n / sum(latencies), "p50": _percentile(latencies, 0.5) * 1000, "p95": _percentile(latencies, 0.95) * 1000,
+                "p99": _percentile(latencies, 0.99) * 1000, "queries": statements / count if count else 0.0,
+                "budget": getattr(endpoints[key], "query_budget", None)}
+
+    async def run() -> dict:
+        results = {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for key in keys:
+                results[f"{key[0]} {key[1]}"] = await measure(client, key)
+        return results
+    return asyncio.run(run())
+
+HOT_ROUTES = (("GET", "/"), ("GET", "/accounts/{account_id}"), ("GET", "/projects/{project_id}"),
+              ("GET", "/projects/{project_id}/stage/{project_stage_id}"), ("GET", "/projects/{project_id}/tasks"),
+              ("GET", "/projects/{project_id}/opportunities"), ("GET", "/search"), ("GET", "/reports"), ("GET", "/export/{entity}"))
+
+@benchmark
+def bench_archive(args):
+    """Read routes on active projects before and after archiving the finished ones (80% of a
+    synthetic org, --scale), the archive and restore rates, and reads of archived projects."""
+    import random
+    from datetime import datetime, timedelta
+    from sqlalchemy import select, update
+    from sqlalchemy.orm import Session
+    from .config import settings
+    n = args.n or 100
+    settings.archive_enabled = True
+    app, ctx = _synthetic_app(args)
+    from .db import SessionLocal
+    from .models import Project
+    from . import archive, pagecache, rollups
+    pagecache.fragments.max_size = 0  # measure the queries, not the page cache
+
+    rnd = random.Random(0)
+    done = set(rnd.sample(ctx["projects"], int(len(ctx["projects"]) * 0.8)))
+    with SessionLocal() as db:
+        finished = datetime.utcnow() - timedelta(days=settings.archive_after_days + 30)
+        db.execute(update(Project).where(Project.id.in_(done)).values(status="done", updated_at=finished))
+        db.execute(update(Project).where(Project.id.notin_(done)).values(status="active"))
+        db.commit()
+        rollups.reconcile_all(db)
+    def scoped(projects) -> dict:
+        return {**ctx, "projects": sorted(projects), "stages": [s for s in ctx["stages"] if s[1] in projects]}
+    active = set(ctx["projects"]) - done
+    scenarios = _route_scenarios(scoped(active))
+
+    before = _measure_routes(app, scenarios, HOT_ROUTES, n)
+    summary = archive.run()
+    print(f"archived {summary.projects:,} of {len(done):,} finished projects ({summary.rows:,} rows) in {summary.seconds:.1f} s "
+          f"({summary.rows / summary.seconds:,.0f} rows/s)")
+    for table, (hot_rows, archived) in archive.counts().items():
+        print(f"  {table:<24} {hot_rows:>10,} hot {archived:>10,} archived")
+    after = _measure_routes(app, scenarios, HOT_ROUTES, n)
+
+    print(f"\nactive projects, {n} requests per route")
+    print(f"{'route':<56} {'p50 before':>11} {'p50 after':>10} {'change':>8} {'queries':>12}")
+    for route, b in before.items():
+        a = after[route]
+        print(f"{route:<56} {b['p50']:11.2f} {a['p50']:10.2f} {a['p50'] / b['p50'] - 1:+8.0%} {b['queries']:5.1f} -> {a['queries']:4.1f}")
+
+    with Session(archive.mover_engine()) as db:
+        archived = set(db.scalars(select(archive.cold["projects"].c.id)))
+    cold = _measure_routes(app, _route_scenarios(scoped(archived)), HOT_ROUTES[2:6], n)
+    print(f"\narchived projects (read through the archive fallback), {n} requests per route")
+    for route, r in cold.items():
+        print(f"{route:<56} p50 {r['p50']:8.2f} ms   p99 {r['p99']:8.2f} ms   {r['queries']:4.1f} queries")
+
+    some = sorted(archived)[:20]
+    start = time.perf_counter()
+    restored = archive.restore(some)
+    print(f"\nrestored {len(restored)} projects in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def _compare_routes(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Print per-route changes against a saved baseline; returns the routes that regressed:
+    p50 slower by more than `tolerance` (and 0.5 ms), or half a statement more per request."""
+    regressions = []
+    print(f"\n{'route':<64} {'p50':>9} {'p95':>9} {'queries':>12}")
+    for route, r in results.items():
+        old = baseline.get(route)
+        if old is None:
+            print(f"{route:<64} {'new':>9}")
+            continue
+        change = {q: r[q] / old[q] - 1 if old[q] else 0.0 for q in ("p50", "p95")}
+        slower = change["p50"] > tolerance and r["p50"] - old["p50"] > 0.5
+        more_queries = r["queries"] - old["queries"] >= 0.5
+        flag = "  REGRESSION" if slower or more_queries else ""
+        print(f"{route:<64} {change['p50']:+8.0%} {change['p95']:+8.0%} {old['queries']:5.1f} -> {r['queries']:4.1f}{flag}")
+        if flag:
+            regressions.append(route)
+    for route in sorted(set(baseline) - set(results)):
+        print(f"{route:<64} {'gone':>9}")
+    print(f"{len(regressions)} regression(s)" if regressions else "no regressions")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--n", type=int, help="dataset size / request count (each benchmark has its own default)")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients (load benchmarks)")
+    parser.add_argument("--db-url", help="scratch database for load benchmarks (default: a temporary SQLite file)")
+    parser.add_argument("--scale", type=float, default=1.0, help="synthetic data volume, relative to synth.Volumes() (routes)")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline (routes)")
+    parser.add_argument("--compare", metavar="PATH", help="diff against a saved baseline; exit 1 on regressions (routes)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="latency increase tolerated by --compare (routes)")
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.name](args)
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,83 @@ from pydantic import BaseModel
 class Settings(BaseModel):
     secret_key: str = "CHANGE_ME__GENERATE_A_RANDOM_SECRET"
     db_url: str = "sqlite:///./bd_os.db"
+    # Serve the read-heavy pages through an async engine (aiosqlite / asyncpg) instead of
+    # the threadpool. async_db_url defaults to db_url with the matching async driver.
+    async_db: bool = False
+    async_db_url: str | None = None
+    # "production" applies the SQLite pragmas below to every connection (WAL,
+    # busy_timeout, synchronous=NORMAL, mmap, page cache) and sizes the pools;
+    # "default" leaves driver defaults.
+    storage_profile: str = "default"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    # Sync handlers run on a 40-thread pool; size + overflow matches it so no thread waits on the pool.
+    pool_size: int = 20
+    pool_max_overflow: int = 20
+    pool_timeout_seconds: float = 30.0
+    # Serve read-only handlers (async read pages, exports) from a separate read-only
+    # pool, optionally on a replica (read_db_url, defaults to db_url).
+    read_pool: bool = False
+    read_db_url: str | None = None
+    read_pool_size: int = 20
+    read_pool_max_overflow: int = 20
+    # Raise instead of logging when a route goes over its SQL statement budget (tests/dev).
+    query_budget_strict: bool = False
+    # Log statements (with bind parameters) slower than this many ms; None disables.
+    slow_query_ms: float | None = None
+    # Serve per-route latency/SQL/render histograms at /metrics (Prometheus text format).
+    metrics_enabled: bool = True
+    # Authenticated-user cache (session token -> user snapshot).
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 60.0
+    # Threads dedicated to bcrypt password checks at login.
+    bcrypt_workers: int = 2
+    # List pages (accounts, tasks, opportunities, account projects).
+    page_size: int = 50
+    page_size_max: int = 200
+    # Full recompute of the dashboard/project rollups; 0 disables the background reconciler.
+    rollup_reconcile_seconds: float = 300.0
+    # Rendered project/stage pages kept in memory (entries); 0 disables.
+    page_cache_size: int = 2000
+    # Compiled templates are cached here across restarts; None disables.
+    template_cache_dir: str | None = "./.template_cache"
+    # Deliverable history: "zlib", or "zstd" with the zstandard package installed. A full
+    # copy is stored at least every revision_keyframe_interval revisions (deltas in between).
+    revision_codec: str = "zlib"
+    revision_keyframe_interval: int = 16
+    # Live page updates (GET /projects/{id}/events): heartbeat interval, stream lifetime before
+    # the browser reconnects, and messages queued for a slow subscriber before it must reload.
+    sse_heartbeat_seconds: float = 15.0
+    sse_max_seconds: float = 300.0
+    sse_queue_size: int = 64
+    # Activity trail (activity.py): entries are buffered in memory and written in batches of
+    # activity_flush_rows or every activity_flush_seconds; the oldest are dropped past
+    # activity_buffer_size. activity_sync writes them in the request's transaction instead.
+    activity_buffer_size: int = 100_000
+    activity_flush_rows: int = 500
+    activity_flush_seconds: float = 1.0
+    activity_sync: bool = False
+    # Archival (archive.py, python -m app.archive): done projects not updated for archive_after_days
+    # move with their child rows, archive_batch_size projects per transaction, into the "archive"
+    # schema: a separate file attached to the main database on SQLite, a schema on Postgres.
+    archive_enabled: bool = False
+    archive_after_days: int = 180
+    archive_batch_size: int = 100
+    archive_sqlite_path: str = "./bd_os_archive.db"
+    # Task reminders (reminders.py, off by default): "due_soon" is sent reminder_lead_hours before a task's due date
+    # and "overdue" at it, through reminder_notifier ("outbox" appends JSON lines to
+    # reminder_outbox_path, "log", or "module:factory"). Each worker keeps the tasks due within the
+    # next lead + reminder_window_hours in memory; reminders missed while no worker ran are sent
+    # late for tasks due in the last reminder_catchup_hours.
+    reminders_enabled: bool = False
+    reminder_lead_hours: float = 24.0
+    reminder_window_hours: float = 24.0
+    reminder_catchup_hours: float = 72.0
+    reminder_notifier: str = "outbox"
+    reminder_outbox_path: str = "./reminders.jsonl"
+    # Bulk import: uploads are kept here so interrupted jobs can resume.
+    import_dir: str = "./imports"
+    import_chunk_size: int = 1000
 
 settings = Settings()
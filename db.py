@@ -1,10 +1,77 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import hashlib
+import json
+import threading
+from datetime import datetime
+from sqlalchemy import create_engine, event, inspect, insert, select, text, update
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from . import sqlstats
 
-engine = create_engine(settings.db_url, connect_args={"check_same_thread": False} if settings.db_url.startswith("sqlite") else {})
+# ---- storage profile (settings.storage_profile)
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+def _pool_args(url: str, size: int, overflow: int) -> dict:
+    parsed = make_url(url)
+    if settings.storage_profile != "production" or parsed.database in (None, "", ":memory:"):
+        return {}
+    args = {"pool_size": size, "max_overflow": overflow, "pool_timeout": settings.pool_timeout_seconds}
+    if parsed.get_backend_name() != "sqlite":
+        args["pool_pre_ping"] = True
+    return args
+
+def _connect_statements(dialect: str, read_only: bool) -> list[str]:
+    statements = []
+    if dialect == "sqlite":
+        if settings.storage_profile == "production":
+            # WAL lets readers proceed while a write is in progress; NORMAL only
+            # syncs at checkpoints, which is durable against application crashes.
+            statements += ["PRAGMA journal_mode=WAL", f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+                           "PRAGMA synchronous=NORMAL", f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+                           f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}"]
+        if read_only:
+            statements.append("PRAGMA query_only=ON")
+    elif read_only:
+        statements.append("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+    return statements
+
+def configure(engine: Engine, read_only: bool = False):
+    """Run the storage profile's per-connection setup on every new DBAPI connection of `engine`."""
+    statements = _connect_statements(engine.dialect.name, read_only)
+    if not statements:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+engine = create_engine(settings.db_url, connect_args=_connect_args(settings.db_url),
+                       **_pool_args(settings.db_url, settings.pool_size, settings.pool_max_overflow))
+configure(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only handlers (ReadSession, exports) use a separate pool when settings.read_pool is on.
+read_engine = None
+ReadSessionLocal = SessionLocal
+if settings.read_pool:
+    read_url = settings.read_db_url or settings.db_url
+    read_engine = create_engine(read_url, connect_args=_connect_args(read_url),
+                                **_pool_args(read_url, settings.read_pool_size, settings.read_pool_max_overflow))
+    configure(read_engine, read_only=True)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, info={"read_only": True})
+
+def writable_session(db: Session) -> Session:
+    """A new session on `db`'s engine, or on the primary if `db` is read-only."""
+    return SessionLocal() if db.info.get("read_only") else Session(db.get_bind())
+
 class Base(DeclarativeBase):
     pass
 
@@ -14,3 +81,138 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# ---- async read path (settings.async_db)
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url: str) -> str:
+    """`db_url` with its async driver, e.g. sqlite:///x.db -> sqlite+aiosqlite:///x.db."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"no async driver configured for {backend!r}; set async_db_url")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+_async_lock = threading.Lock()
+_async_sessions = None
+
+def async_session_factory():
+    """Created on first use so aiosqlite/asyncpg are only needed when async_db is on."""
+    global _async_sessions
+    with _async_lock:
+        if _async_sessions is None:
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+            url = settings.async_db_url or async_url((settings.read_pool and settings.read_db_url) or settings.db_url)
+            pool_args = _pool_args(url, settings.read_pool_size, settings.read_pool_max_overflow)
+            if pool_args:
+                pool_args["poolclass"] = AsyncAdaptedQueuePool  # aiosqlite otherwise defaults to NullPool
+            async_engine = create_async_engine(url, **pool_args)
+            configure(async_engine.sync_engine, read_only=settings.read_pool)
+            sqlstats.install(async_engine.sync_engine)
+            _async_sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False,
+                                                 info={"read_only": True} if settings.read_pool else {})
+        return _async_sessions
+
+class ReadSession:
+    """Database handle for `async def` handlers.
+
+    `await db.run(fn, *args)` calls `fn(session, *args)` with a regular ORM
+    Session, so the sync helpers in queries.py work unchanged. With
+    settings.async_db it runs on the async engine (AsyncSession.run_sync) and
+    the handler holds no thread while waiting on the database; otherwise it
+    runs on the threadpool against ReadSessionLocal.
+
+    The session is closed after each call, so no connection is held while the
+    handler awaits anything else (holding one across a threadpool hop can
+    deadlock the pool under load). Returned objects are detached: everything
+    a template touches must be loaded inside `fn`.
+
+    `archived` handles read archived projects (archive.read_session())."""
+
+    def __init__(self, session, archived: bool = False):
+        self.session = session
+        self.archived = archived
+
+    async def run(self, fn, *args):
+        if isinstance(self.session, Session):
+            return await run_in_threadpool(self._call_sync, fn, *args)
+        try:
+            return await self.session.run_sync(fn, *args)
+        finally:
+            await self.session.close()
+
+    def _call_sync(self, fn, *args):
+        try:
+            return fn(self.session, *args)
+        finally:
+            self.session.close()
+
+async def get_read_db():
+    if settings.async_db:
+        async with async_session_factory()() as session:
+            yield ReadSession(session)
+        return
+    yield ReadSession(ReadSessionLocal())
+
+# ---- startup (schema sync and seeding), shared by every worker process
+
+STARTUP_LOCK_KEY = 0x62646f73  # pg advisory lock id
+
+def startup_lock(conn):
+    """Serialize startup work across processes until the current transaction ends.
+
+    SQLite takes the database write lock up front (BEGIN IMMEDIATE, so it must be the
+    transaction's first write); Postgres takes a transaction-scoped advisory lock."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": STARTUP_LOCK_KEY})
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def meta_get(conn, key: str) -> str | None:
+    """A value from app_meta; `conn` is a Connection or Session."""
+    table = Base.metadata.tables["app_meta"]
+    return conn.execute(select(table.c.value).where(table.c.key==key)).scalar()
+
+def meta_set(conn, key: str, value: str):
+    table = Base.metadata.tables["app_meta"]
+    values = {"value": value, "updated_at": datetime.utcnow()}
+    if not conn.execute(update(table).where(table.c.key==key).values(**values)).rowcount:
+        conn.execute(insert(table).values(key=key, **values))
+
+def _schema_fingerprint(dialect) -> str:
+    return fingerprint([str(CreateTable(t).compile(dialect=dialect)) for t in Base.metadata.sorted_tables],
+                       sorted(str(CreateIndex(i).compile(dialect=dialect)) for t in Base.metadata.sorted_tables for i in t.indexes))
+
+def sync_schema() -> bool:
+    """Create missing tables, columns and indexes. Returns False (after two queries) if the
+    schema already matches the models' fingerprint."""
+    schema = _schema_fingerprint(engine.dialect)
+    with engine.connect() as conn:
+        if inspect(conn).has_table("app_meta") and meta_get(conn, "schema") == schema:
+            return False
+    with engine.begin() as conn:
+        startup_lock(conn)
+        Base.metadata.create_all(bind=conn)
+        if meta_get(conn, "schema") == schema:  # another worker synced it while we waited
+            return False
+        # create_all skips tables that already exist, so add columns and indexes
+        # introduced since. New columns must be nullable or have a server_default.
+        quote = conn.dialect.identifier_preparer.quote
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {col.type.compile(dialect=conn.dialect)}"
+                if col.server_default is not None:
+                    ddl += f" DEFAULT {col.server_default.arg}"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        meta_set(conn, "schema", schema)
+    return True
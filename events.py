@@ -0,0 +1,190 @@
+"""Live project and stage pages over Server-Sent Events.
+
+Mutation handlers describe what they changed with `publish(db, project_id,
+checklist=[...], ...)`. The changes wait on the session and go to `hub` when it
+commits (they are dropped on rollback), as one message per project whose SSE id
+is the version `pagecache.bump_project` gave it. `GET /projects/{id}/events`
+streams them to open pages, which patch themselves (static/app.js).
+
+Delivery is in-process. Each subscriber has a bounded queue; one that falls
+`sse_queue_size` messages behind is sent `resync` and disconnected, so a slow
+client never holds memory or blocks a publisher. Streams end after
+`sse_max_seconds` and the browser reconnects with Last-Event-ID; if the
+project's version has moved past it (a change made on another worker, or while
+disconnected) the page is told to resync too.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import ProjectStage
+
+RETRY_MS = 3000
+RESYNC = "event: resync\ndata: {}\n\n"
+PING = ": ping\n\n"
+
+# ---- rows, in the shape /api/batch returns them
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+def checklist_row(c) -> dict:
+    return {"id": c.id, "project_stage_id": c.project_stage_id, "done": c.done, "done_at": _iso(c.done_at)}
+
+def task_row(t) -> dict:
+    return {"id": t.id, "project_id": t.project_id, "status": t.status}
+
+def deliverable_row(d) -> dict:
+    return {"id": d.id, "project_stage_id": d.project_stage_id, "status": d.status, "version": d.version,
+            "head_revision_id": d.head_revision_id, "content_size": d.content_size, "updated_at": _iso(d.updated_at)}
+
+def stage_rows(db: Session, project_stage_ids) -> list[dict]:
+    ids = sorted(set(project_stage_ids))
+    if not ids:
+        return []
+    return [{"id": psid, "status": status} for psid, status in db.execute(select(ProjectStage.id, ProjectStage.status).where(ProjectStage.id.in_(ids)))]
+
+# ---- publishing
+
+def publish(db: Session, project_id: int, **changes: list[dict] | Callable[[], list[dict]]):
+    """Queue changed rows (checklist, tasks, deliverables, stages, new_tasks, new_opportunities)
+    for `project_id`; they are sent when `db` commits. Nothing is queued, and rows passed as a
+    function (ones that cost a query) are not built, unless a page of the project is subscribed."""
+    if not hub.watching(project_id):
+        return
+    pending = db.info.setdefault("events", {}).setdefault(project_id, {})
+    for kind, rows in changes.items():
+        pending.setdefault(kind, []).extend(rows() if callable(rows) else rows)
+
+def message(version: int, changes: dict) -> str:
+    return f"id: {version}\nevent: change\ndata: {json.dumps({'version': version, **changes}, separators=(',', ':'))}\n\n"
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    # Every bumped project gets a message, with or without rows: a bare version
+    # tells the page something it can't patch changed.
+    versions = session.info.pop("project_versions", None)
+    changes = session.info.pop("events", None) or {}
+    for project_id, version in (versions or {}).items():
+        if hub.watching(project_id):
+            hub.publish(project_id, message(version, changes.get(project_id, {})))
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("project_versions", None)
+    session.info.pop("events", None)
+
+# ---- subscribers
+
+class Subscription:
+    __slots__ = ("project_id", "loop", "queue", "wakeup", "overflowed", "ping", "expires")
+
+    def __init__(self, project_id: int, loop: asyncio.AbstractEventLoop):
+        self.project_id = project_id
+        self.loop = loop
+        self.queue: deque[str] = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+        self.ping = False
+        self.expires = loop.time() + settings.sse_max_seconds
+
+class Hub:
+    """Subscriptions by project. publish() may be called from any thread; delivery
+    happens on each subscriber's event loop, one callback per loop per message.
+    A single timer per loop sends heartbeats and ends expired streams, so an
+    idle subscriber costs no timer of its own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: dict[int, set[Subscription]] = {}
+        self._tickers: set[asyncio.AbstractEventLoop] = set()
+
+    def watching(self, project_id: int) -> bool:
+        return project_id in self._subs
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subs.values())
+
+    def subscribe(self, project_id: int) -> Subscription:
+        """Call from the event loop that will consume the subscription."""
+        loop = asyncio.get_running_loop()
+        sub = Subscription(project_id, loop)
+        with self._lock:
+            self._subs.setdefault(project_id, set()).add(sub)
+            if loop not in self._tickers:
+                self._tickers.add(loop)
+                loop.call_later(settings.sse_heartbeat_seconds, self._tick, loop)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subs.get(sub.project_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.project_id]
+
+    def publish(self, project_id: int, text: str):
+        with self._lock:
+            subs = list(self._subs.get(project_id, ()))
+        by_loop: dict[asyncio.AbstractEventLoop, list[Subscription]] = {}
+        for sub in subs:
+            by_loop.setdefault(sub.loop, []).append(sub)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, group, text)
+            except RuntimeError:  # loop closed; its streams are gone
+                pass
+
+    def _deliver(self, subs: list[Subscription], text: str):
+        for sub in subs:
+            if len(sub.queue) >= settings.sse_queue_size:
+                sub.overflowed = True
+                sub.queue.clear()
+            elif not sub.overflowed:
+                sub.queue.append(text)
+            sub.wakeup.set()
+
+    def _tick(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            subs = [sub for group in self._subs.values() for sub in group if sub.loop is loop]
+            if not subs:
+                self._tickers.discard(loop)
+                return
+        for sub in subs:
+            sub.ping = True
+            sub.wakeup.set()
+        loop.call_later(settings.sse_heartbeat_seconds, self._tick, loop)
+
+hub = Hub()
+
+async def stream(sub: Subscription, resync: bool = False):
+    """The SSE body for one subscriber; unsubscribes when the client goes away or the stream ends."""
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if resync:
+            yield RESYNC
+            return
+        while True:
+            await sub.wakeup.wait()
+            sub.wakeup.clear()
+            if sub.overflowed:
+                yield RESYNC
+                return
+            if sub.queue:
+                batch = "".join(sub.queue)
+                sub.queue.clear()
+                yield batch
+            elif sub.ping:
+                yield PING
+            sub.ping = False
+            if sub.loop.time() >= sub.expires:
+                return
+    finally:
+        hub.unsubscribe(sub)
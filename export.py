@@ -0,0 +1,129 @@
+"""Streaming CSV/NDJSON export of an org's data.
+
+CLI: python -m app.export <entity> --org ORG_ID [--format csv|ndjson] [--columns a,b] [--since ISO] [--gzip] [-o FILE]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import select, func
+from .db import ReadSessionLocal
+from .models import Account, Project, Task, Opportunity
+
+CHUNK_ROWS = 1000
+
+@dataclass(frozen=True)
+class ExportSpec:
+    model: type
+    columns: tuple[str, ...]
+    via_project: bool  # org scoping goes through projects.org_id
+
+EXPORTS = {
+    "accounts": ExportSpec(Account, ("id", "name", "industry", "size", "country", "owner_user_id", "created_at", "updated_at"), False),
+    "projects": ExportSpec(Project, ("id", "account_id", "name", "package", "lead_source", "status", "start_date", "created_at", "updated_at"), False),
+    "tasks": ExportSpec(Task, ("id", "project_id", "project_stage_id", "title", "owner_user_id", "status", "priority", "due_date", "created_at", "updated_at"), True),
+    "opportunities": ExportSpec(Opportunity, ("id", "project_id", "title", "otype", "value_estimate", "probability", "stage", "notes", "created_at", "updated_at"), True),
+}
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def resolve_columns(entity: str, columns: list[str] | None) -> tuple[str, ...]:
+    """Validate a column selection; raises ValueError naming unknown columns."""
+    spec = EXPORTS[entity]
+    if not columns:
+        return spec.columns
+    unknown = [c for c in columns if c not in spec.columns]
+    if unknown:
+        raise ValueError(f"unknown columns for {entity}: {', '.join(unknown)}")
+    return tuple(columns)
+
+def iter_rows(entity: str, org_id: int, columns: tuple[str, ...], since: datetime | None = None) -> Iterator[tuple]:
+    """Yield result rows in id order from a server-side cursor, CHUNK_ROWS at a time.
+
+    Opens its own session: a StreamingResponse keeps iterating after the
+    request's dependencies have been torn down."""
+    spec = EXPORTS[entity]
+    model = spec.model
+    stmt = select(*(getattr(model, c) for c in columns))
+    if spec.via_project:
+        stmt = stmt.join(Project, model.project_id==Project.id).where(Project.org_id==org_id)
+    else:
+        stmt = stmt.where(model.org_id==org_id)
+    if since is not None:
+        stmt = stmt.where(func.coalesce(model.updated_at, model.created_at) >= since)
+    stmt = stmt.order_by(model.id).execution_options(stream_results=True, yield_per=CHUNK_ROWS)
+    with ReadSessionLocal() as db:
+        for partition in db.execute(stmt).partitions():
+            yield from partition
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def iter_csv(columns: tuple[str, ...], rows: Iterator[tuple]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    n = 0
+    for row in rows:
+        writer.writerow([_cell(v) for v in row])
+        n += 1
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+def iter_ndjson(columns: tuple[str, ...], rows: Iterator[tuple]) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: _cell(v) for c, v in zip(columns, row)}, ensure_ascii=False))
+        if len(lines) == CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+def stream_export(entity: str, org_id: int, fmt: str = "csv", columns: list[str] | None = None,
+                  since: datetime | None = None, gzip: bool = False) -> Iterator[bytes]:
+    cols = resolve_columns(entity, columns)
+    encode = iter_csv if fmt == "csv" else iter_ndjson
+    chunks = encode(cols, iter_rows(entity, org_id, cols, since))
+    return gzip_chunks(chunks) if gzip else chunks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.export")
+    parser.add_argument("entity", choices=sorted(EXPORTS))
+    parser.add_argument("--org", type=int, required=True)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--columns", help="comma-separated column list")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only rows created/updated at or after this ISO timestamp")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args(argv)
+    columns = args.columns.split(",") if args.columns else None
+    try:
+        chunks = stream_export(args.entity, args.org, args.format, columns, args.since, args.gzip)
+    except ValueError as e:
+        parser.error(str(e))
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Streaming, chunked bulk import of accounts, contacts and opportunities.
+
+Each chunk of `settings.import_chunk_size` rows is validated together, checked
+against the database with one query per lookup, written with a single
+executemany INSERT and committed along with the job's progress counters. A
+failed or interrupted job resumes after the last committed chunk.
+"""
+import csv
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO, Iterator
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, sessionmaker
+from .config import settings
+from .db import SessionLocal
+from .models import Account, Contact, Project, Opportunity, ImportJob
+from . import rollups, pagecache
+
+log = logging.getLogger("bdos.import")
+
+ENTITIES = ("accounts", "contacts", "opportunities")
+FORMATS = ("csv", "ndjson")
+MAX_STORED_ERRORS = 1000
+
+_active: set[int] = set()
+_active_lock = threading.Lock()
+
+class RowError(ValueError):
+    pass
+
+# ---- parsing
+
+def parse_rows(path: str, fmt: str) -> Iterator[dict]:
+    """Yield raw records one at a time; undecodable NDJSON lines yield RowError instances."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield RowError(f"invalid JSON: {e.msg}")
+                continue
+            yield record if isinstance(record, dict) else RowError("expected a JSON object")
+
+def _chunks(items: Iterator, size: int) -> Iterator[list]:
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+# ---- field validation
+
+def _text(raw: dict, key: str, max_len: int, required: bool = False) -> str | None:
+    value = raw.get(key)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise RowError(f"{key} is required")
+        return None
+    if len(value) > max_len:
+        raise RowError(f"{key} longer than {max_len} characters")
+    return value
+
+def _int(raw: dict, key: str, lo: int | None = None, hi: int | None = None, required: bool = False) -> int | None:
+    value = raw.get(key)
+    if value is None or str(value).strip() == "":
+        if required:
+            raise RowError(f"{key} is required")
+        return None
+    try:
+        value = int(str(value).strip())
+    except ValueError:
+        raise RowError(f"{key} must be an integer")
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        raise RowError(f"{key} out of range")
+    return value
+
+# ---- per-entity chunk writers: (db, job, [(row_no, raw)]) -> (inserted, duplicates, errors)
+
+def _validate(chunk, validate):
+    rows, errors = [], []
+    for row_no, raw in chunk:
+        try:
+            if isinstance(raw, RowError):
+                raise raw
+            rows.append((row_no, validate(raw)))
+        except RowError as e:
+            errors.append({"row": row_no, "error": str(e)})
+    return rows, errors
+
+def _validate_account(raw: dict) -> dict:
+    return {"name": _text(raw, "name", 250, required=True), "industry": _text(raw, "industry", 200),
+            "size": _text(raw, "size", 100), "country": _text(raw, "country", 100)}
+
+def _import_accounts(db: Session, job: ImportJob, chunk):
+    rows, errors = _validate(chunk, _validate_account)
+    names = {r["name"] for _, r in rows}
+    # Dedupe on (name, country) against the org, served by ix_accounts_org_name_country.
+    seen = set(db.execute(select(Account.name, Account.country).where(Account.org_id==job.org_id, Account.name.in_(names))).all()) if names else set()
+    now = datetime.utcnow()
+    new, duplicates = [], 0
+    for _, r in rows:
+        key = (r["name"], r["country"])
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        new.append({**r, "org_id": job.org_id, "owner_user_id": job.user_id, "created_at": now, "updated_at": now})
+    if new:
+        db.execute(insert(Account), new)
+    return len(new), duplicates, errors
+
+def _validate_contact(raw: dict) -> dict:
+    row = {"account_id": _int(raw, "account_id", lo=1), "account_name": _text(raw, "account_name", 250),
+           "account_country": _text(raw, "account_country", 100), "name": _text(raw, "name", 200, required=True),
+           "title": _text(raw, "title", 200), "phone": _text(raw, "phone", 100), "email": _text(raw, "email", 320)}
+    if row["account_id"] is None and row["account_name"] is None:
+        raise RowError("account_id or account_name is required")
+    return row
+
+def _import_contacts(db: Session, job: ImportJob, chunk):
+    rows, errors = _validate(chunk, _validate_contact)
+    ids = {r["account_id"] for _, r in rows if r["account_id"] is not None}
+    names = {r["account_name"] for _, r in rows if r["account_id"] is None}
+    owned_ids = {i for i, in db.execute(select(Account.id).where(Account.org_id==job.org_id, Account.id.in_(ids)))} if ids else set()
+    by_name: dict[tuple, int] = {}
+    if names:
+        for aid, name, country in db.execute(select(Account.id, Account.name, Account.country)
+                                             .where(Account.org_id==job.org_id, Account.name.in_(names)).order_by(Account.id)):
+            by_name.setdefault((name, country), aid)
+            by_name.setdefault((name, None), aid)
+    new = []
+    for row_no, r in rows:
+        if r["account_id"] is not None:
+            aid = r["account_id"] if r["account_id"] in owned_ids else None
+        else:
+            aid = by_name.get((r["account_name"], r["account_country"]))
+        if aid is None:
+            errors.append({"row": row_no, "error": "account not found"})
+            continue
+        new.append({"account_id": aid, "name": r["name"], "title": r["title"], "phone": r["phone"], "email": r["email"]})
+    if new:
+        db.execute(insert(Contact), new)
+    return len(new), 0, errors
+
+def _validate_opportunity(raw: dict) -> dict:
+    return {"project_id": _int(raw, "project_id", lo=1, required=True), "title": _text(raw, "title", 260, required=True),
+            "otype": _text(raw, "otype", 40) or "partnership", "value_estimate": _int(raw, "value_estimate", lo=0),
+            "probability": _int(raw, "probability", lo=0, hi=100), "stage": _text(raw, "stage", 30) or "new",
+            "notes": _text(raw, "notes", 100_000)}
+
+def _import_opportunities(db: Session, job: ImportJob, chunk):
+    rows, errors = _validate(chunk, _validate_opportunity)
+    project_ids = {r["project_id"] for _, r in rows}
+    owned = {i for i, in db.execute(select(Project.id).where(Project.org_id==job.org_id, Project.id.in_(project_ids)))} if project_ids else set()
+    now = datetime.utcnow()
+    new = []
+    for row_no, r in rows:
+        if r["project_id"] not in owned:
+            errors.append({"row": row_no, "error": "project not found"})
+            continue
+        new.append({**r, "created_at": now, "updated_at": now})
+    if new:
+        db.execute(insert(Opportunity), new)
+        project_ids = sorted({r["project_id"] for r in new})
+        rollups.refresh_projects(db, project_ids)
+        db.flush()
+        rollups.refresh_org(db, job.org_id)
+        pagecache.bump_project(db, *project_ids)
+    return len(new), 0, errors
+
+WRITERS = {"accounts": _import_accounts, "contacts": _import_contacts, "opportunities": _import_opportunities}
+
+# ---- jobs
+
+def create_job(db: Session, org_id: int, user_id: int, entity: str, fmt: str, upload: BinaryIO) -> ImportJob:
+    """Persist the upload under settings.import_dir and register a pending job."""
+    job = ImportJob(org_id=org_id, user_id=user_id, entity=entity, fmt=fmt, source_path="", status="pending")
+    db.add(job)
+    db.flush()
+    os.makedirs(settings.import_dir, exist_ok=True)
+    job.source_path = os.path.join(settings.import_dir, f"{job.id}.{fmt}")
+    with open(job.source_path, "wb") as out:
+        shutil.copyfileobj(upload, out, 1024 * 1024)
+    db.commit()
+    return job
+
+def _record_errors(job: ImportJob, errors: list[dict], count: bool = True):
+    if not errors:
+        return
+    if count:
+        job.rows_failed += len(errors)
+    stored = json.loads(job.errors) if job.errors else []
+    if len(stored) < MAX_STORED_ERRORS:
+        job.errors = json.dumps(stored + errors[:MAX_STORED_ERRORS - len(stored)])
+
+def run_import(job_id: int, session_factory: sessionmaker = SessionLocal, chunk_size: int | None = None):
+    """Process (or resume) a job. Safe to call again after a crash: committed chunks are skipped."""
+    with _active_lock:
+        if job_id in _active:
+            return
+        _active.add(job_id)
+    try:
+        with session_factory() as db:
+            job = db.get(ImportJob, job_id)
+            if job is None or job.status == "done":
+                return
+            job.status = "running"
+            db.commit()
+            write = WRITERS[job.entity]
+            records = islice(enumerate(parse_rows(job.source_path, job.fmt), start=1), job.rows_done, None)
+            try:
+                for chunk in _chunks(records, chunk_size or settings.import_chunk_size):
+                    inserted, duplicates, errors = write(db, job, chunk)
+                    job.rows_inserted += inserted
+                    job.rows_duplicate += duplicates
+                    _record_errors(job, errors)
+                    job.rows_done += len(chunk)
+                    db.commit()
+                job.status = "done"
+                db.commit()
+            except Exception as e:
+                log.exception("import job %s failed", job_id)
+                db.rollback()
+                job.status = "failed"
+                # Not counted as failed rows: the aborted chunk is retried on resume.
+                _record_errors(job, [{"row": job.rows_done + 1, "error": f"chunk aborted: {e}"}], count=False)
+                db.commit()
+    finally:
+        with _active_lock:
+            _active.discard(job_id)
+
+def is_running(job_id: int) -> bool:
+    with _active_lock:
+        return job_id in _active
+
+def job_status(job: ImportJob) -> dict:
+    return {"id": job.id, "entity": job.entity, "status": job.status, "rows_done": job.rows_done,
+            "rows_inserted": job.rows_inserted, "rows_duplicate": job.rows_duplicate, "rows_failed": job.rows_failed,
+            "errors": json.loads(job.errors) if job.errors else [], "updated_at": job.updated_at.isoformat() if job.updated_at else None}
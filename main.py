@@ -1,68 +1,153 @@
-from fastapi import FastAPI, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import logging
+import os
+from fastapi import FastAPI, Request, Depends, Form, File, UploadFile, BackgroundTasks, Query as QueryParam
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from datetime import datetime
-from .db import Base, engine, get_db
-from .models import Org, User, Account, Contact, Project, Stage, ProjectStage, StageChecklistItem, ProjectChecklist, StageDeliverable, ProjectDeliverable, Task, Opportunity, Approval
-from .auth import verify_password, create_session_token, COOKIE_NAME, get_current_user_id
+from pydantic import BaseModel
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from datetime import datetime, time
+from .config import settings
+from .db import engine, read_engine, get_db, get_read_db, ReadSession, sync_schema
+from .models import Org, User, Account, Contact, Project, ProjectStage, ProjectChecklist, ProjectDeliverable, Task, Opportunity, Approval, ImportJob
+from .auth import verify_password_async, create_session_token, read_session_token, COOKIE_NAME, UserSnapshot, user_cache
 from .seed import seed
+from .stages import create_projects, mark_started
+from .pagination import PageRequest, Page, page_params
+from . import queries, sqlstats, metrics, rollups, analytics, export, importer, search, pagecache, batch, revisions, events, activity, archive, reminders
+from .sqlstats import query_budget
 
+log = logging.getLogger("bdos.startup")
 app = FastAPI(title="BD OS MVP")
-templates = Jinja2Templates(directory="app/templates")
+
+def template_env(directory: str = "app/templates") -> Environment:
+    # Compiled templates persist in template_cache_dir, so a restart skips Jinja's parse/compile step.
+    bytecode_cache = None
+    if settings.template_cache_dir:
+        os.makedirs(settings.template_cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(settings.template_cache_dir)
+    return Environment(loader=FileSystemLoader(directory), autoescape=True, bytecode_cache=bytecode_cache)
+
+templates = metrics.TimedTemplates(env=template_env())
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.add_middleware(sqlstats.QueryBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+sqlstats.install(engine)
+if read_engine is not None:
+    sqlstats.install(read_engine)
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    with next(get_db()) as db:
+    with metrics.startup_phase("schema"):
+        sync_schema()
+    with metrics.startup_phase("revisions"):
+        revisions.migrate_inline_content(engine)
+    with metrics.startup_phase("search_index"):
+        search.ensure_index(engine)
+    with metrics.startup_phase("seed"), next(get_db()) as db:
         seed(db)
+    if archive.enabled():
+        with metrics.startup_phase("archive"), archive.mover_engine().begin() as conn:
+            archive.ensure_schema(conn)
+    rollups.reconciler.start()
+    activity.writer.start()
+    with metrics.startup_phase("reminders"):
+        reminders.scheduler.start()
+    log.info("startup: %s", ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in metrics.registry.startup.items()))
+
+@app.on_event("shutdown")
+def on_shutdown():
+    rollups.reconciler.stop()
+    activity.writer.stop()
+    reminders.scheduler.stop()
 
-def require_user(request: Request, db: Session):
-    uid = get_current_user_id(request)
+def require_user(request: Request, db: Session) -> UserSnapshot | None:
+    token = request.cookies.get(COOKIE_NAME)
+    if not token:
+        return None
+    cached = user_cache.get(token)
+    if cached:
+        return cached
+    uid = read_session_token(token)
     if not uid:
         return None
-    return db.query(User).filter(User.id==uid).first()
+    u = queries.get_user(db, uid)
+    if not u:
+        return None
+    snapshot = UserSnapshot(id=u.id, org_id=u.org_id, name=u.name, is_admin=u.is_admin)
+    user_cache.put(token, snapshot)
+    return snapshot
+
+async def current_user(request: Request, db: ReadSession) -> UserSnapshot | None:
+    """require_user for async handlers; a cached session costs no database round trip."""
+    token = request.cookies.get(COOKIE_NAME)
+    if not token:
+        return None
+    return user_cache.get(token) or await db.run(lambda s: require_user(request, s))
+
+async def hot_or_archived(db: ReadSession, fn, *args):
+    """`await db.run(fn, *args)`, repeated against the archive (archive.py) if it found nothing.
+    Returns the ReadSession that answered, to read the rest of the page with, and the result."""
+    result = await db.run(fn, *args)
+    if result is None and archive.enabled():
+        cold = archive.read_session()
+        found = await cold.run(fn, *args)
+        if found is not None:
+            return cold, found
+    return db, result
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(4)
+async def home(request: Request, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
     if not user:
         return RedirectResponse("/login", status_code=302)
-    projects = db.query(Project).filter(Project.org_id==user.org_id).order_by(Project.created_at.desc()).limit(25).all()
-    accounts = db.query(Account).filter(Account.org_id==user.org_id).order_by(Account.created_at.desc()).limit(10).all()
-    # simple alerts
-    overdue_tasks = db.query(Task).join(Project, Task.project_id==Project.id).filter(Project.org_id==user.org_id, Task.status!="done", Task.due_date!=None, Task.due_date < datetime.utcnow()).count()
-    return templates.TemplateResponse("dashboard.html", {"request": request, "user": user, "projects": projects, "accounts": accounts, "overdue_tasks": overdue_tasks})
+    def load(s):
+        # simple alerts come from the org rollup
+        return queries.dashboard_projects(s, user.org_id), queries.recent_accounts(s, user.org_id), rollups.org_summary(s, user.org_id)
+    projects, accounts, summary = await db.run(load)
+    return templates.TemplateResponse("dashboard.html", {"request": request, "user": user, "projects": projects, "accounts": accounts, "overdue_tasks": summary.overdue_tasks, "summary": summary})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    if not settings.metrics_enabled: return PlainTextResponse("metrics disabled", status_code=404)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/login", response_class=HTMLResponse)
 def login_get(request: Request):
     return templates.TemplateResponse("login.html", {"request": request, "error": None})
 
 @app.post("/login")
-def login_post(request: Request, db: Session = Depends(get_db), email: str = Form(...), password: str = Form(...)):
-    user = db.query(User).filter(User.email==email).first()
-    if not user or not verify_password(password, user.password_hash):
+async def login_post(request: Request, db: Session = Depends(get_db), email: str = Form(...), password: str = Form(...)):
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.email==email).first())
+    if not user or not await verify_password_async(password, user.password_hash):
+        activity.record(db, user, "login.failed")  # never the typed email: it is sometimes a pasted password
+        await run_in_threadpool(db.commit)
         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+    activity.record(db, user, "login")
+    await run_in_threadpool(db.commit)
     token = create_session_token(user.id)
     resp = RedirectResponse("/", status_code=302)
     resp.set_cookie(COOKIE_NAME, token, httponly=True, samesite="lax")
     return resp
 
 @app.get("/logout")
-def logout():
+def logout(request: Request):
+    token = request.cookies.get(COOKIE_NAME)
+    if token: user_cache.invalidate_token(token)
     resp = RedirectResponse("/login", status_code=302)
     resp.delete_cookie(COOKIE_NAME)
     return resp
 
 # Accounts
 @app.get("/accounts", response_class=HTMLResponse)
-def accounts_list(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(2)
+async def accounts_list(request: Request, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    accounts = db.query(Account).filter(Account.org_id==user.org_id).order_by(Account.created_at.desc()).all()
-    return templates.TemplateResponse("accounts.html", {"request": request, "user": user, "accounts": accounts})
+    accounts = await db.run(queries.list_accounts, user.org_id, page)
+    return templates.TemplateResponse("accounts.html", {"request": request, "user": user, "accounts": accounts.items, "page": accounts})
 
 @app.get("/accounts/new", response_class=HTMLResponse)
 def accounts_new_get(request: Request, db: Session = Depends(get_db)):
@@ -80,32 +165,18 @@ def accounts_new_post(request: Request, db: Session = Depends(get_db),
     return RedirectResponse("/accounts", status_code=302)
 
 @app.get("/accounts/{account_id}", response_class=HTMLResponse)
-def account_detail(request: Request, account_id: int, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(3)
+async def account_detail(request: Request, account_id: int, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    acc = db.query(Account).filter(Account.id==account_id, Account.org_id==user.org_id).first()
+    def load(s):
+        acc = queries.get_account(s, user.org_id, account_id)
+        return acc, queries.account_projects(s, acc.id, page) if acc else None
+    acc, projects = await db.run(load)
     if not acc: return RedirectResponse("/accounts", status_code=302)
-    projects = db.query(Project).filter(Project.account_id==acc.id).order_by(Project.created_at.desc()).all()
-    return templates.TemplateResponse("account_detail.html", {"request": request, "user": user, "acc": acc, "projects": projects})
+    return templates.TemplateResponse("account_detail.html", {"request": request, "user": user, "acc": acc, "projects": projects.items, "page": projects})
 
 # Projects
-def init_project_stages(db: Session, project: Project):
-    stages = db.query(Stage).order_by(Stage.order.asc()).all()
-    for st in stages:
-        ps = ProjectStage(project_id=project.id, stage_id=st.id, status="todo")
-        db.add(ps)
-        db.commit()
-        db.refresh(ps)
-        # checklist
-        items = db.query(StageChecklistItem).filter(StageChecklistItem.stage_id==st.id).all()
-        for it in items:
-            db.add(ProjectChecklist(project_stage_id=ps.id, item_id=it.id, done=False))
-        # deliverables
-        dels = db.query(StageDeliverable).filter(StageDeliverable.stage_id==st.id).all()
-        for d in dels:
-            db.add(ProjectDeliverable(project_stage_id=ps.id, deliverable_id=d.id, status="draft", version=1))
-        db.commit()
-
 @app.get("/projects/new/{account_id}", response_class=HTMLResponse)
 def project_new_get(request: Request, account_id: int, db: Session = Depends(get_db)):
     user = require_user(request, db)
@@ -121,36 +192,107 @@ def project_new_post(request: Request, account_id: int, db: Session = Depends(ge
     if not user: return RedirectResponse("/login", status_code=302)
     acc = db.query(Account).filter(Account.id==account_id, Account.org_id==user.org_id).first()
     if not acc: return RedirectResponse("/accounts", status_code=302)
-    pr = Project(org_id=user.org_id, account_id=acc.id, name=name, package=package or None, lead_source=lead_source or None, status="active")
-    db.add(pr); db.commit(); db.refresh(pr)
-    init_project_stages(db, pr)
-    return RedirectResponse(f"/projects/{pr.id}", status_code=302)
+    project_id, = create_projects(db, user.org_id, [{"account_id": acc.id, "name": name, "package": package, "lead_source": lead_source}])
+    return RedirectResponse(f"/projects/{project_id}", status_code=302)
 
-@app.get("/projects/{project_id}", response_class=HTMLResponse)
-def project_detail(request: Request, project_id: int, db: Session = Depends(get_db)):
+class ProjectSpec(BaseModel):
+    account_id: int
+    name: str
+    package: str = ""
+    lead_source: str = ""
+
+@app.post("/projects/bulk")
+def projects_bulk(request: Request, specs: list[ProjectSpec], db: Session = Depends(get_db)):
     user = require_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    account_ids = {s.account_id for s in specs}
+    owned = {aid for aid, in db.query(Account.id).filter(Account.org_id==user.org_id, Account.id.in_(account_ids))}
+    missing = sorted(account_ids - owned)
+    if missing: return JSONResponse({"error": "unknown accounts", "account_ids": missing}, status_code=400)
+    return {"project_ids": create_projects(db, user.org_id, [s.model_dump() for s in specs])}
+
+def cached_page(request: Request, stamp: pagecache.Stamp, etag: str) -> Response | None:
+    """304 or the cached HTML for an unchanged page; None means render it."""
+    if not stamp.fresh:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if pagecache.not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = pagecache.fragments.get(etag)
+    return HTMLResponse(body, headers=headers) if body is not None else None
+
+def store_page(response: Response, stamp: pagecache.Stamp, etag: str) -> Response:
+    if stamp.fresh:
+        pagecache.fragments.put(etag, response.body)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.get("/projects/{project_id}", response_class=HTMLResponse)
+@query_budget(6)
+async def project_detail(request: Request, project_id: int, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    pr = db.query(Project).filter(Project.id==project_id, Project.org_id==user.org_id).first()
-    if not pr: return RedirectResponse("/", status_code=302)
-    stages = db.query(ProjectStage).filter(ProjectStage.project_id==pr.id).join(Stage, ProjectStage.stage_id==Stage.id).order_by(Stage.order.asc()).all()
+    db, stamp = await hot_or_archived(db, pagecache.project_stamp, user.org_id, project_id)
+    if not stamp: return RedirectResponse("/", status_code=302)
+    etag = stamp.etag(f"p{project_id}", user.id)
+    if cached := cached_page(request, stamp, etag): return cached
+    def load(s):
+        pr = queries.get_project(s, user.org_id, project_id)
+        if not pr: return None
+        return pr, queries.project_stages(s, pr.id), rollups.project_summary(s, pr), queries.recent_tasks(s, pr.id), queries.recent_opportunities(s, pr.id)
+    loaded = await db.run(load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    pr, stages, summary, tasks, opps = loaded
     # progress
-    done = sum(1 for s in stages if s.status=="done")
-    progress = int((done/len(stages))*100) if stages else 0
-    tasks = db.query(Task).filter(Task.project_id==pr.id).order_by(Task.created_at.desc()).limit(10).all()
-    opps = db.query(Opportunity).filter(Opportunity.project_id==pr.id).order_by(Opportunity.created_at.desc()).limit(10).all()
-    return templates.TemplateResponse("project_detail.html", {"request": request, "user": user, "pr": pr, "stages": stages, "progress": progress, "tasks": tasks, "opps": opps})
+    progress = int((summary.stages_done/summary.stages_total)*100) if summary.stages_total else 0
+    return store_page(templates.TemplateResponse("project_detail.html", {"request": request, "user": user, "pr": pr, "stages": stages, "progress": progress, "summary": summary, "tasks": tasks, "opps": opps, "version": stamp.version, "archived": db.archived}), stamp, etag)
 
 @app.get("/projects/{project_id}/stage/{project_stage_id}", response_class=HTMLResponse)
-def stage_detail(request: Request, project_id: int, project_stage_id: int, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(6)
+async def stage_detail(request: Request, project_id: int, project_stage_id: int, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    ps = db.query(ProjectStage).join(Project, ProjectStage.project_id==Project.id).filter(Project.id==project_id, Project.org_id==user.org_id, ProjectStage.id==project_stage_id).first()
+    db, stamp = await hot_or_archived(db, pagecache.project_stamp, user.org_id, project_id)
+    if not stamp: return RedirectResponse("/", status_code=302)
+    etag = stamp.etag(f"p{project_id}.s{project_stage_id}", user.id)
+    if cached := cached_page(request, stamp, etag): return cached
+    def load(s):
+        ps = queries.get_stage_detail(s, user.org_id, project_id, project_stage_id)
+        return ps, queries.stage_approvals(s, ps.id) if ps else None
+    ps, approvals = await db.run(load)
     if not ps: return RedirectResponse(f"/projects/{project_id}", status_code=302)
-    stage = db.query(Stage).filter(Stage.id==ps.stage_id).first()
-    checklist = db.query(ProjectChecklist).filter(ProjectChecklist.project_stage_id==ps.id).all()
-    deliverables = db.query(ProjectDeliverable).filter(ProjectDeliverable.project_stage_id==ps.id).all()
-    approvals = db.query(Approval).filter(Approval.project_stage_id==ps.id).order_by(Approval.at.desc()).all()
-    return templates.TemplateResponse("stage_detail.html", {"request": request, "user": user, "ps": ps, "stage": stage, "checklist": checklist, "deliverables": deliverables, "approvals": approvals, "project_id": project_id})
+    return store_page(templates.TemplateResponse("stage_detail.html", {"request": request, "user": user, "ps": ps, "stage": ps.stage, "checklist": ps.checklist, "deliverables": ps.deliverables, "approvals": approvals, "project_id": project_id, "version": stamp.version, "archived": db.archived}), stamp, etag)
+
+@app.get("/projects/{project_id}/events")
+@query_budget(2)
+async def project_events(request: Request, project_id: int, db: ReadSession = Depends(get_read_db), since: int | None = None):
+    """Server-sent change events for the project's pages (events.py). `since` (or Last-Event-ID
+    on a reconnect) is the project version the page shows; an older one is told to resync."""
+    user = await current_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    # Subscribe before reading the version, so a change committed in between is either
+    # delivered or makes the version check fail.
+    sub = events.hub.subscribe(project_id)
+    stamp = await db.run(pagecache.project_stamp, user.org_id, project_id)
+    if not stamp:
+        events.hub.unsubscribe(sub)
+        return JSONResponse({"error": "not found"}, status_code=404)
+    last_id = request.headers.get("last-event-id", "")
+    seen = int(last_id) if last_id.isdigit() else since
+    return StreamingResponse(events.stream(sub, resync=seen is not None and stamp.version > seen), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@app.post("/projects/{project_id}/restore")
+def project_restore(request: Request, project_id: int, db: Session = Depends(get_db)):
+    """Move an archived project back to the hot tables (admins)."""
+    user = require_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    if not user.is_admin: return JSONResponse({"error": "forbidden"}, status_code=403)
+    if archive.enabled() and archive.restore([project_id], org_id=user.org_id):
+        activity.record(db, user, "project.restore", project_id)
+        db.commit()
+    return RedirectResponse(f"/projects/{project_id}", status_code=302)
 
 @app.post("/projects/{project_id}/stage/{project_stage_id}/toggle")
 def checklist_toggle(request: Request, project_id: int, project_stage_id: int, db: Session = Depends(get_db), cid: int = Form(...)):
@@ -161,22 +303,91 @@ def checklist_toggle(request: Request, project_id: int, project_stage_id: int, d
         row.done = not row.done
         row.done_by = user.id if row.done else None
         row.done_at = datetime.utcnow() if row.done else None
+        mark_started(db, project_stage_id)
+        pagecache.bump_project(db, project_id)
+        activity.record(db, user, "checklist.toggle", project_id, row.id, "done" if row.done else "not done")
+        events.publish(db, project_id, checklist=[events.checklist_row(row)], stages=lambda: events.stage_rows(db, [project_stage_id]))
         db.commit()
     return RedirectResponse(f"/projects/{project_id}/stage/{project_stage_id}", status_code=302)
 
 @app.post("/projects/{project_id}/stage/{project_stage_id}/deliverable")
 def deliverable_update(request: Request, project_id: int, project_stage_id: int, db: Session = Depends(get_db),
-                       did: int = Form(...), content: str = Form("")):
+                       did: int = Form(...), content: str = Form(""), base: str = Form("")):
     user = require_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
     d = db.query(ProjectDeliverable).join(ProjectStage, ProjectDeliverable.project_stage_id==ProjectStage.id).join(Project, ProjectStage.project_id==Project.id)        .filter(Project.id==project_id, Project.org_id==user.org_id, ProjectStage.id==project_stage_id, ProjectDeliverable.id==did).first()
+    if d and d.head_revision_id != (int(base) if base.isdigit() else None):
+        # Saved by someone else since this editor loaded (or edited without loading the text).
+        d = queries.get_deliverable(db, user.org_id, did)
+        return templates.TemplateResponse("deliverable_edit.html", {"request": request, "user": user, "d": d, "content": content, "conflict": True}, status_code=409)
     if d:
-        d.content = content
+        revisions.save(db, d, content, user.id)
+        activity.record(db, user, "deliverable.save", project_id, d.id, f"v{d.version}")
         d.updated_at = datetime.utcnow()
         d.status = "submitted" if content.strip() else "draft"
+        mark_started(db, project_stage_id)
+        pagecache.bump_project(db, project_id)
+        events.publish(db, project_id, deliverables=[events.deliverable_row(d)], stages=lambda: events.stage_rows(db, [project_stage_id]))
         db.commit()
     return RedirectResponse(f"/projects/{project_id}/stage/{project_stage_id}", status_code=302)
 
+# Deliverable history
+@app.get("/deliverables/{deliverable_id}/edit", response_class=HTMLResponse)
+@query_budget(4)
+async def deliverable_edit(request: Request, deliverable_id: int, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    def load(s):
+        d = queries.get_deliverable(s, user.org_id, deliverable_id)
+        return (d, revisions.load(s, d.id, d.version) if d.head_revision_id else "") if d else None
+    db, loaded = await hot_or_archived(db, load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    d, content = loaded
+    return templates.TemplateResponse("deliverable_edit.html", {"request": request, "user": user, "d": d, "content": content, "conflict": False, "archived": db.archived})
+
+@app.get("/deliverables/{deliverable_id}/revisions", response_class=HTMLResponse)
+@query_budget(4)
+async def deliverable_history(request: Request, deliverable_id: int, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    def load(s):
+        d = queries.get_deliverable(s, user.org_id, deliverable_id)
+        return (d, revisions.history(s, d.id)) if d else None
+    _, loaded = await hot_or_archived(db, load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    d, history = loaded
+    return templates.TemplateResponse("deliverable_history.html", {"request": request, "user": user, "d": d, "revisions": history})
+
+@app.get("/deliverables/{deliverable_id}/revisions/{number}")
+@query_budget(4)
+async def deliverable_revision(request: Request, deliverable_id: int, number: int, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    def load(s):
+        d = queries.get_deliverable(s, user.org_id, deliverable_id)
+        return revisions.load(s, d.id, number) if d else None
+    _, content = await hot_or_archived(db, load)
+    if content is None: return JSONResponse({"error": "not found"}, status_code=404)
+    # A revision never changes once written.
+    return PlainTextResponse(content, headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
+@app.get("/deliverables/{deliverable_id}/diff")
+@query_budget(5)
+async def deliverable_diff(request: Request, deliverable_id: int, db: ReadSession = Depends(get_read_db),
+                           a: int | None = QueryParam(None, ge=0), b: int | None = QueryParam(None, ge=0)):
+    """Unified diff between two revisions; defaults to the head against the one before it."""
+    user = await current_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    def load(s):
+        d = queries.get_deliverable(s, user.org_id, deliverable_id)
+        if not d: return None
+        new = d.version if b is None else b
+        old = max(new - 1, 0) if a is None else a
+        return revisions.diff(s, d.id, old, new)
+    _, diff = await hot_or_archived(db, load)
+    if diff is None: return JSONResponse({"error": "not found"}, status_code=404)
+    return PlainTextResponse(diff)
+
 @app.post("/projects/{project_id}/stage/{project_stage_id}/approve")
 def stage_approve(request: Request, project_id: int, project_stage_id: int, db: Session = Depends(get_db),
                  decision: str = Form(...), comment: str = Form("")):
@@ -185,6 +396,8 @@ def stage_approve(request: Request, project_id: int, project_stage_id: int, db:
     ps = db.query(ProjectStage).join(Project, ProjectStage.project_id==Project.id)        .filter(Project.id==project_id, Project.org_id==user.org_id, ProjectStage.id==project_stage_id).first()
     if ps:
         db.add(Approval(project_stage_id=ps.id, decision=decision, comment=comment or None, by_user=user.id))
+        old_status = ps.status
+        ps.started_at = ps.started_at or datetime.utcnow()
         if decision == "approve":
             ps.status = "done"
             ps.completed_at = datetime.utcnow()
@@ -192,29 +405,123 @@ def stage_approve(request: Request, project_id: int, project_stage_id: int, db:
             ps.approved_at = datetime.utcnow()
         else:
             ps.status = "blocked"
+        rollups.on_stage_status(db, user.org_id, project_id, old_status, ps.status)
+        pagecache.bump_project(db, project_id)
+        activity.record(db, user, "stage.approve" if decision == "approve" else "stage.reject", project_id, ps.id, comment or None)
+        events.publish(db, project_id, stages=[{"id": ps.id, "status": ps.status}])
         db.commit()
     return RedirectResponse(f"/projects/{project_id}/stage/{project_stage_id}", status_code=302)
 
+# Reports
+@app.get("/reports", response_class=HTMLResponse)
+@query_budget(4)
+async def reports(request: Request, db: ReadSession = Depends(get_read_db)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    report = await db.run(analytics.pipeline_report, user.org_id)
+    return templates.TemplateResponse("reports.html", {"request": request, "user": user, "report": report})
+
+# Search
+@app.get("/search", response_class=HTMLResponse)
+@query_budget(2)
+async def search_page(request: Request, db: ReadSession = Depends(get_read_db), q: str = "", kind: str = "",
+                      offset: int = QueryParam(0, ge=0), limit: int = QueryParam(20, ge=1, le=100)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    kind = kind if kind in search.DOCS else None
+    results = await db.run(search.search, user.org_id, q, kind, offset, limit)
+    return templates.TemplateResponse("search.html", {"request": request, "user": user, "results": results, "kind": kind or "", "kinds": list(search.DOCS)})
+
+# Export
+@app.get("/export/{entity}")
+def export_entity(request: Request, entity: str, db: Session = Depends(get_db), format: str = "csv",
+                  columns: str = "", since: datetime | None = None, gzip: bool = False):
+    user = require_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    if entity not in export.EXPORTS or format not in export.FORMATS:
+        return PlainTextResponse("unknown export", status_code=404)
+    try:
+        chunks = export.stream_export(entity, user.org_id, format, [c for c in columns.split(",") if c], since, gzip)
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    filename = f"{entity}.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(chunks, media_type="application/gzip" if gzip else export.FORMATS[format], headers=headers)
+
+# Import
+@app.post("/import/{entity}")
+def import_upload(request: Request, entity: str, background: BackgroundTasks, db: Session = Depends(get_db),
+                  file: UploadFile = File(...), format: str = Form("csv")):
+    user = require_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    if entity not in importer.ENTITIES or format not in importer.FORMATS:
+        return JSONResponse({"error": "unknown entity or format"}, status_code=400)
+    job = importer.create_job(db, user.org_id, user.id, entity, format, file.file)
+    background.add_task(importer.run_import, job.id)
+    return JSONResponse({"job_id": job.id, "status_url": f"/import/jobs/{job.id}"}, status_code=202)
+
+@app.get("/import/jobs/{job_id}")
+def import_status(request: Request, job_id: int, db: Session = Depends(get_db)):
+    user = require_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    job = db.query(ImportJob).filter(ImportJob.id==job_id, ImportJob.org_id==user.org_id).first()
+    if not job: return JSONResponse({"error": "not found"}, status_code=404)
+    return {**importer.job_status(job), "active": importer.is_running(job.id)}
+
+@app.post("/import/jobs/{job_id}/resume")
+def import_resume(request: Request, job_id: int, background: BackgroundTasks, db: Session = Depends(get_db)):
+    user = require_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    job = db.query(ImportJob).filter(ImportJob.id==job_id, ImportJob.org_id==user.org_id).first()
+    if not job: return JSONResponse({"error": "not found"}, status_code=404)
+    if job.status == "done" or importer.is_running(job.id):
+        return JSONResponse({"error": f"job is {'running' if importer.is_running(job.id) else job.status}"}, status_code=409)
+    background.add_task(importer.run_import, job.id)
+    return JSONResponse({"job_id": job.id, "status_url": f"/import/jobs/{job.id}"}, status_code=202)
+
 # Tasks
+def parse_due_date(value: str) -> datetime | None:
+    """A due date from a form: "" for none, a date (due at the end of that day) or an ISO datetime."""
+    value = value.strip()
+    if not value:
+        return None
+    due = datetime.fromisoformat(value)
+    return datetime.combine(due.date(), time(23, 59, 59)) if len(value) == 10 else due
+
 @app.get("/projects/{project_id}/tasks", response_class=HTMLResponse)
-def tasks_list(request: Request, project_id: int, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(4)
+async def tasks_list(request: Request, project_id: int, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    pr = db.query(Project).filter(Project.id==project_id, Project.org_id==user.org_id).first()
-    if not pr: return RedirectResponse("/", status_code=302)
-    tasks = db.query(Task).filter(Task.project_id==pr.id).order_by(Task.created_at.desc()).all()
-    stages = db.query(ProjectStage).filter(ProjectStage.project_id==pr.id).all()
-    return templates.TemplateResponse("tasks.html", {"request": request, "user": user, "pr": pr, "tasks": tasks, "stages": stages})
+    def load(s):
+        pr = queries.get_project(s, user.org_id, project_id)
+        return (pr, queries.list_tasks(s, pr.id, page), queries.project_stages(s, pr.id)) if pr else None
+    db, loaded = await hot_or_archived(db, load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    pr, tasks, stages = loaded
+    return templates.TemplateResponse("tasks.html", {"request": request, "user": user, "pr": pr, "tasks": tasks.items, "page": tasks, "stages": stages,
+                                                     "now": datetime.utcnow(), "archived": db.archived})
 
 @app.post("/projects/{project_id}/tasks/new")
 def task_new(request: Request, project_id: int, db: Session = Depends(get_db),
-             title: str = Form(...), project_stage_id: int = Form(0), priority: str = Form("med")):
+             title: str = Form(...), project_stage_id: int = Form(0), priority: str = Form("med"), due_date: str = Form("")):
     user = require_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
+    try:
+        due = parse_due_date(due_date)
+    except ValueError:
+        return PlainTextResponse("invalid due date", status_code=400)
     pr = db.query(Project).filter(Project.id==project_id, Project.org_id==user.org_id).first()
     if not pr: return RedirectResponse("/", status_code=302)
     psid = project_stage_id if project_stage_id != 0 else None
-    db.add(Task(project_id=pr.id, project_stage_id=psid, title=title, owner_user_id=user.id, priority=priority))
+    t = Task(project_id=pr.id, project_stage_id=psid, title=title, owner_user_id=user.id, status="todo", priority=priority, due_date=due)
+    db.add(t)
+    rollups.on_task_added(db, user.org_id, pr.id, t)
+    pagecache.bump_project(db, pr.id)
+    db.flush()
+    activity.record(db, user, "task.new", pr.id, t.id, t.title)
+    reminders.track(db, t)
+    events.publish(db, pr.id, new_tasks=[{"id": t.id, "title": t.title, "status": t.status}])
     db.commit()
     return RedirectResponse(f"/projects/{project_id}/tasks", status_code=302)
 
@@ -224,20 +531,62 @@ def task_set(request: Request, task_id: int, db: Session = Depends(get_db), stat
     if not user: return RedirectResponse("/login", status_code=302)
     t = db.query(Task).join(Project, Task.project_id==Project.id).filter(Task.id==task_id, Project.org_id==user.org_id).first()
     if t:
+        old_status = t.status
         t.status = status
+        rollups.on_task_status(db, user.org_id, t.project_id, t, old_status)
+        pagecache.bump_project(db, t.project_id)
+        activity.record(db, user, "task.status", t.project_id, t.id, status)
+        reminders.track(db, t)
+        events.publish(db, t.project_id, tasks=[events.task_row(t)])
         db.commit()
         return RedirectResponse(f"/projects/{t.project_id}/tasks", status_code=302)
     return RedirectResponse("/", status_code=302)
 
+@app.post("/tasks/{task_id}/due")
+def task_due(request: Request, task_id: int, db: Session = Depends(get_db), due_date: str = Form("")):
+    user = require_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    try:
+        due = parse_due_date(due_date)
+    except ValueError:
+        return PlainTextResponse("invalid due date", status_code=400)
+    t = db.query(Task).join(Project, Task.project_id==Project.id).filter(Task.id==task_id, Project.org_id==user.org_id).first()
+    if t:
+        old_due = t.due_date
+        t.due_date, t.reminder_state = due, 0
+        rollups.on_task_due(db, user.org_id, t.project_id, t, old_due)
+        pagecache.bump_project(db, t.project_id)
+        activity.record(db, user, "task.due", t.project_id, t.id, due.strftime("%Y-%m-%d") if due else "none")
+        reminders.track(db, t)
+        db.commit()
+        return RedirectResponse(f"/projects/{t.project_id}/tasks", status_code=302)
+    return RedirectResponse("/", status_code=302)
+
+@app.post("/api/batch")
+def api_batch(request: Request, body: batch.Batch, db: Session = Depends(get_db)):
+    user = require_user(request, db)
+    if not user: return JSONResponse({"error": "unauthorized"}, status_code=401)
+    try:
+        changed = batch.apply(db, user, body.ops)
+    except batch.Rejected as e:
+        db.rollback()
+        return JSONResponse({"error": e.error, "ops": e.indexes}, status_code=e.status_code)
+    db.commit()
+    return changed
+
 # Opportunities
 @app.get("/projects/{project_id}/opportunities", response_class=HTMLResponse)
-def opps_list(request: Request, project_id: int, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+@query_budget(3)
+async def opps_list(request: Request, project_id: int, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
     if not user: return RedirectResponse("/login", status_code=302)
-    pr = db.query(Project).filter(Project.id==project_id, Project.org_id==user.org_id).first()
-    if not pr: return RedirectResponse("/", status_code=302)
-    opps = db.query(Opportunity).filter(Opportunity.project_id==pr.id).order_by(Opportunity.created_at.desc()).all()
-    return templates.TemplateResponse("opportunities.html", {"request": request, "user": user, "pr": pr, "opps": opps})
+    def load(s):
+        pr = queries.get_project(s, user.org_id, project_id)
+        return (pr, queries.list_opportunities(s, pr.id, page)) if pr else None
+    db, loaded = await hot_or_archived(db, load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    pr, opps = loaded
+    return templates.TemplateResponse("opportunities.html", {"request": request, "user": user, "pr": pr, "opps": opps.items, "page": opps, "archived": db.archived})
 
 @app.post("/projects/{project_id}/opportunities/new")
 def opp_new(request: Request, project_id: int, db: Session = Depends(get_db),
@@ -248,6 +597,50 @@ def opp_new(request: Request, project_id: int, db: Session = Depends(get_db),
     if not pr: return RedirectResponse("/", status_code=302)
     ve = int(value_estimate) if value_estimate.strip().isdigit() else None
     pb = int(probability) if probability.strip().isdigit() else None
-    db.add(Opportunity(project_id=pr.id, title=title, otype=otype, value_estimate=ve, probability=pb, notes=notes or None))
+    o = Opportunity(project_id=pr.id, title=title, otype=otype, value_estimate=ve, probability=pb, stage="new", notes=notes or None)
+    db.add(o)
+    rollups.on_opportunity_added(db, user.org_id, pr.id, o)
+    pagecache.bump_project(db, pr.id)
+    db.flush()
+    activity.record(db, user, "opportunity.new", pr.id, o.id, o.title)
+    events.publish(db, pr.id, new_opportunities=[{"id": o.id, "title": o.title, "stage": o.stage}])
     db.commit()
     return RedirectResponse(f"/projects/{project_id}/opportunities", status_code=302)
+
+# Activity
+def activity_page(request: Request, user: UserSnapshot, page: PageRequest, feed: Page, pending: list[dict], **context):
+    # Entries still in the write buffer go on top of the first page, minus any a flush wrote meanwhile.
+    entries = (activity.unwritten(pending, feed.items) if not (page.after or page.before) else []) + feed.items
+    return templates.TemplateResponse("activity.html", {"request": request, "user": user, "entries": entries, "page": feed, **context})
+
+@app.get("/projects/{project_id}/activity", response_class=HTMLResponse)
+@query_budget(4)
+async def project_activity(request: Request, project_id: int, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    pending = activity.writer.pending(project_id=project_id)
+    def load(s):
+        pr = queries.get_project(s, user.org_id, project_id)
+        if not pr: return None
+        feed = queries.activity_feed(s, page, project_id=pr.id)
+        return pr, feed, queries.names(s, User, [e.user_id for e in feed.items] + [e["user_id"] for e in pending])
+    _, loaded = await hot_or_archived(db, load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    pr, feed, user_names = loaded
+    return activity_page(request, user, page, feed, pending, pr=pr, subject=pr.name, back=f"/projects/{pr.id}", user_names=user_names)
+
+@app.get("/users/{user_id}/activity", response_class=HTMLResponse)
+@query_budget(4)
+async def user_activity(request: Request, user_id: int, db: ReadSession = Depends(get_read_db), page: PageRequest = Depends(page_params)):
+    user = await current_user(request, db)
+    if not user: return RedirectResponse("/login", status_code=302)
+    pending = activity.writer.pending(user_id=user_id)
+    def load(s):
+        subject = queries.get_user(s, user_id)
+        if not subject or subject.org_id != user.org_id: return None
+        feed = queries.activity_feed(s, page, user_id=subject.id)
+        return subject, feed, queries.names(s, Project, [e.project_id for e in feed.items] + [e["project_id"] for e in pending])
+    loaded = await db.run(load)
+    if not loaded: return RedirectResponse("/", status_code=302)
+    subject, feed, project_names = loaded
+    return activity_page(request, user, page, feed, pending, pr=None, subject=subject.name, back="/", user_names={subject.id: subject.name}, project_names=project_names)
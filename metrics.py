@@ -0,0 +1,132 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from fastapi.templating import Jinja2Templates
+from .sqlstats import RequestStats, current_stats, bind_stats
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250)
+
+class Histogram:
+    """Fixed-bucket histogram: memory is O(len(buckets)) regardless of traffic."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for le, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            yield le, total
+
+# name -> (help, buckets, RequestStats/total getter)
+METRICS = {
+    "bdos_request_duration_seconds": ("Total request latency.", LATENCY_BUCKETS, lambda s, total: total),
+    "bdos_request_sql_seconds": ("Time spent executing SQL per request.", LATENCY_BUCKETS, lambda s, total: s.sql_time),
+    "bdos_request_render_seconds": ("Time spent rendering templates per request.", LATENCY_BUCKETS, lambda s, total: s.render_time),
+    "bdos_request_sql_statements": ("SQL statements issued per request.", STATEMENT_BUCKETS, lambda s, total: s.statements),
+}
+
+class Registry:
+    """Histograms keyed by (metric, method, route template).
+
+    Route templates come from the app's route table (unmatched paths share one
+    label), so the number of series is bounded by the number of routes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: dict[tuple[str, str, str], Histogram] = {}
+        self.startup: dict[str, float] = {}  # phase -> seconds, set once per worker
+
+    def observe(self, method: str, route: str, stats: RequestStats, total: float):
+        with self._lock:
+            for name, (_, buckets, get) in METRICS.items():
+                key = (name, method, route)
+                h = self._series.get(key)
+                if h is None:
+                    h = self._series[key] = Histogram(buckets)
+                h.observe(get(stats, total))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (help_text, _, _) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, method, route), h in sorted(self._series.items()):
+                    if metric != name:
+                        continue
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    for le, n in h.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{"+Inf" if le == float("inf") else le}"}} {n}')
+                    lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {h.count}")
+            if self.startup:
+                lines.append("# HELP bdos_startup_seconds Time this worker spent in each startup phase.")
+                lines.append("# TYPE bdos_startup_seconds gauge")
+                lines.extend(f'bdos_startup_seconds{{phase="{phase}"}} {seconds}' for phase, seconds in self.startup.items())
+        return "\n".join(lines) + "\n"
+
+    def totals(self, name: str, method: str, route: str) -> tuple[int, float]:
+        """(observations, sum) of one series; (0, 0.0) if it has none."""
+        with self._lock:
+            h = self._series.get((name, method, route))
+            return (h.count, h.sum) if h else (0, 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+@contextmanager
+def startup_phase(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.startup[phase] = time.perf_counter() - start
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+registry = Registry()
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that adds render time to the current request's stats."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().TemplateResponse(*args, **kwargs)
+        finally:
+            stats = current_stats.get()
+            if stats is not None:
+                stats.render_time += time.perf_counter() - start
+
+class MetricsMiddleware:
+    """Records per-route latency, SQL time/count and render time once the response body is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats, token = bind_stats()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            registry.observe(scope["method"], route, stats, time.perf_counter() - start)
+            if token is not None:
+                current_stats.reset(token)
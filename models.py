@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Boolean, Text, UniqueConstraint
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Boolean, Text, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from .db import Base
@@ -27,6 +27,8 @@ class User(Base):
 
 class Account(Base):
     __tablename__ = "accounts"
+    __table_args__ = (Index("ix_accounts_org_created", "org_id", "created_at", "id"),
+                      Index("ix_accounts_org_name_country", "org_id", "name", "country"))
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     org_id: Mapped[int] = mapped_column(ForeignKey("orgs.id"), index=True)
     name: Mapped[str] = mapped_column(String(250))
@@ -35,6 +37,7 @@ class Account(Base):
     country: Mapped[str | None] = mapped_column(String(100), nullable=True)
     owner_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     org = relationship("Org", back_populates="accounts")
     contacts = relationship("Contact", back_populates="account", cascade="all, delete-orphan")
@@ -63,6 +66,8 @@ class Stage(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_org_created", "org_id", "created_at", "id"),
+                      Index("ix_projects_account_created", "account_id", "created_at", "id"))
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     org_id: Mapped[int] = mapped_column(ForeignKey("orgs.id"), index=True)
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"), index=True)
@@ -72,12 +77,15 @@ class Project(Base):
     status: Mapped[str] = mapped_column(String(30), default="active")  # active / paused / done
     start_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0") # bumped by every change shown on the project/stage pages (pagecache)
 
     org = relationship("Org", back_populates="projects")
     account = relationship("Account", back_populates="projects")
     stages = relationship("ProjectStage", back_populates="project", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
     opportunities = relationship("Opportunity", back_populates="project", cascade="all, delete-orphan")
+    rollup = relationship("ProjectRollup", uselist=False, viewonly=True)
 
 class ProjectStage(Base):
     __tablename__ = "project_stages"
@@ -136,16 +144,36 @@ class ProjectDeliverable(Base):
     project_stage_id: Mapped[int] = mapped_column(ForeignKey("project_stages.id"), index=True)
     deliverable_id: Mapped[int] = mapped_column(ForeignKey("stage_deliverables.id"), index=True)
     status: Mapped[str] = mapped_column(String(20), default="draft") # draft/submitted/approved
-    content: Mapped[str | None] = mapped_column(Text, nullable=True)  # quick notes / link
+    # Content lives in deliverable_revisions; the row keeps only what stage pages show.
+    head_revision_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    content_size: Mapped[int] = mapped_column(Integer, default=0, server_default="0")  # bytes (UTF-8) of the head revision
+    preview: Mapped[str | None] = mapped_column(String(300), nullable=True)
     file_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
-    version: Mapped[int] = mapped_column(Integer, default=1)
+    version: Mapped[int] = mapped_column(Integer, default=1)  # head revision number
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     project_stage = relationship("ProjectStage", back_populates="deliverables")
     deliverable = relationship("StageDeliverable")
 
+class DeliverableRevision(Base):
+    """One saved version of a deliverable: a compressed keyframe or a line delta against the previous revision."""
+    __tablename__ = "deliverable_revisions"
+    __table_args__ = (UniqueConstraint("deliverable_id", "number", name="uq_deliverable_revision"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    deliverable_id: Mapped[int] = mapped_column(ForeignKey("project_deliverables.id"))
+    number: Mapped[int] = mapped_column(Integer)
+    keyframe: Mapped[int] = mapped_column(Integer)  # number of the full revision this one's delta chain starts from
+    encoding: Mapped[str] = mapped_column(String(10))  # full/delta
+    codec: Mapped[str] = mapped_column(String(10))  # zlib/zstd
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    size: Mapped[int] = mapped_column(Integer)  # bytes (UTF-8) of the decoded text
+    created_by: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_project_created", "project_id", "created_at", "id"),
+                      Index("ix_tasks_status_due", "status", "due_date"))
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
     project_stage_id: Mapped[int | None] = mapped_column(ForeignKey("project_stages.id"), nullable=True)
@@ -154,12 +182,15 @@ class Task(Base):
     status: Mapped[str] = mapped_column(String(20), default="todo") # todo/doing/done
     priority: Mapped[str] = mapped_column(String(10), default="med") # low/med/high
     due_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    reminder_state: Mapped[int | None] = mapped_column(Integer, default=0, server_default="0") # last reminder sent for due_date: 0 none, 1 due soon, 2 overdue
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project", back_populates="tasks")
 
 class Opportunity(Base):
     __tablename__ = "opportunities"
+    __table_args__ = (Index("ix_opportunities_project_created", "project_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
     title: Mapped[str] = mapped_column(String(260))
@@ -169,6 +200,7 @@ class Opportunity(Base):
     stage: Mapped[str] = mapped_column(String(30), default="new") # new/qualified/pitched/won/lost
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project", back_populates="opportunities")
 
@@ -182,3 +214,67 @@ class Approval(Base):
     at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     project_stage = relationship("ProjectStage", back_populates="approvals")
+
+# Denormalized counters maintained incrementally by rollups.py; a periodic
+# reconciler recomputes them from the source tables.
+class ProjectRollup(Base):
+    __tablename__ = "project_rollups"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
+    org_id: Mapped[int] = mapped_column(ForeignKey("orgs.id"), index=True)
+    stages_total: Mapped[int] = mapped_column(Integer, default=0)
+    stages_done: Mapped[int] = mapped_column(Integer, default=0)
+    open_tasks: Mapped[int] = mapped_column(Integer, default=0)
+    overdue_tasks: Mapped[int] = mapped_column(Integer, default=0)
+    open_opp_value: Mapped[int] = mapped_column(Integer, default=0)
+    next_due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True) # earliest due date of an open, not yet overdue task
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class OrgRollup(Base):
+    __tablename__ = "org_rollups"
+    org_id: Mapped[int] = mapped_column(ForeignKey("orgs.id"), primary_key=True)
+    stages_done: Mapped[int] = mapped_column(Integer, default=0)
+    open_tasks: Mapped[int] = mapped_column(Integer, default=0)
+    overdue_tasks: Mapped[int] = mapped_column(Integer, default=0)
+    open_opp_value: Mapped[int] = mapped_column(Integer, default=0)
+    next_due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0") # bumped on every change to the org's projects/tasks/opportunities
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    org_id: Mapped[int] = mapped_column(ForeignKey("orgs.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    entity: Mapped[str] = mapped_column(String(30)) # accounts/contacts/opportunities
+    fmt: Mapped[str] = mapped_column(String(10)) # csv/ndjson
+    source_path: Mapped[str] = mapped_column(String(500))
+    status: Mapped[str] = mapped_column(String(20), default="pending") # pending/running/done/failed
+    rows_done: Mapped[int] = mapped_column(Integer, default=0) # rows consumed by committed chunks; resume skips these
+    rows_inserted: Mapped[int] = mapped_column(Integer, default=0)
+    rows_duplicate: Mapped[int] = mapped_column(Integer, default=0)
+    rows_failed: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[str | None] = mapped_column(Text, nullable=True) # JSON list of {"row", "error"}, capped
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Written in batches behind the request by activity.py. No foreign keys: the
+# trail outlives what it refers to, and the table stays narrow.
+class Activity(Base):
+    __tablename__ = "activity"
+    __table_args__ = (Index("ix_activity_project_created", "project_id", "created_at", "id"),
+                      Index("ix_activity_user_created", "user_id", "created_at", "id"))
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    org_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    project_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    kind: Mapped[str] = mapped_column(String(24)) # activity.KINDS
+    ref_id: Mapped[int | None] = mapped_column(Integer, nullable=True) # checklist item / deliverable / task / stage / opportunity id
+    detail: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime) # when it happened, not when it was written
+
+class AppMeta(Base):
+    """Key/value state of the deployment itself (schema and seed fingerprints)."""
+    __tablename__ = "app_meta"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[str] = mapped_column(String(200))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,77 @@
+"""Per-project version stamps, conditional GET and a rendered-page cache.
+
+Every handler that changes what a project or stage page shows calls
+`bump_project` in its transaction. Page handlers read the project's stamp
+with one primary-key lookup, answer a matching If-None-Match with 304 and
+otherwise serve the rendered HTML from `fragments` when they can.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from fastapi import Request
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import Project, ProjectRollup
+
+def bump_project(db: Session, *project_ids: int):
+    if project_ids:
+        bumped = db.execute(update(Project).where(Project.id.in_(project_ids)).values(version=Project.version + 1)
+                            .returning(Project.id, Project.version))
+        db.info.setdefault("project_versions", {}).update(bumped.all())  # sent with the live events (events.py)
+
+@dataclass(frozen=True)
+class Stamp:
+    version: int
+    refreshed_at: datetime | None  # rollup refreshes (lazy or reconciler) change the summary without a bump
+    fresh: bool                    # False if the rollup is missing or a due date has passed since it was computed
+
+    def etag(self, page: str, user_id: int) -> str:
+        refreshed = int(self.refreshed_at.timestamp() * 1_000_000) if self.refreshed_at else 0
+        return f'W/"{page}.{self.version}.{refreshed}.u{user_id}"'
+
+def project_stamp(db: Session, org_id: int, project_id: int) -> Stamp | None:
+    """The project's current stamp, or None if it isn't in the org."""
+    row = db.execute(select(Project.version, ProjectRollup.refreshed_at, ProjectRollup.next_due_at)
+                     .outerjoin(ProjectRollup, ProjectRollup.project_id==Project.id)
+                     .where(Project.id==project_id, Project.org_id==org_id)).first()
+    if row is None:
+        return None
+    version, refreshed_at, next_due_at = row
+    fresh = refreshed_at is not None and (next_due_at is None or next_due_at > datetime.utcnow())
+    return Stamp(version, refreshed_at, fresh)
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return header is not None and (header.strip() == "*" or etag in (t.strip() for t in header.split(",")))
+
+class FragmentCache:
+    """LRU of rendered pages keyed by (page, stamp, user); a bump simply misses."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fragments = FragmentCache(settings.page_cache_size)
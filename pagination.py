@@ -0,0 +1,57 @@
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from fastapi import Query as QueryParam
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from .config import settings
+
+@dataclass(frozen=True)
+class PageRequest:
+    after: str | None = None
+    before: str | None = None
+    limit: int = settings.page_size
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str | None
+    prev_cursor: str | None
+    limit: int
+
+def page_params(after: str | None = None, before: str | None = None, limit: int = QueryParam(settings.page_size, ge=1)) -> PageRequest:
+    return PageRequest(after=after or None, before=before or None, limit=min(limit, settings.page_size_max))
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created, row_id = raw.split("|")
+        return datetime.fromisoformat(created), int(row_id)
+    except ValueError:
+        return None
+
+def keyset_page(query: Query, model, page: PageRequest) -> Page:
+    """Newest-first page of `query` keyed on (model.created_at, model.id).
+
+    `after` walks towards older rows, `before` back towards newer ones. Backed
+    by the (<scope>, created_at, id) composite indexes, so each page costs one
+    index range scan of limit+1 rows however deep it is."""
+    key = tuple_(model.created_at, model.id)
+    backwards = page.before is not None
+    cursor = decode_cursor(page.before if backwards else page.after) if (page.before or page.after) else None
+    if cursor:
+        query = query.filter(key > tuple_(*cursor)) if backwards else query.filter(key < tuple_(*cursor))
+    order = (model.created_at.asc(), model.id.asc()) if backwards else (model.created_at.desc(), model.id.desc())
+    rows = query.order_by(*order).limit(page.limit + 1).all()
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+    if backwards:
+        rows.reverse()
+    first = encode_cursor(rows[0].created_at, rows[0].id) if rows else None
+    last = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else None
+    if backwards:
+        return Page(rows, next_cursor=last, prev_cursor=first if has_more else None, limit=page.limit)
+    return Page(rows, next_cursor=last if has_more else None, prev_cursor=first if cursor else None, limit=page.limit)
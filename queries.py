@@ -0,0 +1,73 @@
+from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager
+from .pagination import PageRequest, Page, keyset_page
+from .models import User, Account, Project, Stage, ProjectStage, ProjectChecklist, ProjectDeliverable, Task, Opportunity, Approval, Activity
+
+# Named read queries used by the page handlers. Every relationship a template
+# touches is loaded explicitly here so rendering never triggers a lazy load.
+
+def get_user(db: Session, user_id: int) -> User | None:
+    return db.query(User).filter(User.id==user_id).first()
+
+def dashboard_projects(db: Session, org_id: int, limit: int = 25) -> list[Project]:
+    return db.query(Project).options(joinedload(Project.account)).filter(Project.org_id==org_id).order_by(Project.created_at.desc()).limit(limit).all()
+
+def recent_accounts(db: Session, org_id: int, limit: int = 10) -> list[Account]:
+    return db.query(Account).filter(Account.org_id==org_id).order_by(Account.created_at.desc()).limit(limit).all()
+
+def list_accounts(db: Session, org_id: int, page: PageRequest) -> Page:
+    return keyset_page(db.query(Account).filter(Account.org_id==org_id), Account, page)
+
+def get_account(db: Session, org_id: int, account_id: int) -> Account | None:
+    return db.query(Account).filter(Account.id==account_id, Account.org_id==org_id).first()
+
+def account_projects(db: Session, account_id: int, page: PageRequest) -> Page:
+    return keyset_page(db.query(Project).filter(Project.account_id==account_id), Project, page)
+
+def get_project(db: Session, org_id: int, project_id: int) -> Project | None:
+    return db.query(Project).options(joinedload(Project.account), joinedload(Project.rollup)).filter(Project.id==project_id, Project.org_id==org_id).first()
+
+def project_stages(db: Session, project_id: int) -> list[ProjectStage]:
+    return db.query(ProjectStage).join(Stage, ProjectStage.stage_id==Stage.id).options(contains_eager(ProjectStage.stage))\
+        .filter(ProjectStage.project_id==project_id).order_by(Stage.order.asc()).all()
+
+def recent_tasks(db: Session, project_id: int, limit: int = 10) -> list[Task]:
+    return db.query(Task).filter(Task.project_id==project_id).order_by(Task.created_at.desc()).limit(limit).all()
+
+def list_tasks(db: Session, project_id: int, page: PageRequest) -> Page:
+    return keyset_page(db.query(Task).filter(Task.project_id==project_id), Task, page)
+
+def recent_opportunities(db: Session, project_id: int, limit: int = 10) -> list[Opportunity]:
+    return db.query(Opportunity).filter(Opportunity.project_id==project_id).order_by(Opportunity.created_at.desc()).limit(limit).all()
+
+def list_opportunities(db: Session, project_id: int, page: PageRequest) -> Page:
+    return keyset_page(db.query(Opportunity).filter(Opportunity.project_id==project_id), Opportunity, page)
+
+def get_stage_detail(db: Session, org_id: int, project_id: int, project_stage_id: int) -> ProjectStage | None:
+    """A project stage with its template, checklist items and deliverables."""
+    ps = db.query(ProjectStage).join(Project, ProjectStage.project_id==Project.id)\
+        .options(joinedload(ProjectStage.stage),
+                 selectinload(ProjectStage.checklist).joinedload(ProjectChecklist.item),
+                 selectinload(ProjectStage.deliverables).joinedload(ProjectDeliverable.deliverable))\
+        .filter(Project.id==project_id, Project.org_id==org_id, ProjectStage.id==project_stage_id).first()
+    if ps:
+        ps.checklist.sort(key=lambda c: c.id)
+        ps.deliverables.sort(key=lambda d: d.id)
+    return ps
+
+def get_deliverable(db: Session, org_id: int, deliverable_id: int) -> ProjectDeliverable | None:
+    return db.query(ProjectDeliverable).join(ProjectStage, ProjectDeliverable.project_stage_id==ProjectStage.id)\
+        .join(Project, ProjectStage.project_id==Project.id).options(joinedload(ProjectDeliverable.deliverable), joinedload(ProjectDeliverable.project_stage))\
+        .filter(Project.org_id==org_id, ProjectDeliverable.id==deliverable_id).first()
+
+def stage_approvals(db: Session, project_stage_id: int) -> list[Approval]:
+    return db.query(Approval).filter(Approval.project_stage_id==project_stage_id).order_by(Approval.at.desc()).all()
+
+def activity_feed(db: Session, page: PageRequest, project_id: int | None = None, user_id: int | None = None) -> Page:
+    q = db.query(Activity)
+    q = q.filter(Activity.project_id==project_id) if project_id is not None else q.filter(Activity.user_id==user_id)
+    return keyset_page(q, Activity, page)
+
+def names(db: Session, model, ids) -> dict[int, str]:
+    """id -> name for the given User/Project ids (one query; none if `ids` is empty)."""
+    ids = {i for i in ids if i is not None}
+    return dict(db.query(model.id, model.name).filter(model.id.in_(ids)).all()) if ids else {}
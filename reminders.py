@@ -0,0 +1,317 @@
+"""Due-date reminders for open tasks.
+
+Each due date gets two reminders: "due_soon" `reminder_lead_hours` before it
+and "overdue" once it passes. `scheduler` keeps them in a min-heap ordered by
+send time and sleeps until the earliest, so nothing polls the tasks table. The
+heap holds only the tasks due before its horizon (lead + `reminder_window_hours`
+ahead): it is built at startup, and topped up as the horizon nears, with range
+reads on the (status, due_date) index. Handlers that create a task or change its
+status or due date call `track(db, task)`; the change reaches the heap when the
+session commits.
+
+Every worker runs a scheduler. A reminder is claimed before it is sent, by one
+UPDATE that records it in `tasks.reminder_state` and re-checks the task's status
+and due date, so it goes out once across workers and restarts, and one made
+stale by a change on another worker is dropped. The claim commits before the
+notifier runs; if it raises, the claim is released and the batch is retried. A
+worker that dies between the two loses that batch rather than sending it twice.
+"""
+import heapq
+import importlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Protocol
+from sqlalchemy import event, select, update, func
+from sqlalchemy.orm import Session
+from .config import settings
+from .db import SessionLocal
+from .models import Task
+
+log = logging.getLogger("bdos.reminders")
+
+OPEN_STATUSES = ("todo", "doing")
+LEVELS = {"due_soon": 1, "overdue": 2}  # Task.reminder_state once sent
+CLAIM_CHUNK = 500
+RETRY_SECONDS = 60.0
+MAX_SLEEP_SECONDS = 3600.0
+
+@dataclass(frozen=True)
+class Reminder:
+    kind: str
+    task_id: int
+    project_id: int
+    owner_user_id: int | None
+    title: str
+    due_date: datetime
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "due_date": self.due_date.isoformat()}
+
+# ---- notifiers
+
+class Notifier(Protocol):
+    def send(self, reminders: list[Reminder]) -> None:
+        """Deliver a batch; raise to have it retried."""
+
+class FileOutbox:
+    """Appends one JSON line per reminder to `path`, for a mailer or chat relay to pick up."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, reminders: list[Reminder]):
+        sent_at = datetime.utcnow().isoformat()
+        lines = "".join(json.dumps({**r.as_dict(), "sent_at": sent_at}) + "\n" for r in reminders)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+class LogNotifier:
+    def send(self, reminders: list[Reminder]):
+        for r in reminders:
+            log.info("%s: task %d %r (project %d) due %s", r.kind, r.task_id, r.title, r.project_id, r.due_date.isoformat())
+
+NOTIFIERS = {"outbox": lambda: FileOutbox(settings.reminder_outbox_path), "log": LogNotifier}
+
+def load_notifier(name: str) -> Notifier:
+    """A NOTIFIERS name, or "module:factory" for a callable returning a Notifier."""
+    if name in NOTIFIERS:
+        return NOTIFIERS[name]()
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+# ---- task writes
+
+def track(db: Session, task: Task):
+    """Queue `task`'s due date (None once it is done) for the scheduler; applied when
+    `db` commits. The task needs its id, so flush new ones first."""
+    db.info.setdefault("reminders", {})[task.id] = task.due_date if task.status in OPEN_STATUSES else None
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    changes = session.info.pop("reminders", None)
+    if changes:
+        scheduler.update(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("reminders", None)
+
+# ---- scheduler
+
+class Scheduler:
+    """Min-heap of (send at, task id, kind, due date) for the open tasks due before `horizon`.
+
+    `_due` maps each tracked task to its current due date. Entries whose due date no
+    longer matches are stale and skipped when they come up, so an update costs a
+    dict write and at most two pushes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: list[tuple[datetime, int, str, datetime]] = []
+        self._due: dict[int, datetime] = {}
+        self.horizon: datetime | None = None  # None while stopped: updates are ignored
+        self.notifier: Notifier | None = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.sent = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def tracked(self) -> int:
+        return len(self._due)
+
+    @staticmethod
+    def _lead() -> timedelta:
+        return timedelta(hours=settings.reminder_lead_hours)
+
+    def _until(self, now: datetime) -> datetime:
+        return now + self._lead() + timedelta(hours=settings.reminder_window_hours)
+
+    @staticmethod
+    def _push(entries: list, task_id: int, due: datetime, lead: timedelta, state: int | None = 0):
+        if (state or 0) < LEVELS["due_soon"]:
+            entries.append((due - lead, task_id, "due_soon", due))
+        if (state or 0) < LEVELS["overdue"]:
+            entries.append((due, task_id, "overdue", due))
+
+    def _load(self, db: Session, after: datetime, until: datetime) -> int:
+        """Track the open tasks due in (after, until] with reminders left to send, a range
+        read on ix_tasks_status_due. The horizon already covers the range, so commits made
+        meanwhile are tracked by update() and win over what the read returns."""
+        rows = db.execute(select(Task.id, Task.due_date, Task.reminder_state)
+                          .where(Task.status.in_(OPEN_STATUSES), Task.due_date > after, Task.due_date <= until,
+                                 func.coalesce(Task.reminder_state, 0) < LEVELS["overdue"])).all()
+        lead, tracked, entries = self._lead(), self._due, []
+        with self._lock:
+            for task_id, due, state in rows:
+                if task_id not in tracked:
+                    tracked[task_id] = due
+                    self._push(entries, task_id, due, lead, state)
+            if self._heap:
+                for entry in entries:
+                    heapq.heappush(self._heap, entry)
+            else:
+                self._heap = entries
+                heapq.heapify(self._heap)
+        return len(rows)
+
+    def rebuild(self, db: Session) -> int:
+        """Reload from the database the open tasks due between `reminder_catchup_hours`
+        ago and the horizon; returns how many. Reminders already due go out on the next tick."""
+        now = datetime.utcnow()
+        with self._lock:
+            self._heap, self._due = [], {}
+            self.horizon = until = self._until(now)
+        return self._load(db, now - timedelta(hours=settings.reminder_catchup_hours), until)
+
+    def refill(self, db: Session) -> int:
+        """Move the horizon on by what has elapsed, tracking the tasks it takes in."""
+        with self._lock:
+            after, self.horizon = self.horizon, self._until(datetime.utcnow())
+            until = self.horizon
+        return self._load(db, after, until)
+
+    def update(self, changes: dict[int, datetime | None]):
+        """Apply committed task writes: task id -> due date, or None if it no longer needs reminders."""
+        with self._lock:
+            if self.horizon is None:
+                return
+            earliest = self._heap[0][0] if self._heap else None
+            entries = []
+            for task_id, due in changes.items():
+                if due is None or due > self.horizon:
+                    self._due.pop(task_id, None)
+                elif self._due.get(task_id) != due:
+                    self._due[task_id] = due
+                    self._push(entries, task_id, due, self._lead())
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            sooner = bool(self._heap) and (earliest is None or self._heap[0][0] < earliest)
+        if sooner:
+            self._wake.set()
+
+    def fire(self, now: datetime | None = None) -> int:
+        """Send the reminders whose time has come; returns how many went out."""
+        now = now or datetime.utcnow()
+        ready: dict[str, list] = {kind: [] for kind in LEVELS}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                _, task_id, kind, due = entry
+                if self._due.get(task_id) != due:
+                    continue
+                if kind == "overdue":
+                    del self._due[task_id]
+                elif due <= now:
+                    continue  # its overdue entry is ready too; send only that
+                ready[kind].append(entry)
+        sent = 0
+        for kind, entries in ready.items():
+            for i in range(0, len(entries), CLAIM_CHUNK):
+                chunk = entries[i:i + CLAIM_CHUNK]
+                try:
+                    sent += self._send(kind, [task_id for _, task_id, _, _ in chunk], now)
+                except Exception:
+                    log.exception("sending %d %s reminders failed; retrying in %.0f s", len(chunk), kind, RETRY_SECONDS)
+                    self.failed += len(chunk)
+                    self._retry(chunk, now + timedelta(seconds=RETRY_SECONDS))
+        self.sent += sent
+        return sent
+
+    def _send(self, kind: str, task_ids: list[int], now: datetime) -> int:
+        """Claim the tasks still open and due (soon) at `now` whose `kind` reminder hasn't
+        gone out, then send those. The claim commits first, so the notifier runs outside any
+        transaction (on SQLite a slow one would otherwise hold the write lock); if it raises,
+        the claim is released."""
+        level = LEVELS[kind]
+        window = (Task.due_date > now, Task.due_date <= now + self._lead()) if kind == "due_soon" else (Task.due_date <= now,)
+        # `status || ''` keeps SQLite from picking ix_tasks_status_due over the primary key,
+        # which would walk every overdue task for each chunk.
+        with SessionLocal() as db:
+            claimed = db.execute(update(Task)
+                                 .where(Task.id.in_(task_ids), (Task.status + "").in_(OPEN_STATUSES), *window,
+                                        func.coalesce(Task.reminder_state, 0) < level)
+                                 .values(reminder_state=level, updated_at=Task.updated_at)  # not an edit: keep exports' `since` quiet
+                                 .returning(Task.id, Task.project_id, Task.owner_user_id, Task.title, Task.due_date)
+                                 .execution_options(synchronize_session=False)).all()
+            db.commit()
+        if not claimed:
+            return 0
+        try:
+            self.notifier.send([Reminder(kind, *row) for row in claimed])
+        except Exception:
+            self._release(level, [row[0] for row in claimed])
+            raise
+        return len(claimed)
+
+    @staticmethod
+    def _release(level: int, task_ids: list[int]):
+        """Undo a claim whose send failed, unless the task changed since (a new due date resets it).
+        An overdue claim falls back to 1, not to whatever it was: the due-soon reminder is moot."""
+        with SessionLocal() as db:
+            db.execute(update(Task).where(Task.id.in_(task_ids), Task.reminder_state == level)
+                       .values(reminder_state=level - 1, updated_at=Task.updated_at)
+                       .execution_options(synchronize_session=False))
+            db.commit()
+
+    def _retry(self, entries: list, at: datetime):
+        with self._lock:
+            for _, task_id, kind, due in entries:
+                if kind == "overdue":
+                    self._due.setdefault(task_id, due)
+                if self._due.get(task_id) == due:
+                    heapq.heappush(self._heap, (at, task_id, kind, due))
+
+    def _sleep_seconds(self) -> float:
+        now = datetime.utcnow()
+        with self._lock:
+            # Refill once half the window has gone by.
+            wake = self.horizon - self._lead() - timedelta(hours=settings.reminder_window_hours / 2)
+            if self._heap:
+                wake = min(wake, self._heap[0][0])
+        return min(max((wake - now).total_seconds(), 0.0), MAX_SLEEP_SECONDS)
+
+    def start(self):
+        """Build the heap (blocking, so startup reports its cost) and start sending."""
+        if self._thread is None and settings.reminders_enabled:
+            self.notifier = self.notifier or load_notifier(settings.reminder_notifier)
+            with SessionLocal() as db:
+                loaded = self.rebuild(db)
+            log.info("reminders: tracking %d open tasks due by %s", loaded, self.horizon.isoformat(timespec="minutes"))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        with self._lock:
+            self._heap, self._due, self.horizon = [], {}, None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if datetime.utcnow() >= self.horizon - self._lead() - timedelta(hours=settings.reminder_window_hours / 2):
+                    with SessionLocal() as db:
+                        self.refill(db)
+                self.fire()
+                timeout = self._sleep_seconds()
+            except Exception:
+                log.exception("reminder tick failed")
+                timeout = RETRY_SECONDS
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+scheduler = Scheduler()
@@ -0,0 +1,205 @@
+"""Append-only, compressed deliverable history.
+
+Every save appends a DeliverableRevision: either a keyframe (the full text) or a
+line delta against the previous revision, compressed with zlib or, when the
+`zstandard` package is installed and `revision_codec = "zstd"`, with zstd. A
+keyframe is written every `revision_keyframe_interval` revisions and whenever
+most of the text changed, so any revision decodes from at most that many
+rows, fetched with one query. ProjectDeliverable keeps only the head's id, size
+and a preview; the text is loaded on demand.
+"""
+import difflib
+import json
+import logging
+import re
+import zlib
+from itertools import groupby
+from typing import Iterator
+from sqlalchemy import bindparam, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, aliased
+from .config import settings
+from .models import ProjectDeliverable, DeliverableRevision
+from . import search
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+log = logging.getLogger("bdos.revisions")
+
+PREVIEW_CHARS = 280
+
+# ---- encoding
+
+def _codec() -> str:
+    if settings.revision_codec == "zstd" and zstandard is None:
+        log.warning("revision_codec is zstd but zstandard isn't installed; using zlib")
+        return "zlib"
+    return settings.revision_codec
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("this revision is zstd-compressed; pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _delta(old: str, new: str) -> bytes:
+    """JSON list of [start, end] (copy those lines of `old`) and strings (inserted text)."""
+    a, b = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return json.dumps(ops, separators=(",", ":")).encode()
+
+def _patch(old: list[str], delta: bytes) -> list[str]:
+    lines = []
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            lines += old[op[0]:op[1]]
+        else:
+            lines += op.splitlines(keepends=True)
+    return lines
+
+def _decode(chain) -> str:
+    """Text of the last row of a chain (keyframe first) of (encoding, codec, data) rows."""
+    # Deltas apply to line lists; the text is joined once at the end.
+    lines = []
+    for encoding, codec, data in chain:
+        raw = _decompress(codec, data)
+        lines = raw.decode().splitlines(keepends=True) if encoding == "full" else _patch(lines, raw)
+    return "".join(lines)
+
+def preview(content: str) -> str:
+    flat = re.sub(r"\s+", " ", content).strip()
+    return flat if len(flat) <= PREVIEW_CHARS else flat[:PREVIEW_CHARS - 1] + "…"
+
+# ---- reading
+
+def _chain_query(deliverable_id: int, number: int):
+    target = aliased(DeliverableRevision)
+    keyframe = select(target.keyframe).where(target.deliverable_id==deliverable_id, target.number==number).scalar_subquery()
+    return (select(DeliverableRevision.encoding, DeliverableRevision.codec, DeliverableRevision.data)
+            .where(DeliverableRevision.deliverable_id==deliverable_id,
+                   DeliverableRevision.number.between(keyframe, number))
+            .order_by(DeliverableRevision.number))
+
+def load(db: Session, deliverable_id: int, number: int) -> str | None:
+    """Text of revision `number`, or None if there is no such revision."""
+    chain = db.execute(_chain_query(deliverable_id, number)).all()
+    return _decode(chain) if chain else None
+
+def history(db: Session, deliverable_id: int):
+    """Newest first: number, encoding, codec, size, stored (compressed bytes), created_at, created_by."""
+    r = DeliverableRevision
+    return db.execute(select(r.number, r.encoding, r.codec, r.size, func.length(r.data).label("stored"), r.created_at, r.created_by)
+                      .where(r.deliverable_id==deliverable_id).order_by(r.number.desc())).all()
+
+def diff(db: Session, deliverable_id: int, a: int, b: int) -> str | None:
+    """Unified diff from revision `a` to revision `b` (0 is the empty document)."""
+    old = load(db, deliverable_id, a) if a else ""
+    new = load(db, deliverable_id, b) if b else ""
+    if old is None or new is None:
+        return None
+    return "".join(difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True), f"v{a}", f"v{b}"))
+
+def head_texts(conn: Connection) -> Iterator[tuple[int, str]]:
+    """(deliverable id, head text) for every deliverable with content, decoded from one streamed query."""
+    head = aliased(DeliverableRevision)
+    rows = conn.execution_options(yield_per=1000).execute(
+        select(DeliverableRevision.deliverable_id, DeliverableRevision.encoding, DeliverableRevision.codec, DeliverableRevision.data)
+        .join(ProjectDeliverable, ProjectDeliverable.id==DeliverableRevision.deliverable_id)
+        .join(head, head.id==ProjectDeliverable.head_revision_id)
+        .where(DeliverableRevision.number.between(head.keyframe, head.number))
+        .order_by(DeliverableRevision.deliverable_id, DeliverableRevision.number))
+    for deliverable_id, chain in groupby(rows, key=lambda r: r[0]):
+        yield deliverable_id, _decode(r[1:] for r in chain)
+
+# ---- writing
+
+def save(db: Session, d: ProjectDeliverable, content: str, user_id: int | None) -> DeliverableRevision | None:
+    """Append a revision and point `d` at it. Returns None (and writes nothing) if the text is unchanged."""
+    if not content and not d.head_revision_id:
+        return None
+    data = content.encode()
+    codec = _codec()
+    number, keyframe, encoding, stored = 1, 1, "full", None
+    if d.head_revision_id:
+        head = db.get(DeliverableRevision, d.head_revision_id)
+        old = load(db, d.id, head.number)
+        if old == content:
+            return None
+        number = head.number + 1
+        keyframe = number
+        if number - head.keyframe < settings.revision_keyframe_interval:
+            delta = _compress(codec, _delta(old, content))
+            # A delta over half the document's size means most of it was rewritten: start a new chain.
+            if len(delta) < len(data) // 2:
+                stored, keyframe, encoding = delta, head.keyframe, "delta"
+    if stored is None:
+        stored = _compress(codec, data)
+    rev = DeliverableRevision(deliverable_id=d.id, number=number, keyframe=keyframe, encoding=encoding, codec=codec,
+                              data=stored, size=len(data), created_by=user_id)
+    db.add(rev)
+    db.flush()
+    d.head_revision_id = rev.id
+    d.version = number
+    d.content_size = len(data)
+    d.preview = preview(content) or None
+    db.flush()
+    search.set_body(db, "deliverable", d.id, content)
+    return rev
+
+def first_revisions(db: Session, contents: dict[int, str], user_id: int | None):
+    """Bulk `save` for deliverables that have no revision yet: one INSERT for the keyframes,
+    one executemany UPDATE for the rows."""
+    if not contents:
+        return
+    codec = _codec()
+    encoded = {did: content.encode() for did, content in contents.items()}
+    heads = db.execute(insert(DeliverableRevision).returning(DeliverableRevision.id, DeliverableRevision.deliverable_id),
+                       [{"deliverable_id": did, "number": 1, "keyframe": 1, "encoding": "full", "codec": codec,
+                         "data": _compress(codec, data), "size": len(data), "created_by": user_id} for did, data in encoded.items()])
+    db.execute(update(ProjectDeliverable), [{"id": did, "head_revision_id": rid, "version": 1, "content_size": len(encoded[did]),
+                                             "preview": preview(contents[did]) or None} for rid, did in heads])
+    for did, content in contents.items():
+        search.set_body(db, "deliverable", did, content)
+
+def migrate_inline_content(engine, batch: int = 500):
+    """Move text saved in the old inline project_deliverables.content column into revision 1.
+    Completion is recorded in app_meta, so later boots cost one lookup."""
+    from .db import SessionLocal, startup_lock, meta_get, meta_set
+    with engine.connect() as conn:
+        if meta_get(conn, "inline_content") == "migrated":
+            return
+        if "content" not in {c["name"] for c in inspect(conn).get_columns("project_deliverables")}:
+            return
+    moved = 0
+    with SessionLocal() as db:
+        while True:
+            startup_lock(db.connection())
+            rows = db.execute(text("SELECT id, content FROM project_deliverables WHERE content IS NOT NULL LIMIT :n"), {"n": batch}).all()
+            if not rows:
+                meta_set(db, "inline_content", "migrated")
+                db.commit()
+                break
+            for did, content in rows:
+                d = db.get(ProjectDeliverable, did)
+                if content and not d.head_revision_id:
+                    save(db, d, content, None)
+                    moved += 1
+            db.execute(text("UPDATE project_deliverables SET content = NULL WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                       {"ids": [did for did, _ in rows]})
+            db.commit()
+    if moved:
+        log.info("moved %d inline deliverables into revisions", moved)
@@ -0,0 +1,196 @@
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import select, update, delete, insert, func, case, or_
+from sqlalchemy.orm import Session
+from .config import settings
+from .db import SessionLocal, writable_session
+from .sqlstats import budget_exempt
+from .models import Project, ProjectStage, Task, Opportunity, ProjectRollup, OrgRollup
+
+log = logging.getLogger("bdos.rollups")
+
+CLOSED_OPP_STAGES = ("won", "lost")
+RECONCILE_BATCH = 500
+
+# ---- incremental updates (called by the mutation handlers, inside their transaction)
+
+def on_projects_created(db: Session, org_id: int, project_ids: list[int], stages_total: int):
+    if project_ids:
+        db.execute(insert(ProjectRollup), [{"project_id": pid, "org_id": org_id, "stages_total": stages_total} for pid in project_ids])
+
+def on_stage_status(db: Session, org_id: int, project_id: int, old: str, new: str):
+    delta = (new == "done") - (old == "done")
+    if delta:
+        _apply(db, org_id, project_id, stages_done=delta)
+    else:
+        touch_org(db, org_id)
+
+def touch_org(db: Session, org_id: int):
+    """Bump the org's data version for changes that don't move any counter."""
+    db.execute(update(OrgRollup).where(OrgRollup.org_id==org_id).values(version=OrgRollup.version + 1))
+
+def on_task_added(db: Session, org_id: int, project_id: int, task: Task):
+    if task.status != "done":
+        _apply(db, org_id, project_id, open_tasks=1, due=task.due_date)
+
+def on_task_status(db: Session, org_id: int, project_id: int, task: Task, old: str):
+    delta = (old == "done") - (task.status == "done")
+    if delta > 0:
+        _apply(db, org_id, project_id, open_tasks=1, due=task.due_date)
+    elif delta < 0:
+        overdue = task.due_date is not None and task.due_date < datetime.utcnow()
+        _apply(db, org_id, project_id, open_tasks=-1, overdue_tasks=-1 if overdue else 0)
+
+def on_task_due(db: Session, org_id: int, project_id: int, task: Task, old_due: datetime | None):
+    # The old due date leaves like a closed task's and the new one arrives like an opened
+    # one's; a next_due_at left too early just triggers a refresh once it passes.
+    if task.status != "done" and task.due_date != old_due:
+        overdue = old_due is not None and old_due < datetime.utcnow()
+        _apply(db, org_id, project_id, overdue_tasks=-1 if overdue else 0, due=task.due_date)
+
+def on_opportunity_added(db: Session, org_id: int, project_id: int, opp: Opportunity):
+    if opp.value_estimate and opp.stage not in CLOSED_OPP_STAGES:
+        _apply(db, org_id, project_id, open_opp_value=opp.value_estimate)
+    else:
+        touch_org(db, org_id)  # still counts in /reports
+
+def _apply(db: Session, org_id: int, project_id: int, due: datetime | None = None, **deltas: int):
+    """Add `deltas` to both rollups; `due` is the due date of a task that just became open."""
+    now = datetime.utcnow()
+    db.flush()
+    refreshed = False
+    for model, key_col, key, refresh in ((ProjectRollup, ProjectRollup.project_id, project_id, lambda: refresh_projects(db, [project_id])),
+                                         (OrgRollup, OrgRollup.org_id, org_id, lambda: refresh_org(db, org_id))):
+        row = db.execute(select(model.next_due_at).where(key_col==key)).first()
+        # Missing, or a due date has passed since the last refresh (so overdue
+        # counts are stale): recompute from the source rows, which already
+        # include this change. A recomputed project also invalidates its org.
+        if refreshed or _is_stale(row, now):
+            refresh()
+            refreshed = True
+            continue
+        values = {k: getattr(model, k) + v for k, v in deltas.items() if v}
+        if due is not None and due > now:
+            values["next_due_at"] = case((or_(model.next_due_at == None, model.next_due_at > due), due), else_=model.next_due_at)
+        elif due is not None:
+            values["overdue_tasks"] = model.overdue_tasks + deltas.get("overdue_tasks", 0) + 1
+        if model is OrgRollup:
+            values["version"] = model.version + 1
+        if values:
+            db.execute(update(model).where(key_col==key).values(**values))
+
+# ---- recomputation
+
+def refresh_projects(db: Session, project_ids: list[int]):
+    """Recompute project rollups from the source tables with grouped queries."""
+    if not project_ids:
+        return
+    now = datetime.utcnow()
+    open_task = Task.status != "done"
+    rows = {pid: {"project_id": pid, "org_id": org_id, "stages_total": 0, "stages_done": 0, "open_tasks": 0, "overdue_tasks": 0,
+                  "open_opp_value": 0, "next_due_at": None, "refreshed_at": now}
+            for pid, org_id in db.query(Project.id, Project.org_id).filter(Project.id.in_(project_ids))}
+    for pid, total, done in db.query(ProjectStage.project_id, func.count(), func.sum(case((ProjectStage.status=="done", 1), else_=0)))\
+            .filter(ProjectStage.project_id.in_(list(rows))).group_by(ProjectStage.project_id):
+        rows[pid].update(stages_total=total, stages_done=done or 0)
+    for pid, opened, overdue, next_due in db.query(Task.project_id, func.count(), func.sum(case((Task.due_date < now, 1), else_=0)),
+                                                  func.min(case((Task.due_date >= now, Task.due_date))))\
+            .filter(Task.project_id.in_(list(rows)), open_task).group_by(Task.project_id):
+        rows[pid].update(open_tasks=opened, overdue_tasks=overdue or 0, next_due_at=next_due)
+    for pid, value in db.query(Opportunity.project_id, func.sum(Opportunity.value_estimate))\
+            .filter(Opportunity.project_id.in_(list(rows)), Opportunity.stage.notin_(CLOSED_OPP_STAGES)).group_by(Opportunity.project_id):
+        rows[pid]["open_opp_value"] = value or 0
+    db.execute(delete(ProjectRollup).where(ProjectRollup.project_id.in_(project_ids)))
+    if rows:
+        db.execute(insert(ProjectRollup), list(rows.values()))
+
+def refresh_org(db: Session, org_id: int):
+    """Refresh an org's stale project rollups, then re-derive the org rollup from them."""
+    now = datetime.utcnow()
+    stale = [pid for pid, in db.query(Project.id).outerjoin(ProjectRollup, ProjectRollup.project_id==Project.id)
+             .filter(Project.org_id==org_id, or_(ProjectRollup.project_id == None, ProjectRollup.next_due_at <= now))]
+    for i in range(0, len(stale), RECONCILE_BATCH):
+        refresh_projects(db, stale[i:i + RECONCILE_BATCH])
+    db.flush()
+    agg = db.query(func.sum(ProjectRollup.stages_done), func.sum(ProjectRollup.open_tasks), func.sum(ProjectRollup.overdue_tasks),
+                   func.sum(ProjectRollup.open_opp_value), func.min(ProjectRollup.next_due_at)).filter(ProjectRollup.org_id==org_id).one()
+    version = db.execute(select(OrgRollup.version).where(OrgRollup.org_id==org_id)).scalar() or 0
+    db.execute(delete(OrgRollup).where(OrgRollup.org_id==org_id))
+    db.execute(insert(OrgRollup).values(org_id=org_id, stages_done=agg[0] or 0, open_tasks=agg[1] or 0, overdue_tasks=agg[2] or 0,
+                                        open_opp_value=agg[3] or 0, next_due_at=agg[4], version=version + 1, refreshed_at=now))
+
+def reconcile_all(db: Session):
+    """Recompute every rollup in batches, committing per batch. Fixes any drift."""
+    last_id = 0
+    while True:
+        ids = [pid for pid, in db.query(Project.id).filter(Project.id > last_id).order_by(Project.id).limit(RECONCILE_BATCH)]
+        if not ids:
+            break
+        refresh_projects(db, ids)
+        db.commit()
+        last_id = ids[-1]
+    org_ids = {oid for oid, in db.query(Project.org_id).distinct()} | {oid for oid, in db.query(OrgRollup.org_id)}
+    for org_id in org_ids:
+        refresh_org(db, org_id)
+        db.commit()
+
+# ---- reads
+
+def _is_stale(row, now: datetime) -> bool:
+    return row is None or (row.next_due_at is not None and row.next_due_at <= now)
+
+# Stale rows are refreshed in a separate session (on the same engine, so this
+# also works inside ReadSession.run on the async engine, unless that is
+# read-only) so committing the refresh doesn't expire objects the request has
+# already loaded.
+
+def org_summary(db: Session, org_id: int) -> OrgRollup:
+    row = db.get(OrgRollup, org_id)
+    if _is_stale(row, datetime.utcnow()):
+        with budget_exempt(), writable_session(db) as rdb:
+            refresh_org(rdb, org_id)
+            rdb.commit()
+            row = db.get(OrgRollup, org_id, populate_existing=True)
+    return row
+
+def project_summary(db: Session, project: Project) -> ProjectRollup:
+    """The project's rollup (eager-load Project.rollup to make this free)."""
+    row = project.rollup
+    if _is_stale(row, datetime.utcnow()):
+        with budget_exempt(), writable_session(db) as rdb:
+            refresh_projects(rdb, [project.id])
+            rdb.commit()
+            row = db.get(ProjectRollup, project.id, populate_existing=True)
+    return row
+
+# ---- periodic reconciler
+
+class Reconciler:
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rollup-reconciler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    reconcile_all(db)
+            except Exception:
+                log.exception("rollup reconcile failed")
+            self._stop.wait(self.interval)
+
+reconciler = Reconciler(settings.rollup_reconcile_seconds)
@@ -0,0 +1,215 @@
+"""Org-scoped full-text search over accounts, contacts, tasks, deliverables and opportunities.
+
+On SQLite the documents live in an FTS5 table kept current by triggers on the
+source tables, so every write path (ORM, bulk core inserts, imports, deletes)
+updates the index in the same transaction. Deliverable text lives compressed in
+deliverable_revisions, so `revisions.save` writes it with `set_body`. Other
+databases fall back to an unranked LIKE scan (over deliverable previews).
+
+CLI: python -m app.search rebuild
+     python -m app.search query --org ORG_ID "text" [--kind task]
+"""
+import argparse
+import re
+import time
+from dataclasses import dataclass
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from .db import startup_lock
+
+INDEX = "search_index"
+MAX_TERMS = 8
+
+@dataclass(frozen=True)
+class DocSpec:
+    code: int          # rowid = source id * 8 + code, so a document is found by rowid alone
+    table: str
+    joins: str         # FROM clause; the source row is aliased `s`
+    org: str           # SQL expressions over the joined rows
+    title: str
+    body: str
+    url: str
+    watched: tuple[str, ...]  # columns whose update re-indexes the row
+
+DOCS = {
+    "account": DocSpec(1, "accounts", "accounts s", "s.org_id", "s.name", "coalesce(s.industry, '')",
+                       "'/accounts/' || s.id", ("name", "industry")),
+    "contact": DocSpec(2, "contacts", "contacts s JOIN accounts a ON a.id = s.account_id", "a.org_id", "s.name",
+                       "coalesce(s.title, '') || ' ' || coalesce(s.email, '') || ' ' || coalesce(s.phone, '')",
+                       "'/accounts/' || s.account_id", ("account_id", "name", "title", "email", "phone")),
+    "task": DocSpec(3, "tasks", "tasks s JOIN projects p ON p.id = s.project_id", "p.org_id", "s.title", "''",
+                    "'/projects/' || s.project_id || '/tasks'", ("title",)),
+    "deliverable": DocSpec(4, "project_deliverables", "project_deliverables s JOIN project_stages ps ON ps.id = s.project_stage_id "
+                           "JOIN projects p ON p.id = ps.project_id JOIN stage_deliverables d ON d.id = s.deliverable_id",
+                           "p.org_id", "d.name", "coalesce(s.preview, '')",
+                           "'/projects/' || ps.project_id || '/stage/' || s.project_stage_id", ("head_revision_id",)),
+    "opportunity": DocSpec(5, "opportunities", "opportunities s JOIN projects p ON p.id = s.project_id", "p.org_id", "s.title",
+                           "coalesce(s.notes, '')", "'/projects/' || s.project_id || '/opportunities'", ("title", "notes")),
+}
+
+# ---- index DDL (SQLite)
+
+def _select(kind: str, spec: DocSpec) -> str:
+    # The org is stored as a token ("o12") in its own column so org scoping is
+    # part of the FTS match instead of a filter over every matching document.
+    return (f"SELECT s.id * 8 + {spec.code}, 'o' || {spec.org}, {spec.title}, {spec.body}, '{kind}', s.id, {spec.url} "
+            f"FROM {spec.joins}")
+
+_COLUMNS = "rowid, org, title, body, kind, ref_id, url"
+
+def _ddl() -> list[str]:
+    statements = [f"CREATE VIRTUAL TABLE {INDEX} USING fts5(org, title, body, kind UNINDEXED, ref_id UNINDEXED, url UNINDEXED, "
+                  f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+                  # org column weight 0: it scopes, it doesn't rank.
+                  f"INSERT INTO {INDEX}({INDEX}, rank) VALUES ('rank', 'bm25(0.0, 10.0, 1.0)')"]
+    for kind, spec in DOCS.items():
+        insert = f"INSERT INTO {INDEX}({_COLUMNS}) {_select(kind, spec)} WHERE s.id = NEW.id;"
+        delete = f"DELETE FROM {INDEX} WHERE rowid = OLD.id * 8 + {spec.code};"
+        statements += [f"CREATE TRIGGER {INDEX}_{kind}_ai AFTER INSERT ON {spec.table} BEGIN {insert} END",
+                       f"CREATE TRIGGER {INDEX}_{kind}_au AFTER UPDATE OF {', '.join(spec.watched)} ON {spec.table} BEGIN {delete} {insert} END",
+                       f"CREATE TRIGGER {INDEX}_{kind}_ad AFTER DELETE ON {spec.table} BEGIN {delete} END"]
+    return statements
+
+def ensure_index(engine: Engine) -> bool:
+    """Create the index and its triggers if missing, or replace triggers whose definition
+    changed, then fill it. Returns True if it was (re)built."""
+    if engine.dialect.name != "sqlite":
+        return False
+    statements = _ddl()
+    wanted = sorted(s for s in statements if s.startswith("CREATE TRIGGER"))
+    with engine.connect() as conn:
+        if inspect(conn).has_table(INDEX) and sorted(_triggers(conn).values()) == wanted:
+            return False
+    with engine.begin() as conn:
+        startup_lock(conn)
+        if inspect(conn).has_table(INDEX):
+            triggers = _triggers(conn)
+            if sorted(triggers.values()) == wanted:  # another worker got here first
+                return False
+            for name in triggers:
+                conn.execute(text(f"DROP TRIGGER {name}"))
+            statements = wanted
+        for statement in statements:
+            conn.execute(text(statement))
+        rebuild(conn)
+    return True
+
+def _triggers(conn: Connection) -> dict[str, str]:
+    rows = conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN :tables")
+                        .bindparams(bindparam("tables", expanding=True)), {"tables": [s.table for s in DOCS.values()]})
+    return {name: sql for name, sql in rows if name.startswith(f"{INDEX}_")}
+
+def rebuild(conn: Connection):
+    """Re-derive every document from the source tables (one INSERT ... SELECT per kind)."""
+    from .revisions import head_texts
+    conn.execute(text(f"DELETE FROM {INDEX}"))
+    for kind, spec in DOCS.items():
+        conn.execute(text(f"INSERT INTO {INDEX}({_COLUMNS}) {_select(kind, spec)}"))
+    # Deliverable text is compressed in deliverable_revisions, out of SQL's reach.
+    for ref_id, body in head_texts(conn):
+        _set_body(conn, "deliverable", ref_id, body)
+    conn.execute(text(f"INSERT INTO {INDEX}({INDEX}) VALUES ('optimize')"))
+
+def _set_body(conn, kind: str, ref_id: int, body: str):
+    conn.execute(text(f"UPDATE {INDEX} SET body = :body WHERE rowid = :rowid"), {"body": body, "rowid": ref_id * 8 + DOCS[kind].code})
+
+def set_body(db: Session, kind: str, ref_id: int, body: str):
+    """Index text that isn't in a SQL column. Call after the flush that (re)indexed the row."""
+    if db.get_bind().dialect.name == "sqlite":
+        _set_body(db, kind, ref_id, body)
+
+# ---- queries
+
+@dataclass(frozen=True)
+class Hit:
+    kind: str
+    ref_id: int
+    url: str
+    title: Markup
+    snippet: Markup
+
+@dataclass
+class SearchPage:
+    query: str
+    hits: list[Hit]
+    offset: int
+    limit: int
+    has_more: bool
+
+def terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+def match_expression(org_id: int, words: list[str]) -> str:
+    """FTS5 query: the org token AND every word (the last one as a prefix) in title or body.
+
+    Words are quoted, so user input can never be parsed as FTS5 syntax."""
+    quoted = [f'"{w}"' for w in words]
+    quoted[-1] += "*"
+    return f'org : "o{org_id}" AND {{title body}} : ({" ".join(quoted)})'
+
+def _highlighted(value: str) -> Markup:
+    # \x02/\x03 mark matches; escape the document text, then turn them into <mark>.
+    return Markup(str(escape(value)).replace("\x02", "<mark>").replace("\x03", "</mark>"))
+
+def search(db: Session, org_id: int, q: str, kind: str | None = None, offset: int = 0, limit: int = 20) -> SearchPage:
+    """Best-ranked documents first (bm25, title matches weigh 10x body matches)."""
+    words = terms(q)
+    if not words:
+        return SearchPage(q, [], offset, limit, False)
+    if db.get_bind().dialect.name != "sqlite":
+        return _like_search(db, org_id, q, words, kind, offset, limit)
+    rows = db.execute(text(
+        f"SELECT kind, ref_id, url, highlight({INDEX}, 1, char(2), char(3)), snippet({INDEX}, 2, char(2), char(3), '…', 16) "
+        f"FROM {INDEX} WHERE {INDEX} MATCH :match" + (" AND kind = :kind" if kind else "") +
+        " ORDER BY rank LIMIT :limit OFFSET :offset"),
+        {"match": match_expression(org_id, words), "kind": kind, "limit": limit + 1, "offset": offset}).all()
+    hits = [Hit(k, ref_id, url, _highlighted(title), _highlighted(snippet)) for k, ref_id, url, title, snippet in rows[:limit]]
+    return SearchPage(q, hits, offset, limit, len(rows) > limit)
+
+def _like_search(db: Session, org_id: int, q: str, words: list[str], kind: str | None, offset: int, limit: int) -> SearchPage:
+    """Unranked fallback for databases without FTS5: every word must appear in title or body."""
+    parts, params = [], {"org_id": org_id, "limit": limit + 1, "offset": offset}
+    for i, w in enumerate(words):
+        params[f"w{i}"] = f"%{w}%"
+    for k, spec in DOCS.items():
+        if kind and k != kind:
+            continue
+        doc = f"lower({spec.title} || ' ' || {spec.body})"
+        where = " AND ".join(f"{doc} LIKE :w{i}" for i in range(len(words)))
+        parts.append(f"SELECT '{k}' AS kind, s.id AS ref_id, {spec.url} AS url, {spec.title} AS title, {spec.body} AS body "
+                     f"FROM {spec.joins} WHERE {spec.org} = :org_id AND {where}")
+    if not parts:
+        return SearchPage(q, [], offset, limit, False)
+    rows = db.execute(text(" UNION ALL ".join(parts) + " ORDER BY kind, ref_id LIMIT :limit OFFSET :offset"), params).all()
+    hits = [Hit(k, ref_id, url, escape(title), escape(body[:200])) for k, ref_id, url, title, body in rows[:limit]]
+    return SearchPage(q, hits, offset, limit, len(rows) > limit)
+
+def main(argv=None):
+    from .db import engine, SessionLocal
+    parser = argparse.ArgumentParser(prog="python -m app.search")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recreate the index from the source tables")
+    query = sub.add_parser("query")
+    query.add_argument("--org", type=int, required=True)
+    query.add_argument("--kind", choices=sorted(DOCS))
+    query.add_argument("text")
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        if engine.dialect.name != "sqlite":
+            parser.error("the search index is SQLite-only; other databases are searched directly")
+        start = time.perf_counter()
+        if not ensure_index(engine):
+            with engine.begin() as conn:
+                rebuild(conn)
+        with engine.connect() as conn:
+            count = conn.execute(text(f"SELECT count(*) FROM {INDEX}")).scalar()
+        print(f"indexed {count:,} documents in {time.perf_counter() - start:.1f} s")
+        return
+    with SessionLocal() as db:
+        for hit in search(db, args.org, args.text, args.kind).hits:
+            print(f"{hit.kind:<12} {hit.url:<40} {hit.title.striptags()}  {hit.snippet.striptags()}")
+
+if __name__ == "__main__":
+    main()
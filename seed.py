@@ -1,6 +1,9 @@
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
+from .db import fingerprint, meta_get, meta_set, startup_lock
 from .models import Org, User, Stage, StageChecklistItem, StageDeliverable
 from .auth import hash_password
+from .stages import registry
 
 STAGES = [{"code": "INTAKE", "name": "Intake & Contract", "order": 1}, {"code": "DIAG", "name": "Diagnosis & Discovery", "order": 2}, {"code": "MI", "name": "Market Intelligence", "order": 3}, {"code": "ICP", "name": "Customer & ICP", "order": 4}, {"code": "COMP", "name": "Competitor & Positioning", "order": 5}, {"code": "ECO", "name": "Ecosystem Mapping", "order": 6}, {"code": "STRAT", "name": "Strategy & Direction", "order": 7}, {"code": "BDPLAN", "name": "BD Plan & Operating Model", "order": 8}, {"code": "OFFER", "name": "Offer & Pricing", "order": 9}, {"code": "GTM", "name": "GTM & Sales Motion", "order": 10}, {"code": "OPPS", "name": "Opportunity & Partnerships Pipeline", "order": 11}, {"code": "KPIS", "name": "KPIs, Dashboard & Iteration", "order": 12}]
 CHECKLISTS = {"INTAKE": ["Scope defined", "Goals agreed", "Stakeholders identified", "Contract signed"], "DIAG": ["Interviews completed", "Data collected", "Pain points prioritized", "Root causes drafted"], "MI": ["TAM/SAM/SOM estimated", "Segments mapped", "Demand signals captured"], "ICP": ["ICP drafted", "Personas created", "Buying committee mapped"], "COMP": ["Competitor set defined", "Positioning map created", "Differentiation points validated"], "ECO": ["Partners list", "Regulators list", "Alternatives list", "Ecosystem map exported"], "STRAT": ["Strategic options listed", "Priorities set", "Targets defined"], "BDPLAN": ["BD playbook drafted", "Operating model roles", "Process cadence"], "OFFER": ["Value proposition finalized", "Packaging tiers", "Pricing logic"], "GTM": ["Acquisition channels selected", "Funnel defined", "Sales motion documented"], "OPPS": ["Opportunity list created", "Scoring model applied", "Next actions assigned"], "KPIS": ["KPI set defined", "Dashboard live", "Iteration cadence scheduled"]}
@@ -20,36 +23,53 @@ DEFAULT_DELIVERABLES = {
 "KPIS": ["KPI dashboard definition"],
 }
 
-def seed(db: Session):
-    # Org + admin user
-    org = db.query(Org).filter(Org.name=="Mohamed Marey BD OS").first()
-    if not org:
-        org = Org(name="Mohamed Marey BD OS")
-        db.add(org)
-        db.commit()
-        db.refresh(org)
-    admin = db.query(User).filter(User.email=="admin@local").first()
-    if not admin:
-        admin = User(org_id=org.id, name="Admin", email="admin@local", password_hash=hash_password("admin1234"), is_admin=True)
-        db.add(admin)
-        db.commit()
-
-    # Stages
-    for s in STAGES:
-        st = db.query(Stage).filter(Stage.code==s["code"]).first()
-        if not st:
-            st = Stage(code=s["code"], name=s["name"], order=s["order"])
-            db.add(st)
-            db.commit()
-            db.refresh(st)
-        # checklist items
-        for item_text in CHECKLISTS.get(s["code"], []):
-            existing = db.query(StageChecklistItem).filter(StageChecklistItem.stage_id==st.id, StageChecklistItem.text==item_text).first()
-            if not existing:
-                db.add(StageChecklistItem(stage_id=st.id, text=item_text, required=True))
-        # deliverables
-        for dname in DEFAULT_DELIVERABLES.get(s["code"], []):
-            exd = db.query(StageDeliverable).filter(StageDeliverable.stage_id==st.id, StageDeliverable.name==dname).first()
-            if not exd:
-                db.add(StageDeliverable(stage_id=st.id, name=dname, dtype="doc", required=True))
-        db.commit()
+ORG_NAME = "Mohamed Marey BD OS"
+ADMIN_EMAIL = "admin@local"
+
+def seed(db: Session) -> bool:
+    """Bring the org, admin user and stage templates up to date.
+
+    Keyed on a fingerprint of the definitions above: when it matches the stored one
+    this is a single query; otherwise one worker applies the missing rows while the
+    others wait on the startup lock, then find the new fingerprint."""
+    wanted = fingerprint(ORG_NAME, ADMIN_EMAIL, STAGES, CHECKLISTS, DEFAULT_DELIVERABLES)
+    if meta_get(db, "seed") == wanted:
+        return False
+    startup_lock(db.connection())
+    if meta_get(db, "seed") == wanted:
+        db.rollback()
+        return False
+    _upsert(db)
+    meta_set(db, "seed", wanted)
+    db.commit()
+    registry.invalidate()
+    return True
+
+def _upsert(db: Session):
+    """Insert whatever is missing (and rename/reorder stages) with one query per table and bulk writes."""
+    org_id = db.scalar(select(Org.id).where(Org.name==ORG_NAME))
+    if org_id is None:
+        org_id = db.execute(insert(Org).returning(Org.id), {"name": ORG_NAME}).scalar_one()
+    if db.scalar(select(User.id).where(User.email==ADMIN_EMAIL)) is None:
+        db.execute(insert(User), {"org_id": org_id, "name": "Admin", "email": ADMIN_EMAIL, "password_hash": hash_password("admin1234"), "is_admin": True})
+
+    existing = {code: (sid, name, order) for sid, code, name, order in db.execute(select(Stage.id, Stage.code, Stage.name, Stage.order))}
+    stage_ids = {code: sid for code, (sid, _, _) in existing.items()}
+    new = [s for s in STAGES if s["code"] not in existing]
+    if new:
+        stage_ids.update({code: sid for sid, code in db.execute(insert(Stage).returning(Stage.id, Stage.code), new)})
+    changed = [{"id": existing[s["code"]][0], "name": s["name"], "order": s["order"]} for s in STAGES
+               if s["code"] in existing and existing[s["code"]][1:] != (s["name"], s["order"])]
+    if changed:
+        db.execute(update(Stage), changed)
+
+    items = set(db.execute(select(StageChecklistItem.stage_id, StageChecklistItem.text)).tuples())
+    rows = [{"stage_id": stage_ids[s["code"]], "text": t, "required": True} for s in STAGES for t in CHECKLISTS.get(s["code"], [])
+            if (stage_ids[s["code"]], t) not in items]
+    if rows:
+        db.execute(insert(StageChecklistItem), rows)
+    deliverables = set(db.execute(select(StageDeliverable.stage_id, StageDeliverable.name)).tuples())
+    rows = [{"stage_id": stage_ids[s["code"]], "name": n, "dtype": "doc", "required": True} for s in STAGES for n in DEFAULT_DELIVERABLES.get(s["code"], [])
+            if (stage_ids[s["code"]], n) not in deliverables]
+    if rows:
+        db.execute(insert(StageDeliverable), rows)
@@ -0,0 +1,116 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+
+log = logging.getLogger("bdos.sql")
+slow_log = logging.getLogger("bdos.sql.slow")
+
+class RequestStats:
+    __slots__ = ("statements", "exempt", "sql_time", "render_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.exempt = 0  # statements run under budget_exempt()
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+# Set per request by the outermost stats-aware middleware. Sync handlers run in a threadpool
+# with a copy of the context, so the (mutable) stats object is shared with them.
+current_stats: ContextVar[RequestStats | None] = ContextVar("bdos_request_stats", default=None)
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+def bind_stats() -> tuple[RequestStats, object | None]:
+    """Return the current request's stats, creating them if no outer middleware did.
+
+    The second value is the contextvar token to reset, or None if not ours."""
+    stats = current_stats.get()
+    if stats is not None:
+        return stats, None
+    stats = RequestStats()
+    return stats, current_stats.set(stats)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("bdos_query_start", []).append(time.perf_counter())
+    stats = current_stats.get()
+    if stats is not None:
+        stats.statements += 1
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["bdos_query_start"].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.sql_time += elapsed
+    if settings.slow_query_ms is not None and elapsed * 1000 >= settings.slow_query_ms:
+        slow_log.warning("%.1f ms: %s | params=%r", elapsed * 1000, statement, parameters)
+
+def _handle_error(context):
+    starts = context.connection.info.get("bdos_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def install(engine: Engine):
+    for name, fn in (("before_cursor_execute", _before_cursor_execute), ("after_cursor_execute", _after_cursor_execute), ("handle_error", _handle_error)):
+        if not event.contains(engine, name, fn):
+            event.listen(engine, name, fn)
+
+@contextmanager
+def budget_exempt():
+    """Don't charge statements in this block to the route's budget (e.g. lazy cache refills)."""
+    stats = current_stats.get()
+    before = stats.statements if stats is not None else 0
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.exempt += stats.statements - before
+
+def query_budget(max_statements: int):
+    """Declare the most SQL statements a route may issue per request."""
+    def decorate(endpoint):
+        endpoint.query_budget = max_statements
+        return endpoint
+    return decorate
+
+class QueryBudgetMiddleware:
+    """Counts statements per request and checks them against the route's budget.
+
+    Over-budget requests are logged; with `settings.query_budget_strict` they
+    raise QueryBudgetExceeded instead, which fails the request (and any test
+    client call) before the response starts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats, token = bind_stats()
+
+        async def checked_send(message):
+            if message["type"] == "http.response.start":
+                self._check(scope, stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, checked_send)
+        finally:
+            if token is not None:
+                current_stats.reset(token)
+
+    @staticmethod
+    def _check(scope, stats: RequestStats):
+        budget = getattr(scope.get("endpoint"), "query_budget", None)
+        charged = stats.statements - stats.exempt
+        if budget is None or charged <= budget:
+            return
+        route = getattr(scope.get("route"), "path", scope["path"])
+        msg = f"{scope['method']} {route} issued {charged} SQL statements (budget {budget})"
+        if settings.query_budget_strict:
+            raise QueryBudgetExceeded(msg)
+        log.warning(msg)
@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from sqlalchemy import insert, update, case
+from sqlalchemy.orm import Session
+from . import rollups
+from .sqlstats import budget_exempt
+from .models import Project, Stage, StageChecklistItem, StageDeliverable, ProjectStage, ProjectChecklist, ProjectDeliverable
+
+@dataclass(frozen=True)
+class StageTemplate:
+    stage_id: int
+    code: str
+    name: str
+    order: int
+    item_ids: tuple[int, ...]
+    deliverable_ids: tuple[int, ...]
+
+class StageRegistry:
+    """In-process cache of the stage/checklist/deliverable templates.
+
+    Loaded with three queries on first use and kept until `invalidate()` is
+    called (seed() does this whenever it changes the templates)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: tuple[StageTemplate, ...] | None = None
+
+    def get(self, db: Session) -> tuple[StageTemplate, ...]:
+        templates = self._templates
+        if templates is not None:
+            return templates
+        with self._lock:
+            if self._templates is None:
+                with budget_exempt():
+                    self._templates = self._load(db)
+            return self._templates
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+    @staticmethod
+    def _load(db: Session) -> tuple[StageTemplate, ...]:
+        items: dict[int, list[int]] = {}
+        for item_id, stage_id in db.query(StageChecklistItem.id, StageChecklistItem.stage_id).order_by(StageChecklistItem.id):
+            items.setdefault(stage_id, []).append(item_id)
+        dels: dict[int, list[int]] = {}
+        for d_id, stage_id in db.query(StageDeliverable.id, StageDeliverable.stage_id).order_by(StageDeliverable.id):
+            dels.setdefault(stage_id, []).append(d_id)
+        return tuple(
+            StageTemplate(st.id, st.code, st.name, st.order, tuple(items.get(st.id, ())), tuple(dels.get(st.id, ())))
+            for st in db.query(Stage).order_by(Stage.order.asc())
+        )
+
+registry = StageRegistry()
+
+def init_project_stages(db: Session, project_ids: list[int]):
+    """Materialize stages, checklist and deliverables for already-inserted projects.
+
+    Issues one multi-row INSERT per table; the caller owns the transaction."""
+    templates = registry.get(db)
+    if not project_ids or not templates:
+        return
+    stage_rows = [{"project_id": pid, "stage_id": t.stage_id, "status": "todo"} for pid in project_ids for t in templates]
+    # No sort_by_parameter_order: each returned row carries its own stage_id, and
+    # asking for ordering makes SQLAlchemy fall back to one INSERT per row.
+    result = db.execute(insert(ProjectStage).returning(ProjectStage.id, ProjectStage.stage_id), stage_rows)
+    by_stage = {t.stage_id: t for t in templates}
+    checklist_rows, deliverable_rows = [], []
+    for ps_id, stage_id in result:
+        t = by_stage[stage_id]
+        checklist_rows.extend({"project_stage_id": ps_id, "item_id": i, "done": False} for i in t.item_ids)
+        deliverable_rows.extend({"project_stage_id": ps_id, "deliverable_id": d, "status": "draft", "version": 1} for d in t.deliverable_ids)
+    if checklist_rows:
+        db.execute(insert(ProjectChecklist), checklist_rows)
+    if deliverable_rows:
+        db.execute(insert(ProjectDeliverable), deliverable_rows)
+
+def create_projects(db: Session, org_id: int, specs: list[dict]) -> list[int]:
+    """Create many projects (each with all stages materialized) in one transaction.
+
+    `specs` are dicts with account_id, name and optional package/lead_source;
+    account ownership must already have been checked by the caller. Returns the
+    new project ids in spec order."""
+    if not specs:
+        return []
+    now = datetime.utcnow()
+    rows = [{"org_id": org_id, "account_id": s["account_id"], "name": s["name"], "package": s.get("package") or None,
+             "lead_source": s.get("lead_source") or None, "status": "active", "start_date": now, "created_at": now} for s in specs]
+    try:
+        # A multi-row INSERT hands out ascending ids in VALUES order (SQLite rowids,
+        # Postgres sequences), so sorting the returned ids restores spec order.
+        ids = sorted(pid for pid, in db.execute(insert(Project).returning(Project.id), rows))
+        init_project_stages(db, ids)
+        rollups.on_projects_created(db, org_id, ids, stages_total=len(registry.get(db)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return ids
+
+def mark_started(db: Session, project_stage_id: int):
+    """Record when work on a stage begins (first checklist tick or deliverable save)."""
+    db.execute(update(ProjectStage).where(ProjectStage.id==project_stage_id, ProjectStage.started_at==None)
+               .values(started_at=datetime.utcnow(), status=case((ProjectStage.status=="todo", "doing"), else_=ProjectStage.status)))
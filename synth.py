@@ -0,0 +1,213 @@
+"""Synthetic data at production-like volumes, for local profiling and the route benchmarks.
+
+Fills orgs with users, accounts, contacts and projects (all 12 stages
+materialized, part of them worked through with checklist ticks, approvals and
+saved deliverables), plus tasks with due dates and opportunities. Everything
+is written with multi-row INSERTs and executemany UPDATEs, one transaction
+per chunk of projects, and the rollups are reconciled at the end.
+
+CLI: python -m app.synth [--orgs 1] [--accounts 1000] [--projects 300] [--tasks 30] ... [--seed 0]
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from .auth import hash_password
+from .models import Org, User, Account, Contact, Project, Stage, ProjectStage, ProjectChecklist, ProjectDeliverable, Task, Opportunity, Approval, Activity
+from .seed import seed
+from .stages import create_projects
+from . import revisions, rollups
+
+PROJECT_CHUNK = 200
+PASSWORD = "synthetic"
+
+INDUSTRIES = ("Real Estate", "Healthcare", "Fintech", "Retail", "Logistics", "Education", "Energy", "Hospitality", "Manufacturing", "Media")
+SIZES = ("1-10", "11-50", "51-200", "201-1000", "1000+")
+COUNTRIES = ("Egypt", "Saudi Arabia", "UAE", "Jordan", "Morocco", "Kenya", "Nigeria", "Turkey")
+TITLES = ("CEO", "COO", "Head of Sales", "BD Manager", "Marketing Lead", "Procurement", "CFO", "Partnerships")
+WORDS = ("market", "pricing", "channel", "partner", "pilot", "renewal", "expansion", "pipeline", "segment", "launch",
+         "contract", "distribution", "referral", "tender", "upsell", "workshop", "proposal", "forecast", "audit", "roadmap")
+OPP_STAGES = (("new", 30), ("qualified", 25), ("pitched", 20), ("won", 15), ("lost", 10))
+TASK_STATUSES = (("todo", 45), ("doing", 20), ("done", 35))
+
+@dataclass(frozen=True)
+class Volumes:
+    orgs: int = 1
+    users: int = 5                # per org
+    accounts: int = 1000          # per org
+    contacts: int = 3             # per account
+    projects: int = 300           # per org
+    tasks: int = 30               # per project
+    opportunities: int = 8        # per project
+    deliverable_content: float = 0.5  # share of finished-stage deliverables with a saved revision
+
+    def scaled(self, factor: float) -> "Volumes":
+        return replace(self, accounts=max(1, round(self.accounts * factor)), projects=max(1, round(self.projects * factor)))
+
+@dataclass
+class Summary:
+    org_ids: list[int]
+    user_ids: list[int]  # first user of each org is its owner
+    rows: dict[str, int]
+    seconds: float
+
+def _weighted(rnd: random.Random, pairs) -> str:
+    values, weights = zip(*pairs)
+    return rnd.choices(values, weights)[0]
+
+def _sentence(rnd: random.Random, k: int) -> str:
+    return " ".join(rnd.choices(WORDS, k=k)).capitalize()
+
+def _ago(rnd: random.Random, now: datetime, days: int) -> datetime:
+    return now - timedelta(seconds=rnd.randrange(days * 86400))
+
+def generate(db: Session, volumes: Volumes = Volumes(), seed_value: int = 0) -> Summary:
+    """Add `volumes` of data in new orgs; existing rows are left alone."""
+    start = time.perf_counter()
+    rnd = random.Random(seed_value)
+    now = datetime.utcnow()
+    seed(db)
+    stage_order = dict(db.execute(select(Stage.id, Stage.order)).all())
+    counts = dict.fromkeys(("orgs", "users", "accounts", "contacts", "projects", "approvals", "revisions", "tasks", "opportunities", "activity"), 0)
+    password_hash = hash_password(PASSWORD)  # bcrypt once, shared by every synthetic user
+    first_org = db.scalar(select(func.count()).select_from(Org)) + 1
+    org_ids, owners = [], []
+    for o in range(volumes.orgs):
+        org_id = db.execute(insert(Org).returning(Org.id), {"name": f"Synthetic Org {first_org + o}"}).scalar_one()
+        user_ids = [uid for uid, in db.execute(insert(User).returning(User.id), [
+            {"org_id": org_id, "name": f"User {u}", "email": f"user{u}@org{org_id}.synthetic", "password_hash": password_hash, "is_admin": u == 0}
+            for u in range(volumes.users)])]
+        org_ids.append(org_id)
+        owners.append(user_ids[0])
+        counts["orgs"] += 1
+        counts["users"] += len(user_ids)
+
+        account_rows = []
+        for a in range(volumes.accounts):
+            created = _ago(rnd, now, 730)
+            account_rows.append({"org_id": org_id, "name": f"{rnd.choice(WORDS).capitalize()} {rnd.choice(INDUSTRIES)} {a}",
+                                 "industry": rnd.choice(INDUSTRIES), "size": rnd.choice(SIZES), "country": rnd.choice(COUNTRIES),
+                                 "owner_user_id": rnd.choice(user_ids), "created_at": created, "updated_at": created})
+        account_ids = [aid for aid, in db.execute(insert(Account).returning(Account.id), account_rows)]
+        db.execute(insert(Contact), [{"account_id": aid, "name": f"Contact {aid}-{c}", "title": rnd.choice(TITLES),
+                                      "phone": f"+20{rnd.randrange(10**9):09d}", "email": f"c{c}.{aid}@example.com"}
+                                     for aid in account_ids for c in range(volumes.contacts)])
+        db.commit()
+        counts["accounts"] += len(account_ids)
+        counts["contacts"] += len(account_ids) * volumes.contacts
+
+        for first in range(0, volumes.projects, PROJECT_CHUNK):
+            specs = [{"account_id": rnd.choice(account_ids), "name": f"{_sentence(rnd, 2)} {p}", "package": rnd.choice(("Core", "Growth", "Enterprise")),
+                      "lead_source": rnd.choice(("referral", "inbound", "event", "outbound"))}
+                     for p in range(first, min(first + PROJECT_CHUNK, volumes.projects))]
+            project_ids = create_projects(db, org_id, specs)  # commits
+            _work_projects(db, rnd, now, org_id, project_ids, user_ids, stage_order, volumes, counts)
+            db.commit()
+            counts["projects"] += len(project_ids)
+    rollups.reconcile_all(db)
+    return Summary(org_ids, owners, counts, time.perf_counter() - start)
+
+def _work_projects(db: Session, rnd: random.Random, now: datetime, org_id: int, project_ids: list[int], user_ids: list[int],
+                   stage_order: dict[int, int], volumes: Volumes, counts: dict[str, int]):
+    """Backdate the projects, advance each through a random number of stages (with the activity
+    trail of the approvals and checklist ticks), add tasks and opportunities."""
+    starts = {pid: _ago(rnd, now, 540) for pid in project_ids}
+    db.execute(update(Project), [{"id": pid, "created_at": started, "start_date": started, "updated_at": started,
+                                  "status": rnd.choices(("active", "paused", "done"), (80, 10, 10))[0]} for pid, started in starts.items()])
+    stages: dict[int, list[tuple[int, int]]] = {}
+    stage_project: dict[int, int] = {}
+    for psid, pid, stage_id in db.execute(select(ProjectStage.id, ProjectStage.project_id, ProjectStage.stage_id)
+                                          .where(ProjectStage.project_id.in_(project_ids))):
+        stages.setdefault(pid, []).append((stage_order[stage_id], psid))
+        stage_project[psid] = pid
+
+    stage_updates, approvals, done_stages, stage_times = [], [], [], {}
+    for pid, rows in stages.items():
+        rows.sort()
+        done = rnd.randint(0, len(rows))
+        clock = starts[pid]
+        for i, (_, psid) in enumerate(rows):
+            if i > done:
+                break
+            started = clock
+            if i == done:
+                stage_updates.append({"id": psid, "status": rnd.choices(("doing", "blocked"), (85, 15))[0], "started_at": started})
+                break
+            clock = min(now, clock + timedelta(hours=rnd.gammavariate(2.0, 48.0)))
+            approver = rnd.choice(user_ids)
+            stage_updates.append({"id": psid, "status": "done", "started_at": started, "completed_at": clock, "approved_by": approver, "approved_at": clock})
+            if rnd.random() < 0.15:
+                approvals.append({"project_stage_id": psid, "decision": "reject", "comment": _sentence(rnd, 6), "by_user": approver, "at": started})
+            approvals.append({"project_stage_id": psid, "decision": "approve", "comment": None, "by_user": approver, "at": clock})
+            done_stages.append(psid)
+            stage_times[psid] = (approver, clock)
+    if stage_updates:
+        db.execute(update(ProjectStage), stage_updates)
+    if approvals:
+        db.execute(insert(Approval), approvals)
+    counts["approvals"] += len(approvals)
+    trail = [{"org_id": org_id, "project_id": stage_project[a["project_stage_id"]], "user_id": a["by_user"], "kind": f"stage.{a['decision']}",
+              "ref_id": a["project_stage_id"], "detail": a["comment"], "created_at": a["at"]} for a in approvals]
+
+    if done_stages:
+        rows = db.execute(select(ProjectChecklist.id, ProjectChecklist.project_stage_id).where(ProjectChecklist.project_stage_id.in_(done_stages))).all()
+        ticks = [{"id": cid, "done": True, "done_by": stage_times[psid][0], "done_at": stage_times[psid][1]} for cid, psid in rows]
+        db.execute(update(ProjectChecklist), ticks)
+        trail += [{"org_id": org_id, "project_id": stage_project[psid], "user_id": tick["done_by"], "kind": "checklist.toggle",
+                   "ref_id": tick["id"], "detail": "done", "created_at": tick["done_at"]} for tick, (_, psid) in zip(ticks, rows)]
+        contents = {did: "\n".join(_sentence(rnd, rnd.randint(6, 16)) + "." for _ in range(rnd.randint(3, 40)))
+                    for did, in db.execute(select(ProjectDeliverable.id).where(ProjectDeliverable.project_stage_id.in_(done_stages)))
+                    if rnd.random() < volumes.deliverable_content}
+        revisions.first_revisions(db, contents, user_ids[0])
+        if contents:
+            db.execute(update(ProjectDeliverable).where(ProjectDeliverable.id.in_(contents)).values(status="submitted"))
+        counts["revisions"] += len(contents)
+
+    task_rows, opp_rows = [], []
+    for pid in project_ids:
+        psids = [psid for _, psid in stages.get(pid, [])]
+        for t in range(volumes.tasks):
+            created = starts[pid] + (now - starts[pid]) * rnd.random()
+            due = created + timedelta(days=rnd.randint(-5, 60)) if rnd.random() < 0.7 else None
+            task_rows.append({"project_id": pid, "project_stage_id": rnd.choice(psids) if psids and rnd.random() < 0.6 else None,
+                              "title": _sentence(rnd, rnd.randint(3, 8)), "owner_user_id": rnd.choice(user_ids),
+                              "status": _weighted(rnd, TASK_STATUSES), "priority": rnd.choice(("low", "med", "med", "high")),
+                              "due_date": due, "created_at": created, "updated_at": created})
+        for _ in range(volumes.opportunities):
+            created = starts[pid] + (now - starts[pid]) * rnd.random()
+            opp_rows.append({"project_id": pid, "title": _sentence(rnd, rnd.randint(2, 5)), "otype": rnd.choice(("partnership", "channel", "deal")),
+                             "value_estimate": rnd.randrange(1, 500) * 1000, "probability": rnd.randrange(0, 101, 5),
+                             "stage": _weighted(rnd, OPP_STAGES), "notes": _sentence(rnd, 12) if rnd.random() < 0.4 else None,
+                             "created_at": created, "updated_at": created})
+    if task_rows:
+        db.execute(insert(Task), task_rows)
+    if opp_rows:
+        db.execute(insert(Opportunity), opp_rows)
+    if trail:
+        db.execute(insert(Activity), trail)
+    counts["activity"] += len(trail)
+    counts["tasks"] += len(task_rows)
+    counts["opportunities"] += len(opp_rows)
+
+def main(argv=None):
+    from .db import SessionLocal
+    from .main import on_startup
+    parser = argparse.ArgumentParser(prog="python -m app.synth", description="Add synthetic orgs to the configured database.")
+    for f in fields(Volumes):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(f.default), default=f.default, help=f"default {f.default}")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply accounts and projects")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    volumes = Volumes(**{f.name: getattr(args, f.name) for f in fields(Volumes)}).scaled(args.scale)
+    on_startup()
+    rollups.reconciler.stop()
+    with SessionLocal() as db:
+        summary = generate(db, volumes, args.seed)
+    print(", ".join(f"{n:,} {k}" for k, n in summary.rows.items()) + f" in {summary.seconds:.1f} s")
+    print(f"log in as user0@org{summary.org_ids[0]}.synthetic / {PASSWORD}")
+
+if __name__ == "__main__":
+    main()
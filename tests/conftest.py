@@ -0,0 +1,19 @@
+"""Run from the directory containing the `app` package: python -m pytest app/tests
+
+The app is imported once per session against a scratch SQLite database filled by
+synth.generate (bench._synthetic_app), with query budgets enforced. The database
+and every file the app writes are moved to a temporary directory before any test
+module imports `app.db`, so nothing touches ./bd_os.db or the working directory."""
+import argparse
+import pytest
+from app import bench
+from app.config import settings
+
+bench._scratch_settings(argparse.Namespace(db_url=None), "test.db")
+
+@pytest.fixture(scope="session")
+def synthetic():
+    """(app, ctx) as the route benchmark gets them: ctx holds the ids and cookies the
+    route scenarios draw from."""
+    settings.query_budget_strict = True
+    return bench._synthetic_app(argparse.Namespace(db_url=settings.db_url, scale=0.1))
@@ -0,0 +1,21 @@
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from app.models import Activity, Task
+
+def test_feed_shows_an_entry_once_while_its_flush_finishes(synthetic):
+    from app.db import SessionLocal
+    from app import activity
+    app, ctx = synthetic
+    with SessionLocal() as db:
+        task = db.get(Task, ctx["tasks"][0])
+    entry = {"org_id": None, "project_id": task.project_id, "user_id": ctx["user_id"], "kind": "task.status",
+             "ref_id": task.id, "detail": "mid-flush", "created_at": datetime.utcnow()}
+    with activity.writer._flushing:  # keep the writer thread out
+        activity.writer.extend([dict(entry)])
+        with SessionLocal() as db:  # a flush that has committed but not yet dropped its batch
+            db.execute(insert(Activity), [entry])
+            db.commit()
+        r = TestClient(app, cookies=ctx["cookies"]).get(f"/projects/{task.project_id}/activity")
+    assert r.status_code == 200
+    assert r.text.count("mid-flush") == 1
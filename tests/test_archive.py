@@ -0,0 +1,51 @@
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.models import Project
+
+DAYS = 365 * 30
+
+def test_archive_restore_and_newest_row_guard(synthetic, monkeypatch):
+    from app.config import settings
+    from app.db import SessionLocal
+    from app import archive
+    app, ctx = synthetic
+    client = TestClient(app, cookies=ctx["cookies"])
+
+    def new_project(name: str, done: bool = True) -> int:
+        r = client.post(f"/projects/new/{ctx['accounts'][0]}", data={"name": name}, follow_redirects=False)
+        project_id = int(r.headers["location"].rsplit("/", 1)[1])
+        client.post(f"/projects/{project_id}/tasks/new", data={"title": f"{name} follow-up"}, follow_redirects=False)
+        if done:  # finished long before any synthetic project
+            with SessionLocal() as db:
+                db.execute(update(Project).where(Project.id==project_id).values(status="done", updated_at=datetime(1990, 1, 1)))
+                db.commit()
+        return project_id
+
+    def rows(tables, project_id: int) -> dict[str, int]:
+        with Session(archive.mover_engine()) as db:
+            return {name: db.scalar(select(func.count()).select_from(tables[name]).where(archive._scope(tables, name, [project_id])))
+                    for name in archive.TABLES}
+
+    old, newest = new_project("Archive old"), new_project("Archive newest")
+    before = {old: rows(archive.hot, old), newest: rows(archive.hot, newest)}
+    assert archive.run(days=DAYS).projects == 1  # newest owns the newest rows: deleting them would free their ids
+    assert rows(archive.cold, old) == before[old] and set(rows(archive.hot, old).values()) == {0}
+    assert rows(archive.hot, newest) == before[newest]
+
+    monkeypatch.setattr(settings, "archive_enabled", True)
+    page = client.get(f"/projects/{old}")
+    assert page.status_code == 200 and "Archive old" in page.text
+
+    with SessionLocal() as db:
+        org_id = db.get(Project, ctx["projects"][0]).org_id
+    assert archive.restore([old], org_id=org_id + 1) == []
+    assert archive.restore([old], org_id=org_id) == [old]
+    assert rows(archive.hot, old) == before[old] and set(rows(archive.cold, old).values()) == {0}
+
+    new_project("Archive newer", done=False)  # newest no longer owns the newest rows
+    assert archive.run(days=DAYS).projects == 1  # old counts as just updated since its restore
+    assert rows(archive.cold, newest) == before[newest]
+    assert archive.restore([newest]) == [newest]
+    assert rows(archive.hot, newest) == before[newest]
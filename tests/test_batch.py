@@ -0,0 +1,34 @@
+from fastapi.testclient import TestClient
+from app.models import ProjectChecklist, ProjectDeliverable
+
+def test_rejected_batches_change_nothing(synthetic):
+    from app.db import SessionLocal
+    app, ctx = synthetic
+    client = TestClient(app, cookies=ctx["cookies"])
+    cid = ctx["checklist"][0][0]
+    did, version = ctx["revised"][0]
+
+    def state():
+        with SessionLocal() as db:
+            d = db.get(ProjectDeliverable, did)
+            return db.get(ProjectChecklist, cid).done, d.head_revision_id, d.version
+
+    done, head, _ = state()
+    toggle = {"op": "checklist.toggle", "id": cid}
+    save = {"op": "deliverable.save", "id": did, "content": "Saved through the batch API.", "base": head}
+    post = lambda *ops: client.post("/api/batch", json={"ops": list(ops)})
+
+    r = post(toggle, {"op": "task.status", "id": 10**9, "status": "done"})
+    assert (r.status_code, r.json()) == (404, {"error": "not found", "ops": [1]})
+    r = post(toggle, {**save, "base": None})
+    assert (r.status_code, r.json()) == (409, {"error": "conflict", "ops": [1]})
+    r = post(toggle, save, {**save, "content": "A second save of the same deliverable."})
+    assert (r.status_code, r.json()) == (400, {"error": "duplicate deliverable save", "ops": [2]})
+    assert state() == (done, head, version)
+
+    r = post(toggle, save)
+    assert r.status_code == 200
+    changed = r.json()
+    assert [c["done"] for c in changed["checklist"]] == [not done]
+    assert [d["version"] for d in changed["deliverables"]] == [version + 1]
+    assert state()[0] == (not done) and state()[2] == version + 1
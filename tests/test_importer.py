@@ -0,0 +1,40 @@
+import io
+from sqlalchemy import func, select
+from app.models import Account, ImportJob, User
+
+def test_resume_after_a_failed_chunk_skips_committed_rows(synthetic, monkeypatch):
+    from app.db import SessionLocal
+    from app import importer
+    app, ctx = synthetic
+    upload = "\n".join(["name,country", "Import 0,NL", "Import 1,NL", "Import 1,NL", ",NL",
+                        "Import 2,DE", "Import 2,NL", "Import 3,NL", "Import 4,NL"]).encode()
+    with SessionLocal() as db:
+        org_id = db.get(User, ctx["user_id"]).org_id
+        db.add(Account(org_id=org_id, name="Import 0", country="NL"))
+        db.commit()
+        job_id = importer.create_job(db, org_id, ctx["user_id"], "accounts", "csv", io.BytesIO(upload)).id
+
+    write, chunks = importer.WRITERS["accounts"], []
+    def interrupted(db, job, chunk):
+        chunks.append(chunk[0][0])
+        if chunks == [1, 3, 5]:
+            raise RuntimeError("connection lost")
+        return write(db, job, chunk)
+    monkeypatch.setitem(importer.WRITERS, "accounts", interrupted)
+
+    def status():
+        with SessionLocal() as db:
+            return importer.job_status(db.get(ImportJob, job_id))
+
+    importer.run_import(job_id, chunk_size=2)
+    assert (status()["status"], status()["rows_done"]) == ("failed", 4)
+    importer.run_import(job_id, chunk_size=2)
+    s = status()
+    assert chunks == [1, 3, 5, 5, 7]
+    assert (s["status"], s["rows_done"], s["rows_inserted"], s["rows_duplicate"], s["rows_failed"]) == ("done", 8, 5, 2, 1)
+    assert {"row": 4, "error": "name is required"} in s["errors"]
+    with SessionLocal() as db:
+        names = db.execute(select(Account.name, Account.country, func.count()).where(Account.org_id==org_id, Account.name.like("Import %"))
+                           .group_by(Account.name, Account.country)).all()
+    assert sorted(names) == [("Import 0", "NL", 1), ("Import 1", "NL", 1), ("Import 2", "DE", 1), ("Import 2", "NL", 1),
+                             ("Import 3", "NL", 1), ("Import 4", "NL", 1)]
@@ -0,0 +1,15 @@
+from fastapi.routing import APIRoute
+from app import bench
+
+def test_every_route_has_a_scenario(synthetic):
+    app, ctx = synthetic
+    routes = {(method, r.path) for r in app.routes if isinstance(r, APIRoute) for method in r.methods}
+    assert sorted(routes - set(bench._route_scenarios(ctx))) == []
+
+def test_routes_stay_within_query_budgets(synthetic):
+    # query_budget_strict is on, so a request over its route's @query_budget raises here.
+    app, ctx = synthetic
+    scenarios = bench._route_scenarios(ctx)
+    results = bench._measure_routes(app, scenarios, sorted(scenarios), n=3)
+    over = {route: (r["queries"], r["budget"]) for route, r in results.items() if r["budget"] is not None and r["queries"] > r["budget"]}
+    assert over == {}
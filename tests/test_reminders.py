@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from app.models import Task
+
+def test_claims_release_on_failure_and_send_once(synthetic):
+    from app.db import SessionLocal
+    from app import reminders
+    app, ctx = synthetic
+    now = datetime.utcnow()
+    due = now - timedelta(minutes=5)
+    with SessionLocal() as db:
+        project_id = db.get(Task, ctx["tasks"][0]).project_id
+        tasks = [Task(project_id=project_id, title=f"Reminder {i}", status="todo", due_date=due) for i in range(3)]
+        tasks.append(Task(project_id=project_id, title="Already done", status="done", due_date=due))
+        db.add_all(tasks)
+        db.commit()
+        ids = [t.id for t in tasks]
+
+    class Relay:
+        """Fails its first send. Each send writes to the database, which would wait on
+        SQLite's write lock if the claim's transaction were still open."""
+        def __init__(self):
+            self.batches, self.down = [], True
+
+        def send(self, batch):
+            with SessionLocal() as db:
+                db.execute(update(Task).where(Task.id==ids[0]).values(priority="high"))
+                db.commit()
+            if self.down:
+                self.down = False
+                raise RuntimeError("relay down")
+            self.batches.append(batch)
+
+    def states():
+        with SessionLocal() as db:
+            return db.execute(select(Task.reminder_state).where(Task.id.in_(ids)).order_by(Task.id)).scalars().all()
+
+    sched = reminders.Scheduler()
+    sched.notifier = Relay()
+    sched.horizon = now + timedelta(hours=1)
+    sched.update({task_id: due for task_id in ids})
+    assert sched.fire(now) == 0
+    assert sched.failed == 4 and states() == [1, 1, 1, 0]  # released; the done task was never claimed
+    assert sched.fire(now + timedelta(seconds=reminders.RETRY_SECONDS + 1)) == 3
+    [batch] = sched.notifier.batches
+    assert sorted(r.task_id for r in batch) == ids[:3] and {r.kind for r in batch} == {"overdue"}
+    assert states() == [2, 2, 2, 0]
+
+    other = reminders.Scheduler()  # another worker tracking the same tasks
+    other.notifier = reminders.LogNotifier()
+    other.horizon = sched.horizon
+    other.update({task_id: due for task_id in ids})
+    assert other.fire(now) == 0
@@ -0,0 +1,39 @@
+import difflib
+import random
+import string
+from sqlalchemy import select
+from app.models import DeliverableRevision, ProjectDeliverable
+
+def test_every_revision_reads_back_across_keyframes(synthetic):
+    from app.config import settings
+    from app.db import SessionLocal
+    from app import revisions
+    app, ctx = synthetic
+    revised = {did for did, _ in ctx["revised"]}
+    did = next(did for did, _, _ in ctx["deliverables"] if did not in revised)
+    lines = [f"Paragraph {i}: scope, owners and dates." for i in range(60)]
+    texts = []
+    with SessionLocal() as db:
+        d = db.get(ProjectDeliverable, did)
+        for n in range(1, 41):
+            if n == 25:  # most of the document rewritten: a new chain starts
+                rnd = random.Random(0)
+                lines = ["".join(rnd.choices(string.ascii_letters + " ", k=40)) for _ in range(60)]
+            else:
+                lines[n % 60] = f"Paragraph {n % 60}, edit {n}."
+            texts.append("\n".join(lines))
+            revisions.save(db, d, texts[-1], ctx["user_id"])
+        assert revisions.save(db, d, texts[-1], ctx["user_id"]) is None  # unchanged text adds nothing
+        db.commit()
+
+        r = DeliverableRevision
+        chain = db.execute(select(r.number, r.keyframe, r.encoding).where(r.deliverable_id==did).order_by(r.number)).all()
+        assert [c.number for c in chain] == list(range(1, 41)) and d.version == 40
+        assert [c.number for c in chain if c.encoding == "full"] == [1, 1 + settings.revision_keyframe_interval, 25]
+        assert all(c.number - c.keyframe < settings.revision_keyframe_interval for c in chain)
+        for number, text in enumerate(texts, start=1):
+            assert revisions.load(db, did, number) == text
+        assert revisions.load(db, did, 41) is None
+        assert revisions.diff(db, did, 3, 30) == "".join(difflib.unified_diff(
+            texts[2].splitlines(keepends=True), texts[29].splitlines(keepends=True), "v3", "v30"))
+        assert revisions.diff(db, did, 0, 1) == "".join(difflib.unified_diff([], texts[0].splitlines(keepends=True), "v0", "v1"))
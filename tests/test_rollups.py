@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.models import Task, ProjectRollup, OrgRollup
+
+def overdue(db, task: Task) -> tuple[int, int]:
+    project = db.scalar(select(ProjectRollup.overdue_tasks).where(ProjectRollup.project_id==task.project_id))
+    org = db.scalar(select(OrgRollup.overdue_tasks).join(ProjectRollup, ProjectRollup.org_id==OrgRollup.org_id)
+                    .where(ProjectRollup.project_id==task.project_id))
+    return project, org
+
+def test_moving_an_overdue_task_between_past_dates(synthetic):
+    from app.db import SessionLocal
+    from app import rollups
+    app, ctx = synthetic
+    client = TestClient(app, cookies=ctx["cookies"])
+    with SessionLocal() as db:
+        rollups.reconcile_all(db)
+        task = db.scalars(select(Task).where(Task.id.in_(ctx["tasks"]), Task.status != "done")).first()
+    for days in (5, 3, 2):
+        r = client.post(f"/tasks/{task.id}/due", data={"due_date": (date.today() - timedelta(days=days)).isoformat()}, follow_redirects=False)
+        assert r.status_code == 302
+    with SessionLocal() as db:
+        kept = overdue(db, task)
+        rollups.reconcile_all(db)
+        assert kept == overdue(db, task)